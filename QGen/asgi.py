@@ -3,14 +3,28 @@ ASGI config for QGen project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Requests served here resolve against QGen/asgi_urls.py, which routes the
+PDF downloads and the analytics dashboard to the async views.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/4.0/howto/deployment/asgi/
 """
 
 import os
 
-from django.core.asgi import get_asgi_application
+import django
+from django.core.handlers.asgi import ASGIHandler
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'QGen.settings')
 
-application = get_asgi_application()
+ASGI_URLCONF = 'QGen.asgi_urls'
+
+
+class QGenASGIHandler(ASGIHandler):
+    async def get_response_async(self, request):
+        request.urlconf = ASGI_URLCONF
+        return await super().get_response_async(request)
+
+
+django.setup(set_prefix=False)
+application = QGenASGIHandler()
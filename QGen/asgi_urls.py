@@ -0,0 +1,11 @@
+"""QGen URL Configuration under ASGI
+
+Same as QGen/urls.py, with the app's async views (QPaperGeneration/asgi_urls.py).
+"""
+from django.contrib import admin
+from django.urls import path, include
+
+urlpatterns = [
+    path('admin/', admin.site.urls),
+    path('',include('QPaperGeneration.asgi_urls'))
+]
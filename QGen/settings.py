@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.0/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -29,6 +30,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'QPaperGeneration.instrumentation.query_timing_middleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -89,3 +91,59 @@ USE_TZ = True
 STATIC_URL = 'static/'
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 AUTH_USER_MODEL = 'QPaperGeneration.User'
+
+# Dashboards, subject/topic lists and question details are cached through
+# QPaperGeneration/caching.py. Invalidation goes through generation numbers kept
+# in the database, so every worker process sees it even with this per-process
+# local memory cache. A shared backend also spares each process recomputing
+# the same values, e.g.
+#   'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+#   'LOCATION': BASE_DIR / 'django_cache',
+# or 'django.core.cache.backends.redis.RedisCache' with a redis:// LOCATION.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'qgen',
+        'TIMEOUT': 60 * 60,
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    },
+}
+
+# Rendered question paper PDFs, keyed by content hash and evicted LRU by size
+PAPER_CACHE_DIR = BASE_DIR / 'paper_cache'
+PAPER_CACHE_MAX_BYTES = 256 * 1024 * 1024
+
+# Rendered PDFs above this size are spooled to a temp file rather than kept in memory
+PAPER_SPOOL_MAX_BYTES = 1024 * 1024
+
+# Worker processes used to render several papers at once (batch sets)
+PAPER_RENDER_WORKERS = 4
+
+# Bounded thread pools of the async views (QPaperGeneration/async_views.py):
+# ReportLab renders, and dashboard aggregate queries run side by side
+PAPER_RENDER_THREADS = 4
+ASYNC_QUERY_THREADS = 4
+
+# Finished background generation jobs (see `manage.py run_paper_worker`)
+PAPER_JOB_DIR = BASE_DIR / 'paper_jobs'
+# Workers refresh their running jobs' heartbeat this often; a running job
+# whose heartbeat is older than PAPER_JOB_STALE_SECONDS lost its worker and
+# is queued again
+PAPER_JOB_HEARTBEAT_SECONDS = 15
+PAPER_JOB_STALE_SECONDS = 120
+# Finished jobs and their PDFs are deleted after this many days
+PAPER_JOB_RETENTION_DAYS = 7
+
+# Request instrumentation shown on the system settings page: how many recent
+# requests are kept per process, and which queries count as slow (their
+# EXPLAIN output is logged)
+REQUEST_LOG_SIZE = 1000
+SLOW_QUERY_MS = 100
+SLOW_QUERY_LOG_SIZE = 50
+
+# Scrapers of /metrics that are not logged in (staff and admin always can):
+# send "Authorization: Bearer <METRICS_TOKEN>", or connect from one of
+# METRICS_ALLOWED_IPS. Both are off by default; behind a reverse proxy every
+# client arrives from the proxy's address, so prefer the token there.
+METRICS_TOKEN = os.environ.get('QGEN_METRICS_TOKEN', '')
+METRICS_ALLOWED_IPS = []
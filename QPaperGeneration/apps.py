@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class QpapergenerationConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'QPaperGeneration'
+
+    def ready(self):
+        from QPaperGeneration import signals  # noqa: F401 - registers the handlers
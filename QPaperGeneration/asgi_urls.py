@@ -0,0 +1,24 @@
+"""URLConf served under ASGI (see QGen/asgi.py).
+
+The same routes as urls.py, with the download and analytics views swapped
+for their async variants in async_views.py. Under WSGI urls.py is used
+as is, so the sync views stream PDFs with FileResponse.
+"""
+from django.urls import URLPattern
+
+from QPaperGeneration import async_views
+from QPaperGeneration.urls import urlpatterns as sync_urlpatterns
+
+ASYNC_VIEWS = {
+    'student_download_paper': async_views.student_download_paper,
+    'student_download_generated_paper': async_views.student_download_generated_paper,
+    'paper_job_download': async_views.paper_job_download,
+    'download_paper_pdf': async_views.download_paper_pdf,
+    'analytics_dashboard': async_views.analytics_dashboard,
+}
+
+urlpatterns = [
+    URLPattern(pattern.pattern, ASYNC_VIEWS[pattern.name], pattern.default_args, pattern.name)
+    if pattern.name in ASYNC_VIEWS else pattern
+    for pattern in sync_urlpatterns
+]
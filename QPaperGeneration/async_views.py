@@ -0,0 +1,187 @@
+"""Async variants of the PDF download views and the analytics dashboard.
+
+QGen/asgi.py routes these URLs here through QPaperGeneration/asgi_urls.py;
+under WSGI the sync views in views.py keep serving them. On the event loop
+ReportLab renders go to a bounded thread pool, the dashboard's independent
+aggregate queries run side by side in a second bounded pool, and PDFs are
+streamed back in chunks. A slow render or a slow client then holds a
+coroutine rather than a worker thread.
+"""
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib import messages
+from django.contrib.auth.decorators import login_required
+from django.db import close_old_connections
+from django.http import HttpResponseRedirect, StreamingHttpResponse
+from django.shortcuts import get_object_or_404, render
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.http import content_disposition_header
+
+from QPaperGeneration.models import QPattern, StudentGeneratedPaper
+from QPaperGeneration.stats import (
+    user_stats, question_stats, paper_stats, daily_activity, subject_statistics, top_contributors,
+)
+from QPaperGeneration.views import analytics_context, practice_paper_pdf, single_question_pdf, user_paper_jobs
+
+STREAM_CHUNK_SIZE = 64 * 1024
+
+_pools = {}
+
+
+def _pool(setting, default):
+    """Shared thread pool sized by a setting, created on first use"""
+    if setting not in _pools:
+        _pools[setting] = ThreadPoolExecutor(max_workers=getattr(settings, setting, default),
+                                             thread_name_prefix=setting.lower())
+    return _pools[setting]
+
+
+def _in_worker(func):
+    """Wrap blocking ORM work so pool threads never keep a stale connection"""
+    def run(*args, **kwargs):
+        close_old_connections()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            close_old_connections()
+    return run
+
+
+async def run_query(func, *args, **kwargs):
+    """Run blocking ORM work in the query pool; gathered calls run concurrently"""
+    pool = _pool('ASYNC_QUERY_THREADS', 4)
+    return await sync_to_async(_in_worker(func), thread_sensitive=False, executor=pool)(*args, **kwargs)
+
+
+async def run_render(func, *args):
+    """Run a ReportLab render (and its paper cache I/O) in the bounded render pool"""
+    pool = _pool('PAPER_RENDER_THREADS', 4)
+    return await sync_to_async(func, thread_sensitive=False, executor=pool)(*args)
+
+
+async def _stream_file(handle):
+    try:
+        while True:
+            chunk = await sync_to_async(handle.read, thread_sensitive=False)(STREAM_CHUNK_SIZE)
+            if not chunk:
+                break
+            yield chunk
+    finally:
+        handle.close()
+
+
+def pdf_response(handle, filename):
+    """Stream a rewound PDF file object as an attachment"""
+    handle.seek(0, os.SEEK_END)
+    size = handle.tell()
+    handle.seek(0)
+    response = StreamingHttpResponse(_stream_file(handle), content_type='application/pdf')
+    response['Content-Length'] = str(size)
+    response['Content-Disposition'] = content_disposition_header(True, filename)
+    return response
+
+
+def _load_question(question_id):
+    return get_object_or_404(QPattern.objects.select_related('subject', 'topic', 'user'), id=question_id)
+
+
+@login_required(login_url='student_login')
+async def student_download_paper(request, paper_id):
+    """Download a single question paper as PDF for students"""
+    try:
+        paper = await run_query(_load_question, paper_id)
+        handle = await run_render(single_question_pdf, paper)
+
+        filename = f"Question_{paper.subject.name}_{paper.id}.pdf"
+        messages.success(request, "📄 Question paper downloaded successfully!")
+        return pdf_response(handle, filename)
+
+    except Exception as e:
+        messages.error(request, f"❌ Error generating PDF: {str(e)}")
+        return HttpResponseRedirect(reverse("student_dashboard"))
+
+
+@login_required(login_url='student_login')
+async def download_paper_pdf(request, paper_id):
+    """Download a specific paper as PDF - using student_download_paper"""
+    try:
+        return await student_download_paper(request, paper_id)
+    except Exception as e:
+        messages.error(request, f"❌ Error downloading paper: {str(e)}")
+        return HttpResponseRedirect(reverse("view_papers"))
+
+
+def _load_generated_paper(paper_id, student):
+    generated_paper = StudentGeneratedPaper.objects.get(id=paper_id, student=student)
+    return generated_paper, generated_paper.get_questions()
+
+
+@login_required(login_url='student_login')
+async def student_download_generated_paper(request, generated_paper_id):
+    """Download a previously generated question paper"""
+    try:
+        user = await request.auser()
+        generated_paper, questions = await run_query(_load_generated_paper, generated_paper_id, user)
+
+        # Serve the cached render; it is only regenerated when the paper changed
+        handle = await run_render(practice_paper_pdf, generated_paper.title, generated_paper.total_marks, questions)
+
+        filename = f"Generated_Paper_{generated_paper.id}.pdf"
+        return pdf_response(handle, filename)
+
+    except StudentGeneratedPaper.DoesNotExist:
+        messages.error(request, "❌ Generated paper not found.")
+        return HttpResponseRedirect(reverse("student_generated_papers"))
+    except Exception as e:
+        messages.error(request, f"❌ Error downloading generated paper: {str(e)}")
+        return HttpResponseRedirect(reverse("student_generated_papers"))
+
+
+@login_required(login_url='student_login')
+async def paper_job_download(request, job_id):
+    """Download the PDF produced by a finished job"""
+    user = await request.auser()
+    job = await run_query(lambda: get_object_or_404(user_paper_jobs(user), id=job_id))
+    if job.status != 'done':
+        messages.warning(request, "⚠️ This paper is not ready yet.")
+        return HttpResponseRedirect(reverse("paper_jobs"))
+    try:
+        handle = await run_render(open, job.artifact, 'rb')
+    except FileNotFoundError:
+        messages.error(request, "❌ The generated file is no longer available.")
+        return HttpResponseRedirect(reverse("paper_jobs"))
+    return pdf_response(handle, job.filename)
+
+
+@login_required(login_url='student_login')
+async def analytics_dashboard(request):
+    """Admin analytics dashboard, its independent aggregates queried concurrently"""
+    user = await request.auser()
+    if user.role != 'admin':
+        messages.error(request, "Access denied. Admin privileges required.")
+        return HttpResponseRedirect(reverse("dashboard"))
+
+    try:
+        now = timezone.now()
+        users, questions, papers, subjects, contributors, activity = await asyncio.gather(
+            run_query(user_stats, now=now),
+            run_query(question_stats),
+            run_query(paper_stats, now=now),
+            run_query(subject_statistics),
+            run_query(top_contributors),
+            run_query(daily_activity, 7, now=now),
+        )
+
+        context = analytics_context(users, questions, papers, subjects, contributors, activity)
+
+        # Templates touch request.user lazily, which is sync-only
+        return await sync_to_async(render)(request, "analytics_dashboard.html", context)
+
+    except Exception as e:
+        messages.error(request, f"Error loading analytics: {str(e)}")
+        return HttpResponseRedirect(reverse("admin_dashboard"))
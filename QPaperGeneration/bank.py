@@ -0,0 +1,102 @@
+"""In-process snapshot of the question bank for paper generation.
+
+The bank changes a few times a day but is read by every generation
+request, so each worker process keeps a column-wise copy of it: one NumPy
+array per field (id, subject, topic, marks, difficulty, co, user) sorted by
+id, and the question texts packed into one UTF-8 buffer addressed by
+offsets. Candidate selection then becomes array masks over memory
+instead of queries. Pages that only need counts (myquestions, papergen1)
+use grouped queries instead, so they never load or reload a snapshot.
+
+Writes bump the 'version:bank' StatCounter (signals.py and the bulk
+importer). Every snapshot() call reads that one row and reloads when it has
+moved, so a worker never serves a bank older than its last request.
+"""
+import threading
+
+import numpy as np
+
+from QPaperGeneration import counters, metrics
+from QPaperGeneration.models import QPattern
+
+VERSION_COUNTER = counters.VERSION_PREFIX + 'bank'
+
+COLUMNS = ('id', 'subject_id', 'topic_id', 'marks', 'difficulty', 'co', 'user_id')
+
+_lock = threading.Lock()
+_current = None
+
+
+def bank_version():
+    return counters.read(VERSION_COUNTER)[VERSION_COUNTER]
+
+
+def bump_version():
+    """Mark every process's snapshot as stale"""
+    counters.bump({VERSION_COUNTER: 1})
+
+
+class BankSnapshot:
+    """Column arrays of every question at one bank version"""
+
+    def __init__(self, version, rows):
+        self.version = version
+        columns = list(zip(*rows)) if rows else [()] * (len(COLUMNS) + 1)
+        self.ids, self.subject, self.topic, self.marks, self.difficulty, self.co, self.user = (
+            np.array(column, dtype=np.int64) for column in columns[:len(COLUMNS)])
+        encoded = [text.encode('utf-8') for text in columns[len(COLUMNS)]]
+        self._text = b''.join(encoded)
+        self._offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(text) for text in encoded], out=self._offsets[1:])
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _mask(self, topics=None, marks=None, user=None):
+        mask = np.ones(len(self.ids), dtype=bool)
+        if topics is not None:
+            mask &= np.isin(self.topic, list(topics))
+        if marks is not None:
+            mask &= np.isin(self.marks, list(marks))
+        if user is not None:
+            mask &= self.user == user
+        return mask
+
+    def candidates(self, topic_ids, user=None, marks=None):
+        """(id, marks, topic, co, difficulty) tuple of each matching question, as CandidateIndex takes them"""
+        mask = self._mask(topics=topic_ids, marks=marks, user=user)
+        return list(zip(*(column[mask].tolist() for column in
+                          (self.ids, self.marks, self.topic, self.co, self.difficulty))))
+
+    def texts(self, ids):
+        """Question text of each id present in the snapshot"""
+        ids = np.array(sorted(ids), dtype=np.int64)
+        positions = np.searchsorted(self.ids, ids)
+        texts = {}
+        for qid, position in zip(ids.tolist(), positions.tolist()):
+            if position < len(self.ids) and self.ids[position] == qid:
+                start, end = self._offsets[position], self._offsets[position + 1]
+                texts[qid] = self._text[start:end].decode('utf-8')
+        return texts
+
+
+def load(version):
+    rows = QPattern.objects.order_by('id').values_list(*COLUMNS, 'question')
+    return BankSnapshot(version, list(rows.iterator(chunk_size=5000)))
+
+
+def snapshot():
+    """The current snapshot, reloaded first if the bank changed since it was taken"""
+    global _current
+    version = bank_version()
+    current = _current
+    if current is not None and current.version == version:
+        metrics.cache_lookup('bank_snapshot', True)
+        return current
+    metrics.cache_lookup('bank_snapshot', False)
+    with _lock:
+        if _current is None or _current.version != version:
+            # Taken after reading the version, so a write during the load
+            # bumps it past this snapshot and forces another reload
+            _current = load(version)
+        return _current
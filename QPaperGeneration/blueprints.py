@@ -0,0 +1,325 @@
+"""Declarative paper blueprints and the constraint solver that fills them.
+
+A blueprint lists the paper's header lines and its sections; each section
+asks for `count` questions of `marks` marks. On top of that a paper can ask
+for course outcome (CO) coverage and a difficulty mix. The solver runs over
+an in-memory index of candidate tuples, so it either returns a feasible
+selection or a report of exactly which constraint cannot be met, without
+touching the database again.
+"""
+import math
+import random
+from collections import Counter
+
+# Difficulty levels grouped into the bands a difficulty mix talks about
+DIFFICULTY_BANDS = {
+    'easy': (1, 2),
+    'medium': (3,),
+    'hard': (4, 5),
+}
+
+# Share of the paper's questions each band must (min) or may (max) take up
+DIFFICULTY_MIXES = {
+    'any': {},
+    'balanced': {'easy': {'min': 0.3}, 'hard': {'max': 0.3}},
+    'easy': {'easy': {'min': 0.6}, 'hard': {'max': 0.1}},
+    'challenging': {'hard': {'min': 0.4}, 'easy': {'max': 0.2}},
+}
+
+BLUEPRINTS = {
+    '1': {
+        'name': 'IA Paper',
+        'header': [
+            "Time : 1 Hour",
+            "Max Marks : 20",
+            "",
+            "1. Attempt the following questions:",
+            "2. Avoid using any unfair means during the paper.",
+            "",
+        ],
+        'sections': [
+            {'heading': "Question 1 : Any five questions - 2 marks each",
+             'note': "(Choose 5 from the following 6 questions)", 'marks': 2, 'count': 6},
+            {'heading': "Question 2 : Any one question - 5 marks",
+             'note': "(Choose 1 from the following 2 questions)", 'marks': 5, 'count': 2},
+            {'heading': "Question 3 : Any one question - 5 marks",
+             'note': "(Choose 1 from the following 2 questions)", 'marks': 5, 'count': 2},
+        ],
+    },
+    '2': {
+        'name': 'Semester Paper',
+        'header': [
+            "Time : 3 Hours",
+            "Max Marks : 100",
+            "",
+            "1. Answer all questions.",
+            "2. All questions carry equal marks.",
+            "3. Attempt any 3 questions from Q2 to Q6.",
+            "4. Avoid using any unfair means during the paper.",
+            "",
+        ],
+        'sections': [
+            {'heading': "Question 1 : Compulsory questions - 5 marks each", 'marks': 5, 'count': 4},
+        ] + [
+            {'heading': f"Question {n} : Answer both sub-questions (10 marks each) - Total 20 marks",
+             'marks': 10, 'count': 2}
+            for n in range(2, 7)
+        ],
+    },
+}
+
+
+def blueprint_requirements(blueprint):
+    """Number of questions the blueprint needs per marks value"""
+    needed = Counter()
+    for section in blueprint['sections']:
+        needed[section['marks']] += section['count']
+    return dict(needed)
+
+
+def difficulty_band(level):
+    for band, levels in DIFFICULTY_BANDS.items():
+        if level in levels:
+            return band
+    return None
+
+
+class CandidateIndex:
+    """In-memory index over (id, marks, topic, co, difficulty) candidate tuples"""
+
+    def __init__(self, candidates):
+        self.by_marks = {}
+        self.by_co = {}
+        self.by_band = {}
+        self.co = {}
+        self.band = {}
+        for qid, marks, _topic, co, difficulty in candidates:
+            band = difficulty_band(difficulty)
+            self.by_marks.setdefault(marks, []).append(qid)
+            self.by_co.setdefault((marks, co), []).append(qid)
+            self.by_band.setdefault((marks, band), []).append(qid)
+            self.co[qid] = co
+            self.band[qid] = band
+
+    def pool(self, marks, exclude=()):
+        pool = self.by_marks.get(marks, [])
+        if exclude:
+            pool = [qid for qid in pool if qid not in exclude]
+        return pool
+
+
+class Solution:
+    """Outcome of solving a blueprint: chosen ids per section, or the problems found"""
+
+    def __init__(self, blueprint, sections=None, problems=None, notes=None):
+        self.blueprint = blueprint
+        self.sections = sections or []
+        self.problems = problems or []
+        self.notes = notes or []
+
+    @property
+    def feasible(self):
+        return not self.problems
+
+    @property
+    def question_ids(self):
+        return [qid for ids in self.sections for qid in ids]
+
+
+def _band_limits(mix, total):
+    """Turn a difficulty mix's fractions into question counts for a paper of total questions"""
+    limits = {}
+    for band, spec in mix.items():
+        low = math.ceil(spec['min'] * total) if 'min' in spec else 0
+        high = math.floor(spec['max'] * total) if 'max' in spec else total
+        limits[band] = (low, high)
+    return limits
+
+
+def _random_order(pool, rng, wanted, usage=None):
+    """Yield pool members in random order, cheaply when only a few are wanted.
+
+    With usage, the least used members come first and ties are shuffled.
+    """
+    if usage:
+        yield from sorted(pool, key=lambda qid: (usage[qid], rng.random()))
+        return
+    if len(pool) > 4 * wanted:
+        # Large pool: random draws almost never collide, so skip the full shuffle
+        for _ in range(4 * wanted):
+            yield rng.choice(pool)
+    yield from rng.sample(pool, len(pool))
+
+
+def _precheck(index, needed, pools, limits, exclude):
+    """Counting bounds that rule a blueprint out before any search"""
+    problems = []
+    for marks, count in sorted(needed.items()):
+        if len(pools[marks]) < count:
+            problems.append(f"Need {count} {marks}-mark questions but only {len(pools[marks])} are available.")
+    if problems:
+        return problems
+
+    for band, (low, high) in sorted(limits.items()):
+        in_band = {m: sum(1 for q in index.by_band.get((m, band), ()) if q not in exclude) for m in needed}
+        most = sum(min(needed[m], in_band[m]) for m in needed)
+        least = sum(max(0, needed[m] - (len(pools[m]) - in_band[m])) for m in needed)
+        if most < low:
+            problems.append(f"Difficulty mix needs at least {low} {band} questions but at most {most} can be placed.")
+        if least > high:
+            problems.append(f"Difficulty mix allows at most {high} {band} questions but at least {least} are unavoidable.")
+    return problems
+
+
+def _attempt(index, needed, pools, limits, cos, rng, exclude, usage, conflicts):
+    """One randomized constructive pass; returns (chosen ids per marks, failure reason)"""
+    chosen = {marks: [] for marks in needed}
+    used = set(exclude)
+    band_counts = Counter()
+
+    def fits(qid):
+        band = index.band[qid]
+        return qid not in used and (band not in limits or band_counts[band] < limits[band][1])
+
+    def take(marks, qid):
+        chosen[marks].append(qid)
+        used.add(qid)
+        # A near-duplicate of a chosen question may not be chosen as well
+        used.update(conflicts.get(qid, ()))
+        band_counts[index.band[qid]] += 1
+
+    def pick(groups, key):
+        """Random (marks, id) from the key group that still fits, or None"""
+        lists = [(marks, groups.get((marks, key), ())) for marks in needed if len(chosen[marks]) < needed[marks]]
+        total = sum(len(ids) for _marks, ids in lists)
+        # A few uniform draws almost always succeed; fall back to a full scan
+        for _ in range(0 if usage else min(total, 16)):
+            n = rng.randrange(total)
+            for marks, ids in lists:
+                if n < len(ids):
+                    if fits(ids[n]):
+                        return marks, ids[n]
+                    break
+                n -= len(ids)
+        picks = [(marks, qid) for marks, ids in lists for qid in ids if fits(qid)]
+        if usage and picks:
+            least = min(usage[qid] for _marks, qid in picks)
+            picks = [(marks, qid) for marks, qid in picks if usage[qid] == least]
+        return rng.choice(picks) if picks else None
+
+    # Cover every requested CO first, then the difficulty minimums, then fill up
+    covered = set()
+    for co in rng.sample(cos, len(cos)):
+        if co in covered:
+            continue
+        picked = pick(index.by_co, co)
+        if picked is None:
+            return None, f"CO{co} could not be covered within the section and difficulty limits."
+        marks, qid = picked
+        take(marks, qid)
+        covered.add(index.co[qid])
+
+    for band, (low, _high) in limits.items():
+        while band_counts[band] < low:
+            picked = pick(index.by_band, band)
+            if picked is None:
+                return None, f"Not enough {band} questions left to reach the difficulty mix."
+            take(*picked)
+
+    for marks in needed:
+        for qid in _random_order(pools[marks], rng, needed[marks], usage):
+            if len(chosen[marks]) >= needed[marks]:
+                break
+            if fits(qid):
+                take(marks, qid)
+        if len(chosen[marks]) < needed[marks]:
+            return None, f"{marks}-mark sections could not be filled within the difficulty limits."
+
+    return chosen, None
+
+
+def solve_blueprint(blueprint, index, cos=(), mix=None, rng=None, exclude=(), usage=None, conflicts=None,
+                    attempts=200):
+    """Pick questions for every section of blueprint from index.
+
+    cos lists the course outcomes that must each appear at least once; COs with
+    no candidate at all are reported as notes rather than failures. exclude is a
+    set of ids that must not be used; usage, a Counter of ids, makes the solver
+    prefer the least used questions. conflicts maps an id to the ids that may
+    not appear in the same paper (see near_duplicates.conflict_map). Returns a
+    Solution.
+    """
+    rng = rng or random.Random()
+    needed = blueprint_requirements(blueprint)
+    pools = {marks: index.pool(marks, exclude) for marks in needed}
+    total = sum(needed.values())
+    limits = _band_limits(mix or {}, total)
+
+    exclude = set(exclude)
+    problems = _precheck(index, needed, pools, limits, exclude)
+    if problems:
+        return Solution(blueprint, problems=problems)
+
+    available_cos = {index.co[qid] for marks in needed for qid in pools[marks]}
+    missing = [f"CO{co}" for co in cos if co not in available_cos]
+    notes = [f"No questions are mapped to {', '.join(missing)} in the selected topics."] if missing else []
+    cos = [co for co in cos if co in available_cos]
+
+    failures = Counter()
+    for _ in range(attempts):
+        chosen, reason = _attempt(index, needed, pools, limits, cos, rng, exclude, usage, conflicts or {})
+        if chosen is not None:
+            break
+        failures[reason] += 1
+    else:
+        reason, _count = failures.most_common(1)[0]
+        return Solution(blueprint, problems=[
+            reason,
+            f"No selection met CO coverage {cos} and the difficulty mix after {attempts} attempts.",
+        ], notes=notes)
+
+    sections = []
+    for marks in chosen:
+        rng.shuffle(chosen[marks])
+    for section in blueprint['sections']:
+        sections.append([chosen[section['marks']].pop() for _ in range(section['count'])])
+    return Solution(blueprint, sections=sections, notes=notes)
+
+
+def blueprint_lines(solution, texts):
+    """Paper text lines for a feasible solution, given question texts by id"""
+    lines = list(solution.blueprint['header'])
+    number = 1
+    for section, ids in zip(solution.blueprint['sections'], solution.sections):
+        lines.append(section['heading'])
+        if section.get('note'):
+            lines.append(section['note'])
+        for qid in ids:
+            lines.append(f"Q.{number} " + texts[qid])
+            number += 1
+        lines.append("")
+    return lines
+
+
+def solve_sets(blueprint, index, sets, cos=(), mix=None, rng=None, conflicts=None):
+    """Solve blueprint sets times over one index with as little overlap as possible.
+
+    Each set first tries to avoid every question already used; when no fresh
+    selection exists it falls back to preferring the least used questions.
+    Returns a list of Solutions, stopping at the first set that cannot be
+    solved at all.
+    """
+    rng = rng or random.Random()
+    usage = Counter()
+    solutions = []
+    for _ in range(sets):
+        solution = solve_blueprint(blueprint, index, cos=cos, mix=mix, rng=rng, exclude=set(usage),
+                                   conflicts=conflicts)
+        if not solution.feasible and usage:
+            solution = solve_blueprint(blueprint, index, cos=cos, mix=mix, rng=rng, usage=usage,
+                                       conflicts=conflicts)
+        solutions.append(solution)
+        if not solution.feasible:
+            break
+        usage.update(solution.question_ids)
+    return solutions
@@ -0,0 +1,65 @@
+"""Read-through caching for pages that mostly re-read unchanged data.
+
+Keys follow one scheme, 'qgen:<namespace>:<generation>:<part>:...', where
+the namespaces are:
+
+  catalog    subject list and per-subject topic lists (paper generator forms)
+  dashboard  per-role dashboard blocks, e.g. dashboard:staff:recent:<user id>
+  question   question_detail_ajax HTML, question:<question id>
+  breakdown  explore_data's per subject marks and topic counts (stats.py)
+
+Each namespace has a generation number, kept in the 'version:<namespace>'
+StatCounter row the way bank.py keeps 'version:bank'. Bumping it (expire)
+orphans every key of the namespace at once without listing keys, and since
+the number lives in the database the bump reaches every worker process,
+whatever their cache backend; the orphans age out through their timeout.
+A key is only ever dropped by expiring its namespace, as deleting one key
+would only reach the cache of the process doing the write. signals.py and
+the bulk importer expire namespaces as the data changes.
+"""
+from django.core.cache import cache
+
+from QPaperGeneration import counters, metrics
+
+PREFIX = 'qgen'
+
+CATALOG = 'catalog'
+DASHBOARD = 'dashboard'
+QUESTION = 'question'
+BREAKDOWN = 'breakdown'
+
+TIMEOUTS = {
+    CATALOG: 60 * 60,
+    DASHBOARD: 10 * 60,
+    QUESTION: 60 * 60,
+    BREAKDOWN: 60 * 60,
+}
+
+
+def _generation_counter(namespace):
+    return counters.VERSION_PREFIX + namespace
+
+
+def generation(namespace):
+    name = _generation_counter(namespace)
+    return counters.read(name)[name]
+
+
+def make_key(namespace, *parts):
+    return ':'.join([PREFIX, namespace, str(generation(namespace)), *map(str, parts)])
+
+
+def get_or_set(namespace, parts, compute, timeout=None):
+    """The cached value for parts in namespace, computed and stored on a miss"""
+    key = make_key(namespace, *parts)
+    value = cache.get(key)
+    metrics.cache_lookup(namespace, value is not None)
+    if value is None:
+        value = compute()
+        cache.set(key, value, TIMEOUTS[namespace] if timeout is None else timeout)
+    return value
+
+
+def expire(*namespaces):
+    """Invalidate every key of the namespaces, in every process"""
+    counters.bump({_generation_counter(namespace): 1 for namespace in namespaces})
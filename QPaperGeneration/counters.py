@@ -0,0 +1,127 @@
+"""Materialized dashboard counters.
+
+Every total the dashboards show lives in one StatCounter row, so a page
+reads them with a single query instead of COUNT(*) scans. The handlers in
+signals.py apply deltas as rows are saved and deleted; anything that writes
+around the signals (bulk_create, queryset.update) must call bump() itself or
+be followed by `manage.py rebuild_stats`.
+"""
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Count, F, Sum
+
+from QPaperGeneration.models import StatCounter
+
+# Counters under this prefix count changes rather than rows (see bank.py);
+# they cannot be recomputed, so rebuild() leaves them alone
+VERSION_PREFIX = 'version:'
+
+
+def question_deltas(marks, difficulty, user_id, subject_id, sign=1):
+    """Counters one question contributes to"""
+    return {
+        'questions': sign,
+        'questions:marks_total': sign * marks,
+        f'questions:marks:{marks}': sign,
+        f'questions:difficulty:{difficulty}': sign,
+        f'questions:user:{user_id}': sign,
+        f'questions:subject:{subject_id}': sign,
+    }
+
+
+def user_deltas(role, sign=1):
+    return {'users': sign, f'users:role:{role}': sign}
+
+
+def paper_deltas(role, sign=1):
+    return {'papers': sign, f'papers:role:{role}': sign}
+
+
+def questions_deltas(questions, sign=1):
+    """Counters a whole queryset of questions contributes to, from grouped queries"""
+    questions = questions.order_by()
+    totals = questions.aggregate(count=Count('id'), marks=Sum('marks'))
+    deltas = {'questions': sign * totals['count'], 'questions:marks_total': sign * (totals['marks'] or 0)}
+    for field, prefix in (('marks', 'questions:marks'), ('difficulty', 'questions:difficulty'),
+                          ('user_id', 'questions:user'), ('subject_id', 'questions:subject')):
+        for key, count in questions.values_list(field).annotate(count=Count('id')):
+            deltas[f'{prefix}:{key}'] = sign * count
+    return deltas
+
+
+def combine(*deltas):
+    """Sum several delta dicts, dropping counters that cancel out"""
+    total = defaultdict(int)
+    for delta in deltas:
+        for name, amount in delta.items():
+            total[name] += amount
+    return {name: amount for name, amount in total.items() if amount}
+
+
+def bump(deltas):
+    """Apply deltas to the counters, creating missing ones at zero"""
+    with transaction.atomic():
+        for name, amount in deltas.items():
+            if not amount:
+                continue
+            counter = StatCounter.objects.filter(name=name)
+            if not counter.update(value=F('value') + amount):
+                StatCounter.objects.get_or_create(name=name)
+                counter.update(value=F('value') + amount)
+
+
+def read(*names):
+    """Current value of each named counter, 0 for counters never set"""
+    values = dict.fromkeys(names, 0)
+    values.update(StatCounter.objects.filter(name__in=names).values_list('name', 'value'))
+    return values
+
+
+def read_all():
+    """Every stored counter except the version counters, as a name -> value dict"""
+    return dict(StatCounter.objects.exclude(name__startswith=VERSION_PREFIX).values_list('name', 'value'))
+
+
+def compute(apps=None):
+    """Every counter recomputed from the source tables, as a name -> value dict"""
+    if apps is None:
+        from django.apps import apps
+    QPattern = apps.get_model('QPaperGeneration', 'QPattern')
+    User = apps.get_model('QPaperGeneration', 'User')
+    StudentGeneratedPaper = apps.get_model('QPaperGeneration', 'StudentGeneratedPaper')
+    Subject = apps.get_model('QPaperGeneration', 'Subject')
+    Topic = apps.get_model('QPaperGeneration', 'Topic')
+
+    values = defaultdict(int)
+    values['subjects'] = Subject.objects.count()
+    values['topics'] = Topic.objects.count()
+
+    questions = QPattern.objects.order_by()
+    totals = questions.aggregate(count=Count('id'), marks=Sum('marks'))
+    values['questions'] = totals['count']
+    values['questions:marks_total'] = totals['marks'] or 0
+    for field, prefix in (('marks', 'questions:marks'), ('difficulty', 'questions:difficulty'),
+                          ('user_id', 'questions:user'), ('subject_id', 'questions:subject')):
+        for key, count in questions.values_list(field).annotate(count=Count('id')):
+            values[f'{prefix}:{key}'] = count
+
+    for role, count in User.objects.order_by().values_list('role').annotate(count=Count('id')):
+        values['users'] += count
+        values[f'users:role:{role}'] = count
+
+    papers = StudentGeneratedPaper.objects.order_by()
+    for role, count in papers.values_list('student__role').annotate(count=Count('id')):
+        values['papers'] += count
+        values[f'papers:role:{role}'] = count
+    return dict(values)
+
+
+def rebuild(apps=None):
+    """Replace every counter with a fresh recount; returns the number of counters"""
+    counters = StatCounter if apps is None else apps.get_model('QPaperGeneration', 'StatCounter')
+    with transaction.atomic():
+        values = compute(apps)
+        counters.objects.exclude(name__startswith=VERSION_PREFIX).delete()
+        counters.objects.bulk_create([counters(name=name, value=value) for name, value in values.items()])
+    return len(values)
@@ -0,0 +1,252 @@
+"""Bulk question import from CSV, JSON or NDJSON.
+
+Rows are read one at a time, checked, and inserted with bulk_create in
+batches, each in its own transaction. Subjects and topics are resolved
+through in-memory maps that are loaded once, so a row costs no queries of
+its own. Rows that fail a check are skipped and reported by row number;
+the rest of the file is still imported. If the file itself stops being
+readable partway (bad encoding, broken CSV quoting), the rows before that
+point are saved and ImportInterrupted reports how many and where it stopped.
+
+The columns are the ones the explore_data export writes (Question,
+Subject, Topic, Marks, Difficulty), plus optional Answer, CO and Image URL.
+Header names are matched case-insensitively, so an export can be
+re-imported as is.
+"""
+import codecs
+import csv
+import json
+from collections import namedtuple
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction
+
+from QPaperGeneration import caching, counters
+from QPaperGeneration.bank import VERSION_COUNTER
+from QPaperGeneration.models import QPattern, Subject, Topic, make_preview
+from QPaperGeneration.near_duplicates import store_signatures
+from QPaperGeneration.search import index_questions
+from QPaperGeneration.stats import invalidate_subject_breakdown
+
+IMPORT_FORMATS = ('csv', 'json', 'ndjson')
+IMPORT_BATCH_SIZE = 1000
+
+# Stop collecting error messages past this many; the count keeps going
+MAX_REPORTED_ERRORS = 200
+
+NAME_MAX_LENGTH = 32  # Subject.name and Topic.name
+
+# Normalized column name -> QPattern field
+COLUMN_ALIASES = {
+    'question': 'question',
+    'subject': 'subject',
+    'topic': 'topic',
+    'marks': 'marks',
+    'difficulty': 'difficulty',
+    'answer': 'answer',
+    'co': 'co',
+    'image_url': 'imgurl',
+    'imgurl': 'imgurl',
+}
+
+ImportResult = namedtuple('ImportResult', ['created', 'failed', 'errors'])
+
+
+class ImportFormatError(ValueError):
+    """The file as a whole cannot be read in the requested format"""
+
+
+class ImportInterrupted(Exception):
+    """Reading stopped partway through a file; the rows before it were imported"""
+
+    def __init__(self, result, last_row, error):
+        self.result = result
+        self.last_row = last_row
+        self.error = error
+        super().__init__(f"reading stopped after row {last_row}: {error}")
+
+
+def guess_format(filename):
+    """Import format from a file name's extension, or None"""
+    extension = filename.rsplit('.', 1)[-1].lower() if '.' in filename else ''
+    return extension if extension in IMPORT_FORMATS else None
+
+
+def _normalize(record):
+    row = {}
+    for key, value in record.items():
+        field = COLUMN_ALIASES.get(str(key).strip().lower().replace(' ', '_'))
+        if field:
+            row[field] = value
+    return row
+
+
+def _lines(stream):
+    """Decoded lines of a binary file object.
+
+    Each line is decoded on its own, so a bad byte raises only when its own
+    line is reached and every line before it has already been read.
+    """
+    decoder = codecs.getincrementaldecoder('utf-8-sig')()
+    for line in stream:
+        yield decoder.decode(line)
+    decoder.decode(b'', final=True)
+
+
+def read_rows(stream, format_type):
+    """Yield (row number, field dict) pairs from a binary file object"""
+    if format_type == 'csv':
+        for number, record in enumerate(csv.DictReader(_lines(stream)), start=2):  # Row 1 is the header
+            yield number, _normalize(record)
+    elif format_type == 'ndjson':
+        for number, line in enumerate(_lines(stream), start=1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError as e:
+                yield number, e
+                continue
+            yield number, _normalize(record) if isinstance(record, dict) else ValueError("expected an object")
+    elif format_type == 'json':
+        # A JSON array has to be parsed whole; use NDJSON for very large banks
+        try:
+            records = json.load(codecs.getreader('utf-8-sig')(stream))
+        except ValueError as e:
+            raise ImportFormatError(f"Invalid JSON: {e}")
+        if not isinstance(records, list):
+            raise ImportFormatError("A JSON import must be an array of question objects.")
+        for number, record in enumerate(records, start=1):
+            yield number, _normalize(record) if isinstance(record, dict) else ValueError("expected an object")
+    else:
+        raise ImportFormatError(f"Unsupported import format '{format_type}'.")
+
+
+def _text(row, field, required=True):
+    value = row.get(field)
+    value = '' if value is None else str(value).strip()
+    if required and not value:
+        raise ValueError(f"missing {field}")
+    return value
+
+
+def _integer(row, field, default=None, low=None, high=None):
+    value = row.get(field)
+    if value is None or str(value).strip() == '':
+        if default is None:
+            raise ValueError(f"missing {field}")
+        return default
+    # JSON numbers may arrive as 5.0; any whole value is accepted
+    try:
+        number = Decimal(str(value).strip())
+    except InvalidOperation:
+        number = None
+    if number is None or not number.is_finite() or number != number.to_integral_value():
+        raise ValueError(f"{field} must be a whole number, got {value!r}")
+    number = int(number)
+    if (low is not None and number < low) or (high is not None and number > high):
+        raise ValueError(f"{field} must be between {low} and {high}, got {number}")
+    return number
+
+
+class _Names:
+    """Subject and topic ids by name, created on first use"""
+
+    def __init__(self):
+        self.subjects = {}
+        for subject_id, name in Subject.objects.order_by('id').values_list('id', 'name'):
+            self.subjects.setdefault(name, subject_id)
+        self.topics = {}
+        for topic_id, subject_id, name in Topic.objects.order_by('id').values_list('id', 'sub_id', 'name'):
+            self.topics.setdefault((subject_id, name), topic_id)
+
+    def resolve(self, subject_name, topic_name):
+        subject_id = self.subjects.get(subject_name)
+        if subject_id is None:
+            subject_id = self.subjects[subject_name] = Subject.objects.create(name=subject_name).id
+        topic_id = self.topics.get((subject_id, topic_name))
+        if topic_id is None:
+            topic_id = self.topics[(subject_id, topic_name)] = Topic.objects.create(name=topic_name, sub_id=subject_id).id
+        return subject_id, topic_id
+
+
+def build_question(row, user, names):
+    """Unsaved QPattern for one import row; raises ValueError when the row is invalid"""
+    question = _text(row, 'question')
+    subject_name = _text(row, 'subject')
+    topic_name = _text(row, 'topic')
+    for label, name in (('subject', subject_name), ('topic', topic_name)):
+        if len(name) > NAME_MAX_LENGTH:
+            raise ValueError(f"{label} name is longer than {NAME_MAX_LENGTH} characters")
+    marks = _integer(row, 'marks', low=1)
+    difficulty = _integer(row, 'difficulty', default=3, low=1, high=5)
+    co = _integer(row, 'co', default=0, low=0)
+    imgurl = _text(row, 'imgurl', required=False)
+    if len(imgurl) > 128:
+        raise ValueError("image url is longer than 128 characters")
+
+    subject_id, topic_id = names.resolve(subject_name, topic_name)
+    return QPattern(
+        user=user, subject_id=subject_id, topic_id=topic_id, question=question, preview=make_preview(question),
+        answer=_text(row, 'answer', required=False), marks=marks, difficulty=difficulty,
+        co=co, imgurl=imgurl,
+    )
+
+
+def _save_batch(batch):
+    """Insert one batch and apply the updates its skipped save signals would have made"""
+    with transaction.atomic():
+        QPattern.objects.bulk_create(batch)
+        index_questions(batch)
+        store_signatures(batch)
+        counters.bump(counters.combine({VERSION_COUNTER: 1}, *(
+            counters.question_deltas(q.marks, q.difficulty, q.user_id, q.subject_id) for q in batch
+        )))
+    invalidate_subject_breakdown()
+    caching.expire(caching.DASHBOARD)
+
+
+def import_questions(rows, user, batch_size=IMPORT_BATCH_SIZE):
+    """Insert questions for user from (row number, field dict) pairs.
+
+    Returns an ImportResult with the number created, the number of rows
+    skipped and up to MAX_REPORTED_ERRORS (row number, message) pairs.
+    When reading fails after some rows, those rows are saved and
+    ImportInterrupted carries the result and the last row read.
+    """
+    names = _Names()
+    batch = []
+    created = failed = 0
+    errors = []
+    rows = iter(rows)
+    last_row = None
+    while True:
+        try:
+            number, row = next(rows)
+        except StopIteration:
+            break
+        except (ImportFormatError, UnicodeDecodeError, csv.Error) as e:
+            if last_row is None:
+                raise
+            if batch:
+                _save_batch(batch)
+                created += len(batch)
+            raise ImportInterrupted(ImportResult(created, failed, errors), last_row, e)
+        last_row = number
+        try:
+            if isinstance(row, Exception):
+                raise row
+            batch.append(build_question(row, user, names))
+        except ValueError as e:
+            failed += 1
+            if len(errors) < MAX_REPORTED_ERRORS:
+                errors.append((number, str(e)))
+            continue
+        if len(batch) >= batch_size:
+            _save_batch(batch)
+            created += len(batch)
+            batch = []
+    if batch:
+        _save_batch(batch)
+        created += len(batch)
+    return ImportResult(created, failed, errors)
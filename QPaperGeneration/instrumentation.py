@@ -0,0 +1,232 @@
+"""Per-request query and timing instrumentation, shown on the system settings page.
+
+query_timing_middleware records, for every request, the view it resolved
+to, the number of SQL queries and their total time, the time spent outside
+SQL (view code and template rendering), the response size and the most
+repeated statement, the usual sign of an N+1. Records go into a ring
+buffer of the last REQUEST_LOG_SIZE requests, which endpoint_stats() rolls
+up per view.
+
+Queries slower than SLOW_QUERY_MS are kept in a second ring buffer together
+with their EXPLAIN output, taken once the response is ready so the plan
+never runs inside another query's cursor.
+
+Queries are seen through an execute wrapper installed on every database
+connection and reported to the request in the current context, so the
+ORM work the async views run in their thread pools is counted too. Both
+buffers live in the process; each worker shows its own traffic.
+"""
+import contextvars
+import threading
+import time
+from collections import Counter, defaultdict, deque
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.utils import timezone
+from django.utils.decorators import sync_and_async_middleware
+
+from QPaperGeneration import metrics
+
+_request = contextvars.ContextVar('qgen_request_record', default=None)
+
+_lock = threading.Lock()
+_requests = deque(maxlen=getattr(settings, 'REQUEST_LOG_SIZE', 1000))
+_slow_queries = deque(maxlen=getattr(settings, 'SLOW_QUERY_LOG_SIZE', 50))
+
+
+def slow_query_ms():
+    return getattr(settings, 'SLOW_QUERY_MS', 100)
+
+
+class RequestRecord:
+    """Queries seen while serving one request"""
+
+    def __init__(self):
+        self.queries = 0
+        self.sql_seconds = 0.0
+        self.statements = Counter()
+        self.slow = []
+        self.lock = threading.Lock()
+
+    def add(self, alias, sql, params, seconds):
+        with self.lock:
+            self.queries += 1
+            self.sql_seconds += seconds
+            self.statements[sql] += 1
+            if seconds * 1000 >= slow_query_ms():
+                self.slow.append((alias, sql, params, seconds))
+
+
+def _record_query(execute, sql, params, many, context):
+    record = _request.get()
+    if record is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        record.add(context['connection'].alias, sql, params, time.perf_counter() - start)
+
+
+def _install(connection, **kwargs):
+    if _record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_record_query)
+
+
+def install_query_wrappers():
+    """Wrap every connection this thread has now and every one opened later"""
+    connection_created.connect(_install, dispatch_uid='qgen_record_query')
+    for connection in connections.all(initialized_only=True):
+        _install(connection)
+
+
+def _explain(alias, sql, params):
+    """Query plan lines of a slow SELECT, or None when it cannot be explained"""
+    if not sql.lstrip().upper().startswith('SELECT'):
+        return None
+    connection = connections[alias]
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(connection.ops.explain_query_prefix() + ' ' + sql, params)
+            return [' '.join(str(value) for value in row) for row in cursor.fetchall()]
+    except Exception as e:
+        return [f"EXPLAIN failed: {e}"]
+
+
+# Metric label of requests that resolved to no view (404s, scanners), so
+# every unknown URL shares one series instead of adding its own
+UNRESOLVED_VIEW = 'unresolved'
+
+
+def _view_name(request):
+    """Name of the view that handled request, or None when none did"""
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return None
+    return match.view_name or match._func_path
+
+
+def _response_size(response):
+    if response.streaming:
+        return int(response.get('Content-Length') or 0) or None
+    return len(response.content)
+
+
+def _finish(request, response, record, started):
+    """Store the request record and explain its slow queries"""
+    elapsed = time.perf_counter() - started
+    view = _view_name(request)
+    label = view or UNRESOLVED_VIEW
+    # The request log keeps the raw path of unresolved requests
+    view = view or request.path
+    repeated_sql, repeated = record.statements.most_common(1)[0] if record.statements else ('', 0)
+    entry = {
+        'view': view,
+        'method': request.method,
+        'status': response.status_code,
+        'queries': record.queries,
+        'sql_ms': record.sql_seconds * 1000,
+        'total_ms': elapsed * 1000,
+        'render_ms': max(elapsed - record.sql_seconds, 0) * 1000,
+        'bytes': _response_size(response),
+        'repeated': repeated,
+        'repeated_sql': repeated_sql,
+        'at': timezone.now(),
+    }
+    slow = [{
+        'view': view,
+        'sql': sql,
+        'ms': seconds * 1000,
+        'plan': _explain(alias, sql, params),
+        'at': entry['at'],
+    } for alias, sql, params, seconds in record.slow]
+    with _lock:
+        _requests.append(entry)
+        _slow_queries.extend(slow)
+    metrics.view_queries.observe(record.queries, view=label)
+    metrics.view_seconds.observe(elapsed, view=label)
+
+
+@sync_and_async_middleware
+def query_timing_middleware(get_response):
+    """Record query counts, SQL time, render time and response size per request"""
+    install_query_wrappers()
+
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            record = RequestRecord()
+            token = _request.set(record)
+            started = time.perf_counter()
+            try:
+                response = await get_response(request)
+            finally:
+                _request.reset(token)
+            await sync_to_async(_finish)(request, response, record, started)
+            return response
+    else:
+        def middleware(request):
+            record = RequestRecord()
+            token = _request.set(record)
+            started = time.perf_counter()
+            try:
+                response = get_response(request)
+            finally:
+                _request.reset(token)
+            _finish(request, response, record, started)
+            return response
+    return middleware
+
+
+def recent_requests():
+    with _lock:
+        return list(_requests)
+
+
+def slow_queries():
+    """Logged slow queries, newest first"""
+    with _lock:
+        return list(reversed(_slow_queries))
+
+
+def _percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)]
+
+
+def endpoint_stats():
+    """Per view roll-up of the recorded requests"""
+    by_view = defaultdict(list)
+    for entry in recent_requests():
+        by_view[entry['view']].append(entry)
+    stats = []
+    for view, entries in by_view.items():
+        total = [entry['total_ms'] for entry in entries]
+        queries = [entry['queries'] for entry in entries]
+        sizes = [entry['bytes'] for entry in entries if entry['bytes'] is not None]
+        worst = max(entries, key=lambda entry: entry['repeated'])
+        stats.append({
+            'view': view,
+            'requests': len(entries),
+            'avg_ms': sum(total) / len(total),
+            'p95_ms': _percentile(total, 0.95),
+            'max_ms': max(total),
+            'avg_sql_ms': sum(entry['sql_ms'] for entry in entries) / len(entries),
+            'avg_render_ms': sum(entry['render_ms'] for entry in entries) / len(entries),
+            'avg_queries': sum(queries) / len(queries),
+            'max_queries': max(queries),
+            'avg_bytes': sum(sizes) / len(sizes) if sizes else None,
+            'repeated': worst['repeated'],
+            'repeated_sql': worst['repeated_sql'],
+        })
+    return stats
+
+
+def slowest_endpoints(limit=10):
+    return sorted(endpoint_stats(), key=lambda stat: stat['p95_ms'], reverse=True)[:limit]
+
+
+def most_queries(limit=10):
+    return sorted(endpoint_stats(), key=lambda stat: stat['max_queries'], reverse=True)[:limit]
@@ -0,0 +1,123 @@
+"""Background PDF generation jobs, queued in the database and run by `manage.py run_paper_worker`.
+
+A worker claims pending jobs under its own name and refreshes their
+heartbeat while it renders them. Only running jobs whose heartbeat has
+gone quiet for PAPER_JOB_STALE_SECONDS are queued again, so a slow render
+in a live worker is never run twice.
+"""
+import os
+import socket
+import uuid
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+
+from QPaperGeneration.models import PaperJob, QPattern
+from QPaperGeneration.pdf import staff_paper_layout
+
+
+def _job_dir():
+    return Path(getattr(settings, 'PAPER_JOB_DIR', Path(settings.BASE_DIR) / 'paper_jobs'))
+
+
+def build_staff_paper(payload):
+    """Layout and download name for a staff paper job"""
+    found = QPattern.objects.select_related('subject', 'topic').in_bulk(payload['question_ids'])
+    questions = [found[qid] for qid in payload['question_ids'] if qid in found]
+    total_marks = sum(question.marks for question in questions)
+    generated_at = datetime.fromisoformat(payload['generated_at'])
+    layout = staff_paper_layout(payload['title'], total_marks, questions, payload['instructions'],
+                                payload['generated_by'], generated_at)
+    return layout, f"Staff_Generated_Paper_{generated_at.strftime('%Y%m%d_%H%M')}.pdf"
+
+
+# Job kind -> function(payload) returning (layout, download filename)
+JOB_BUILDERS = {
+    'staff_paper': build_staff_paper,
+}
+
+
+def enqueue(user, kind, title, payload):
+    """Queue a generation job for the worker"""
+    job = PaperJob(user=user, kind=kind, title=title)
+    job.set_payload(payload)
+    job.save()
+    return job
+
+
+def worker_name():
+    """A name for this worker process, unique across hosts and restarts"""
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+def claim_jobs(limit, worker):
+    """Atomically move up to limit pending jobs to running under worker and return them"""
+    claimed = []
+    pending = PaperJob.objects.filter(status='pending').order_by('created_at').values_list('id', flat=True)[:limit]
+    for job_id in list(pending):
+        now = timezone.now()
+        # The status filter makes the claim safe against concurrent workers
+        if PaperJob.objects.filter(id=job_id, status='pending').update(
+                status='running', started_at=now, claimed_by=worker, heartbeat_at=now):
+            claimed.append(PaperJob.objects.get(id=job_id))
+    return claimed
+
+
+def heartbeat(worker):
+    """Mark the worker's running jobs as still alive"""
+    return PaperJob.objects.filter(status='running', claimed_by=worker).update(heartbeat_at=timezone.now())
+
+
+def requeue_stale(stale_after=None):
+    """Return running jobs whose worker stopped sending heartbeats to the queue"""
+    if stale_after is None:
+        stale_after = timedelta(seconds=getattr(settings, 'PAPER_JOB_STALE_SECONDS', 120))
+    cutoff = timezone.now() - stale_after
+    # Jobs claimed before heartbeats existed only have started_at to go by
+    quiet = Q(heartbeat_at__lt=cutoff) | Q(heartbeat_at__isnull=True, started_at__lt=cutoff)
+    return PaperJob.objects.filter(quiet, status='running').update(
+        status='pending', started_at=None, claimed_by='', heartbeat_at=None)
+
+
+def purge_finished(older_than=None):
+    """Delete finished jobs and their PDFs once they are past retention"""
+    if older_than is None:
+        older_than = timedelta(days=getattr(settings, 'PAPER_JOB_RETENTION_DAYS', 7))
+    expired = PaperJob.objects.filter(status__in=['done', 'failed'], finished_at__lt=timezone.now() - older_than)
+    for artifact in expired.exclude(artifact='').values_list('artifact', flat=True):
+        Path(artifact).unlink(missing_ok=True)
+    deleted, _ = expired.delete()
+    return deleted
+
+
+def prepare(job):
+    """Build the layout for a claimed job, or mark the job failed"""
+    try:
+        layout, filename = JOB_BUILDERS[job.kind](job.get_payload())
+    except Exception as e:
+        fail(job, e)
+        return None
+    job.filename = filename
+    return layout
+
+
+def complete(job, data):
+    """Store the rendered PDF and mark the job done"""
+    directory = _job_dir()
+    directory.mkdir(parents=True, exist_ok=True)
+    path = directory / f"job_{job.id}.pdf"
+    path.write_bytes(data)
+    job.artifact = str(path)
+    job.status = 'done'
+    job.finished_at = timezone.now()
+    job.save(update_fields=['artifact', 'filename', 'status', 'finished_at'])
+
+
+def fail(job, error):
+    job.status = 'failed'
+    job.error = str(error)
+    job.finished_at = timezone.now()
+    job.save(update_fields=['status', 'error', 'finished_at'])
@@ -0,0 +1,95 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from QPaperGeneration.models import QPattern, StudentGeneratedPaper, User
+from QPaperGeneration.selection import CANDIDATE_FIELDS
+
+# Columns of the indexes added for the generator's filters (migration 0015)
+GENERATOR_INDEXES = [
+    (QPattern, ['subject_id', 'marks']),
+    (QPattern, ['topic_id', 'marks', 'user_id']),
+    (QPattern, ['difficulty']),
+    (QPattern, ['co']),
+    (StudentGeneratedPaper, ['student_id', 'created_at']),
+    (User, ['role']),
+]
+
+
+def hot_queries():
+    """(label, queryset) pairs shaped like the queries the generator views run"""
+    sample = QPattern.objects.order_by('id').values('subject_id', 'topic_id', 'user_id', 'marks', 'difficulty', 'co').first()
+    if sample is None:
+        raise CommandError("There are no questions to benchmark against.")
+    topics = list(QPattern.objects.filter(subject_id=sample['subject_id']).order_by()
+                  .values_list('topic_id', flat=True).distinct())
+    student = (StudentGeneratedPaper.objects.order_by('id').values_list('student_id', flat=True).first()
+               or sample['user_id'])
+    return [
+        ("papergen1: subject + marks", QPattern.objects.filter(subject_id=sample['subject_id'], marks=sample['marks'])),
+        ("papergen1: subject + marks + author", QPattern.objects.filter(
+            subject_id=sample['subject_id'], marks=sample['marks'], user_id=sample['user_id'])),
+        ("papergen2: topics + marks + author", QPattern.objects.filter(
+            topic_id__in=topics, marks__in=[2, 5, 10], user_id=sample['user_id']).values_list(*CANDIDATE_FIELDS)),
+        ("explore_data: difficulty", QPattern.objects.filter(difficulty=sample['difficulty'])),
+        ("explore_data: CO", QPattern.objects.filter(co=sample['co'])),
+        ("student papers, newest first", StudentGeneratedPaper.objects.filter(student_id=student).order_by('-created_at')),
+        ("users by role", User.objects.filter(role='staff')),
+    ]
+
+
+class Command(BaseCommand):
+    help = ("Show query plans and timings of the generator's hot queries with and without "
+            "the indexes from migration 0015. The indexes are dropped inside a transaction "
+            "that is rolled back; run it against a copy of production data, not a live site.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=5, help="Timed runs per query (default %(default)s)")
+
+    def handle(self, *args, **options):
+        queries = hot_queries()
+        after = self.measure(queries, options['repeat'], 'after')
+        with transaction.atomic():
+            dropped = self.drop_generator_indexes()
+            before = self.measure(queries, options['repeat'], 'before')
+            transaction.set_rollback(True)
+        self.stdout.write(f"Dropped {len(dropped)} index(es) for the 'before' run: {', '.join(dropped) or 'none'}\n")
+
+        for label, _queryset in queries:
+            (plan_before, ms_before), (plan_after, ms_after) = before[label], after[label]
+            self.stdout.write(self.style.MIGRATE_HEADING(label))
+            self.stdout.write(f"  before ({ms_before:.2f} ms): " + "\n    ".join(plan_before))
+            self.stdout.write(f"  after  ({ms_after:.2f} ms): " + "\n    ".join(plan_after))
+
+    def measure(self, queries, repeat, phase):
+        """label -> (query plan lines, best time in ms of fetching every row)"""
+        results = {}
+        with connection.cursor() as cursor:
+            for label, queryset in queries:
+                sql, params = queryset.query.sql_with_params()
+                # The phase comment keeps SQLite from reusing a cached EXPLAIN
+                # statement, whose plan would not notice the dropped indexes
+                sql = f"{sql} /* {phase} */"
+                cursor.execute(f"{connection.ops.explain_query_prefix()} {sql}", params)
+                plan = [str(row[-1]) for row in cursor.fetchall()]
+                best = None
+                for _ in range(max(repeat, 1)):
+                    start = time.perf_counter()
+                    cursor.execute(sql, params)
+                    cursor.fetchall()
+                    elapsed = (time.perf_counter() - start) * 1000
+                    best = elapsed if best is None else min(best, elapsed)
+                results[label] = (plan, best)
+        return results
+
+    def drop_generator_indexes(self):
+        dropped = []
+        with connection.cursor() as cursor:
+            for model, columns in GENERATOR_INDEXES:
+                table = model._meta.db_table
+                for name, info in connection.introspection.get_constraints(cursor, table).items():
+                    if info['index'] and not info['unique'] and not info['primary_key'] and info['columns'] == columns:
+                        cursor.execute(f'DROP INDEX {connection.ops.quote_name(name)}')
+                        dropped.append(name)
+        return dropped
@@ -0,0 +1,52 @@
+import csv
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from QPaperGeneration.importer import (
+    IMPORT_BATCH_SIZE, IMPORT_FORMATS, ImportFormatError, ImportInterrupted, guess_format, import_questions,
+    read_rows,
+)
+from QPaperGeneration.models import User
+
+
+class Command(BaseCommand):
+    help = "Bulk import questions from a CSV, JSON or NDJSON file"
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="File to import")
+        parser.add_argument('--user', required=True, help="Username the questions are created for")
+        parser.add_argument('--format', choices=IMPORT_FORMATS, help="File format (default: from the extension)")
+        parser.add_argument('--batch-size', type=int, default=IMPORT_BATCH_SIZE, help="Rows per insert transaction")
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options['user'])
+        except User.DoesNotExist:
+            raise CommandError(f"No user named '{options['user']}'.")
+        format_type = options['format'] or guess_format(options['path'])
+        if format_type is None:
+            raise CommandError("Cannot tell the file format from its name; pass --format.")
+
+        started = time.monotonic()
+        interrupted = None
+        try:
+            with open(options['path'], 'rb') as stream:
+                result = import_questions(read_rows(stream, format_type), user, batch_size=options['batch_size'])
+        except OSError as e:
+            raise CommandError(str(e))
+        except ImportInterrupted as e:
+            result, interrupted = e.result, e
+        except (ImportFormatError, UnicodeDecodeError, csv.Error) as e:
+            raise CommandError(f"Could not read {options['path']}: {e}")
+
+        for number, message in result.errors:
+            self.stderr.write(f"Row {number}: {message}")
+        if result.failed > len(result.errors):
+            self.stderr.write(f"... and {result.failed - len(result.errors)} more row error(s)")
+        summary = (f"Imported {result.created} question(s), skipped {result.failed}, "
+                   f"in {time.monotonic() - started:.1f}s")
+        if interrupted:
+            raise CommandError(f"{summary}; could not read {options['path']} past row "
+                               f"{interrupted.last_row}: {interrupted.error}")
+        self.stdout.write(self.style.SUCCESS(summary))
@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+
+from QPaperGeneration import near_duplicates
+from QPaperGeneration.models import QPattern
+
+
+class Command(BaseCommand):
+    help = "Report groups of near-duplicate questions found through the MinHash index"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threshold', type=float, default=near_duplicates.DEFAULT_THRESHOLD,
+                            help="Minimum estimated similarity, 0 to 1 (default %(default)s)")
+        parser.add_argument('--user', help="Only look at questions created by this username")
+        parser.add_argument('--limit', type=int, default=50, help="Number of groups to print (default %(default)s)")
+        parser.add_argument('--rebuild', action='store_true', help="Recompute every signature first")
+
+    def handle(self, *args, **options):
+        if options['rebuild']:
+            total = near_duplicates.rebuild()
+            self.stdout.write(f"Signed {total} question(s)")
+
+        questions = None
+        if options['user']:
+            questions = QPattern.objects.filter(user__username=options['user'])
+        groups = near_duplicates.near_duplicate_groups(questions, options['threshold'])
+
+        shown = groups[:options['limit']]
+        texts = dict(QPattern.objects.filter(id__in={qid for group in shown for qid in group})
+                     .values_list('id', 'question'))
+        for number, group in enumerate(shown, start=1):
+            self.stdout.write(f"Group {number} ({len(group)} questions)")
+            for qid in sorted(group):
+                self.stdout.write(f"  #{qid}: {texts.get(qid, '')[:100]}")
+        duplicates = sum(len(group) - 1 for group in groups)
+        self.stdout.write(self.style.SUCCESS(
+            f"{len(groups)} group(s); {duplicates} question(s) could be removed as near-duplicates"))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from QPaperGeneration.search import rebuild_index
+
+
+class Command(BaseCommand):
+    help = "Rebuild the full-text search index over question and answer text"
+
+    def handle(self, *args, **options):
+        backend = rebuild_index()
+        if backend is None:
+            self.stdout.write("No full-text index on this database; search uses icontains.")
+        else:
+            self.stdout.write(self.style.SUCCESS(f"Rebuilt the {backend} search index"))
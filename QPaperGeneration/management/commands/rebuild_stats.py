@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from QPaperGeneration import counters
+
+
+class Command(BaseCommand):
+    help = "Recount every dashboard statistic from the source tables"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true',
+                            help="Only report counters that drifted from a fresh recount")
+
+    def handle(self, *args, **options):
+        if options['check']:
+            fresh = counters.compute()
+            stored = counters.read_all()
+            # Counters missing on either side count as zero, so stale stored ones show up too
+            names = set(fresh) | set(stored)
+            drifted = {name: (stored.get(name, 0), fresh.get(name, 0)) for name in names
+                       if stored.get(name, 0) != fresh.get(name, 0)}
+            for name, (old, new) in sorted(drifted.items()):
+                self.stdout.write(f"{name}: stored {old}, actual {new}")
+            self.stdout.write(f"{len(drifted)} of {len(names)} counter(s) drifted")
+            return
+
+        total = counters.rebuild()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {total} counter(s)"))
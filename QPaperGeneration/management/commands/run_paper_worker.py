@@ -0,0 +1,71 @@
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from QPaperGeneration import jobs
+from QPaperGeneration.pdf import render_bytes
+
+# Seconds between retention sweeps of finished jobs
+PURGE_INTERVAL = 60 * 60
+
+
+class Command(BaseCommand):
+    help = "Run queued PDF generation jobs in a local process pool"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=getattr(settings, 'PAPER_RENDER_WORKERS', 1),
+                            help="Number of render processes")
+        parser.add_argument('--poll', type=float, default=1.0, help="Seconds to wait when the queue is empty")
+        parser.add_argument('--once', action='store_true', help="Exit once the queue is empty")
+
+    def handle(self, *args, **options):
+        workers = max(1, options['workers'])
+        self.worker = jobs.worker_name()
+        self.heartbeat_seconds = getattr(settings, 'PAPER_JOB_HEARTBEAT_SECONDS', 15)
+        self.stdout.write(f"Paper worker {self.worker} started with {workers} render process(es)")
+
+        last_purge = None
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            while True:
+                # Jobs of workers that stopped beating go back to the queue
+                requeued = jobs.requeue_stale()
+                if requeued:
+                    self.stdout.write(f"Requeued {requeued} stale job(s)")
+                if last_purge is None or time.monotonic() - last_purge >= PURGE_INTERVAL:
+                    purged = jobs.purge_finished()
+                    if purged:
+                        self.stdout.write(f"Deleted {purged} expired job(s)")
+                    last_purge = time.monotonic()
+
+                claimed = jobs.claim_jobs(workers, self.worker)
+                if not claimed:
+                    if options['once']:
+                        break
+                    time.sleep(options['poll'])
+                    continue
+
+                # Layouts need the database, so they are built here; only the
+                # ReportLab rendering runs in the pool
+                futures = {}
+                for job in claimed:
+                    layout = jobs.prepare(job)
+                    if layout is not None:
+                        futures[pool.submit(render_bytes, layout)] = job
+                self.finish(futures)
+
+    def finish(self, futures):
+        """Store each render as it completes, beating for the rest meanwhile"""
+        pending = set(futures)
+        while pending:
+            done, pending = wait(pending, timeout=self.heartbeat_seconds, return_when=FIRST_COMPLETED)
+            jobs.heartbeat(self.worker)
+            for future in done:
+                job = futures[future]
+                try:
+                    jobs.complete(job, future.result())
+                    self.stdout.write(f"Job {job.id} done")
+                except Exception as e:
+                    jobs.fail(job, e)
+                    self.stderr.write(f"Job {job.id} failed: {e}")
@@ -0,0 +1,126 @@
+"""In-process metrics served as Prometheus text by the /metrics view.
+
+No client library or push gateway: counters and histograms are kept in
+this module and rendered in the text exposition format on each scrape.
+Like the request log in instrumentation.py they are per process, so with
+several workers scrape each one (or sum them in Prometheus). Renders done
+in the batch process pool or by run_paper_worker happen in other processes
+and are not observed here.
+"""
+import threading
+from bisect import bisect_left
+
+_lock = threading.Lock()
+_metrics = []
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+
+def _format_number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Monotonic counter, optionally split by labels"""
+
+    kind = 'counter'
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._values = {}
+        _metrics.append(self)
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels[name]) for name in self.labels)
+        with _lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        for key, value in sorted(self._values.items()):
+            yield f'{self.name}{_format_labels(self.labels, key)} {_format_number(value)}'
+
+
+class Histogram:
+    """Cumulative bucket histogram with sum and count, optionally split by labels"""
+
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, buckets, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+        self._values = {}
+        _metrics.append(self)
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels[name]) for name in self.labels)
+        with _lock:
+            counts, total = self._values.get(key, ([0] * len(self.buckets), 0))
+            counts[bisect_left(self.buckets, value)] += 1
+            self._values[key] = (counts, total + value)
+
+    def samples(self):
+        for key, (counts, total) in sorted(self._values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                le = _format_labels(self.labels, key, [('le', _format_number(bound))])
+                yield f'{self.name}_bucket{le} {cumulative}'
+            yield f'{self.name}_sum{_format_labels(self.labels, key)} {_format_number(total)}'
+            yield f'{self.name}_count{_format_labels(self.labels, key)} {cumulative}'
+
+
+def exposition():
+    """Every metric in the Prometheus text format, version 0.0.4"""
+    lines = []
+    with _lock:
+        for metric in _metrics:
+            lines.append(f'# HELP {metric.name} {metric.documentation}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            lines.extend(metric.samples())
+    return '\n'.join(lines) + '\n'
+
+
+papers_generated = Counter(
+    'qgen_papers_generated_total', "Question papers generated, by code path and paper type",
+    labels=('source', 'type'),
+)
+papers_enqueued = Counter(
+    'qgen_papers_enqueued_total', "Question papers queued for the background worker, by code path and paper type",
+    labels=('source', 'type'),
+)
+render_seconds = Histogram(
+    'qgen_pdf_render_seconds', "Time to render one question paper PDF",
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+render_pages = Histogram(
+    'qgen_pdf_pages', "Pages per rendered question paper PDF",
+    buckets=(1, 2, 3, 5, 10, 20, 50, 100, 250),
+)
+view_queries = Histogram(
+    'qgen_view_queries', "SQL queries run per request, by view",
+    buckets=(0, 1, 2, 5, 10, 20, 50, 100, 250, 1000), labels=('view',),
+)
+view_seconds = Histogram(
+    'qgen_view_seconds', "Request time, by view",
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10), labels=('view',),
+)
+cache_requests = Counter(
+    'qgen_cache_requests_total', "Cache lookups by cache and result (hit or miss)",
+    labels=('cache', 'result'),
+)
+
+
+def cache_lookup(cache, hit):
+    cache_requests.inc(cache=cache, result='hit' if hit else 'miss')
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:19
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('QPaperGeneration', '0007_studentgeneratedpaper_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PaperQuestion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('position', models.PositiveIntegerField()),
+                ('paper', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='paper_questions', to='QPaperGeneration.studentgeneratedpaper')),
+                ('question', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='paper_questions', to='QPaperGeneration.qpattern')),
+            ],
+            options={
+                'ordering': ['paper', 'position'],
+            },
+        ),
+        migrations.AddField(
+            model_name='studentgeneratedpaper',
+            name='questions',
+            field=models.ManyToManyField(related_name='student_papers', through='QPaperGeneration.PaperQuestion', to='QPaperGeneration.qpattern'),
+        ),
+        migrations.AddConstraint(
+            model_name='paperquestion',
+            constraint=models.UniqueConstraint(fields=('paper', 'position'), name='unique_paper_position'),
+        ),
+    ]
@@ -0,0 +1,83 @@
+import json
+import logging
+
+from django.db import migrations
+
+logger = logging.getLogger(__name__)
+
+
+def _question_id(value):
+    """The integer id in a stored value (legacy views saved POST strings), or None"""
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, float):
+        return int(value) if value.is_integer() else None
+    try:
+        return int(str(value).strip())
+    except ValueError:
+        return None
+
+
+def copy_question_ids(apps, schema_editor):
+    """Move the JSON encoded question_ids of every paper into PaperQuestion rows"""
+    StudentGeneratedPaper = apps.get_model('QPaperGeneration', 'StudentGeneratedPaper')
+    PaperQuestion = apps.get_model('QPaperGeneration', 'PaperQuestion')
+    QPattern = apps.get_model('QPaperGeneration', 'QPattern')
+
+    existing = set(QPattern.objects.values_list('id', flat=True))
+    rows = []
+    skipped = []
+    for paper_id, question_ids in StudentGeneratedPaper.objects.values_list('id', 'question_ids').iterator():
+        try:
+            question_ids = json.loads(question_ids)
+        except (TypeError, ValueError):
+            question_ids = None
+        if not isinstance(question_ids, list):
+            skipped.append((paper_id, question_ids, "unreadable question_ids"))
+            continue
+        position = 0
+        for value in question_ids:
+            qid = _question_id(value)
+            if qid is None:
+                skipped.append((paper_id, value, "not a question id"))
+            elif qid not in existing:
+                # Questions deleted since the paper was generated are dropped
+                skipped.append((paper_id, value, "question deleted"))
+            else:
+                rows.append(PaperQuestion(paper_id=paper_id, question_id=qid, position=position))
+                position += 1
+        if len(rows) >= 1000:
+            PaperQuestion.objects.bulk_create(rows)
+            rows = []
+    PaperQuestion.objects.bulk_create(rows)
+
+    if skipped:
+        logger.warning(
+            "Skipped %d stored question id(s) while copying papers:\n%s", len(skipped),
+            "\n".join(f"  paper {paper_id}: {value!r} ({reason})" for paper_id, value, reason in skipped),
+        )
+
+
+def restore_question_ids(apps, schema_editor):
+    """Copy the rows back into question_ids and remove them, so the copy can run again"""
+    StudentGeneratedPaper = apps.get_model('QPaperGeneration', 'StudentGeneratedPaper')
+    PaperQuestion = apps.get_model('QPaperGeneration', 'PaperQuestion')
+
+    question_ids = {}
+    for paper_id, qid in PaperQuestion.objects.order_by('paper_id', 'position').values_list('paper_id', 'question_id'):
+        question_ids.setdefault(paper_id, []).append(qid)
+    for paper in StudentGeneratedPaper.objects.all():
+        paper.question_ids = json.dumps(question_ids.get(paper.id, []))
+        paper.save(update_fields=['question_ids'])
+    PaperQuestion.objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('QPaperGeneration', '0008_paperquestion'),
+    ]
+
+    operations = [
+        migrations.RunPython(copy_question_ids, restore_question_ids),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('QPaperGeneration', '0009_copy_question_ids_to_paperquestion'),
+    ]
+
+    operations = [
+        # Give the column a default first so the removal can be reversed on populated tables
+        migrations.AlterField(
+            model_name='studentgeneratedpaper',
+            name='question_ids',
+            field=models.TextField(default='[]'),
+        ),
+        migrations.RemoveField(
+            model_name='studentgeneratedpaper',
+            name='question_ids',
+        ),
+    ]
@@ -0,0 +1,59 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:28
+
+from collections import defaultdict
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def fill_counters(apps, schema_editor):
+    """Seed the counters from the existing rows, as counters.compute() counted them at this migration"""
+    QPattern = apps.get_model('QPaperGeneration', 'QPattern')
+    User = apps.get_model('QPaperGeneration', 'User')
+    StudentGeneratedPaper = apps.get_model('QPaperGeneration', 'StudentGeneratedPaper')
+    Subject = apps.get_model('QPaperGeneration', 'Subject')
+    Topic = apps.get_model('QPaperGeneration', 'Topic')
+    StatCounter = apps.get_model('QPaperGeneration', 'StatCounter')
+
+    values = defaultdict(int)
+    values['subjects'] = Subject.objects.count()
+    values['topics'] = Topic.objects.count()
+
+    questions = QPattern.objects.order_by()
+    totals = questions.aggregate(count=Count('id'), marks=Sum('marks'))
+    values['questions'] = totals['count']
+    values['questions:marks_total'] = totals['marks'] or 0
+    for field, prefix in (('marks', 'questions:marks'), ('difficulty', 'questions:difficulty'),
+                          ('user_id', 'questions:user'), ('subject_id', 'questions:subject')):
+        for key, count in questions.values_list(field).annotate(count=Count('id')):
+            values[f'{prefix}:{key}'] = count
+
+    for role, count in User.objects.order_by().values_list('role').annotate(count=Count('id')):
+        values['users'] += count
+        values[f'users:role:{role}'] = count
+
+    for role, count in StudentGeneratedPaper.objects.order_by().values_list('student__role').annotate(count=Count('id')):
+        values['papers'] += count
+        values[f'papers:role:{role}'] = count
+
+    StatCounter.objects.all().delete()
+    StatCounter.objects.bulk_create([StatCounter(name=name, value=value) for name, value in values.items()])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('QPaperGeneration', '0011_paperjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StatCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=64, unique=True)),
+                ('value', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
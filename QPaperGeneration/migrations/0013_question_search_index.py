@@ -0,0 +1,44 @@
+from django.db import migrations
+
+# Names as of this migration; search.py may rename or reshape its index later
+SEARCH_TABLE = 'QPaperGeneration_qpattern_fts'
+POSTGRES_INDEX = 'QPaperGeneration_qpattern_search_idx'
+QUESTION_TABLE = 'QPaperGeneration_qpattern'
+
+
+def create_search_index(apps, schema_editor):
+    """FTS5 table on SQLite, GIN tsvector index on PostgreSQL"""
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute(
+            f'CREATE VIRTUAL TABLE IF NOT EXISTS "{SEARCH_TABLE}" '
+            f"USING fts5(question, answer, tokenize='unicode61 remove_diacritics 2')"
+        )
+        schema_editor.execute(
+            f'INSERT INTO "{SEARCH_TABLE}" (rowid, question, answer) '
+            f'SELECT id, question, answer FROM "{QUESTION_TABLE}"'
+        )
+    elif vendor == 'postgresql':
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS "{POSTGRES_INDEX}" ON "{QUESTION_TABLE}" '
+            f"USING GIN (to_tsvector('english', question || ' ' || answer))"
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute(f'DROP TABLE IF EXISTS "{SEARCH_TABLE}"')
+    elif vendor == 'postgresql':
+        schema_editor.execute(f'DROP INDEX IF EXISTS "{POSTGRES_INDEX}"')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('QPaperGeneration', '0012_statcounter'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,105 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:41
+
+import re
+
+import django.db.models.deletion
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from django.db import migrations, models
+
+
+# MinHash parameters as near_duplicates.py had them at this migration. They
+# are copied so this migration keeps working whatever that module becomes;
+# signatures from a changed algorithm need `manage.py near_duplicates --rebuild`.
+SHINGLE_SIZE = 5
+NUM_PERM = 128
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+BATCH_SIZE = 2000
+
+_NON_WORD = re.compile(r'[\W_]+', re.UNICODE)
+
+
+def _hashing():
+    rng = np.random.default_rng(20240117)
+    a = rng.integers(1, 1 << 32, NUM_PERM, dtype=np.uint64)
+    b = rng.integers(0, 1 << 32, NUM_PERM, dtype=np.uint64)
+    band_mix = rng.integers(1, 1 << 63, ROWS, dtype=np.uint64) | np.uint64(1)
+    return a, b, band_mix
+
+
+def _signature(text, a, b):
+    data = np.frombuffer(_NON_WORD.sub(' ', (text or '').lower()).strip().encode('utf-8'),
+                         dtype=np.uint8).astype(np.uint64)
+    if len(data) == 0:
+        return None
+    if len(data) < SHINGLE_SIZE:
+        data = np.concatenate([np.zeros(SHINGLE_SIZE - len(data), dtype=np.uint64), data])
+    weights = np.array([257 ** power for power in range(SHINGLE_SIZE - 1, -1, -1)], dtype=np.uint64)
+    values = sliding_window_view(data, SHINGLE_SIZE) @ weights
+    shingles = np.unique((values * np.uint64(0x9E3779B97F4A7C15)) >> np.uint64(32))
+    permuted = (np.outer(shingles, a) + b) % np.uint64(4294967311)
+    return (permuted.min(axis=0) & np.uint64(0xFFFFFFFF)).astype(np.uint32)
+
+
+def sign_questions(apps, schema_editor):
+    """Compute signatures for the existing questions"""
+    QPattern = apps.get_model('QPaperGeneration', 'QPattern')
+    QuestionSignature = apps.get_model('QPaperGeneration', 'QuestionSignature')
+    SignatureBand = apps.get_model('QPaperGeneration', 'SignatureBand')
+    connection = schema_editor.connection
+    signature_table = connection.ops.quote_name(QuestionSignature._meta.db_table)
+    band_table = connection.ops.quote_name(SignatureBand._meta.db_table)
+    a, b, band_mix = _hashing()
+
+    def store(batch):
+        signatures = []
+        bands = []
+        for qid, text in batch:
+            sig = _signature(text, a, b)
+            if sig is None:
+                continue
+            signatures.append((qid, sig.tobytes()))
+            keys = (sig.reshape(BANDS, ROWS).astype(np.uint64) * band_mix).sum(axis=1).view(np.int64)
+            bands.extend((qid, band, int(key)) for band, key in enumerate(keys))
+        with connection.cursor() as cursor:
+            cursor.executemany(f'INSERT INTO {signature_table} (question_id, signature) VALUES (%s, %s)', signatures)
+            cursor.executemany(f'INSERT INTO {band_table} (question_id, band, key) VALUES (%s, %s, %s)', bands)
+
+    batch = []
+    for row in QPattern.objects.order_by('id').values_list('id', 'question').iterator(chunk_size=BATCH_SIZE):
+        batch.append(row)
+        if len(batch) >= BATCH_SIZE:
+            store(batch)
+            batch = []
+    store(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('QPaperGeneration', '0013_question_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QuestionSignature',
+            fields=[
+                ('question', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='signature', serialize=False, to='QPaperGeneration.qpattern')),
+                ('signature', models.BinaryField()),
+            ],
+        ),
+        migrations.CreateModel(
+            name='SignatureBand',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('band', models.PositiveSmallIntegerField()),
+                ('key', models.BigIntegerField()),
+                ('question', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='signature_bands', to='QPaperGeneration.qpattern')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['band', 'key'], name='QPaperGener_band_10ad4d_idx')],
+            },
+        ),
+        migrations.RunPython(sign_questions, migrations.RunPython.noop),
+    ]
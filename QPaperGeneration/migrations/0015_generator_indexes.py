@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('QPaperGeneration', '0014_question_signatures'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='user',
+            name='role',
+            field=models.CharField(choices=[('student', 'Student'), ('staff', 'Staff'), ('admin', 'Admin')], db_index=True, default='student', max_length=10),
+        ),
+        migrations.AddIndex(
+            model_name='qpattern',
+            index=models.Index(fields=['subject', 'marks'], name='QPaperGener_subject_aa1ee5_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='qpattern',
+            index=models.Index(fields=['topic', 'marks', 'user'], name='QPaperGener_topic_i_9e0141_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='qpattern',
+            index=models.Index(fields=['difficulty'], name='QPaperGener_difficu_ca9af2_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='qpattern',
+            index=models.Index(fields=['co'], name='QPaperGener_co_fbcf7d_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='studentgeneratedpaper',
+            index=models.Index(fields=['student', 'created_at'], name='QPaperGener_student_2e5903_idx'),
+        ),
+    ]
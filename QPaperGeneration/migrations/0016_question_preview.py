@@ -0,0 +1,49 @@
+# Generated by Django 5.2.18 on 2026-10-17 03:00
+
+from django.db import migrations, models
+from django.utils.text import Truncator
+
+BATCH_SIZE = 2000
+
+# make_preview as models.py had it at this migration, copied so that later
+# edits to the model cannot change what this migration writes
+PREVIEW_WORDS = 12
+PREVIEW_LENGTH = 120
+
+
+def _preview(text):
+    return Truncator(' '.join(text.split())).words(PREVIEW_WORDS)[:PREVIEW_LENGTH]
+
+
+def fill_previews(apps, schema_editor):
+    """Compute the preview of the existing questions"""
+    QPattern = apps.get_model('QPaperGeneration', 'QPattern')
+    connection = schema_editor.connection
+    # executemany keeps each batch to one prepared UPDATE rather than bulk_update's CASE chains
+    sql = 'UPDATE {} SET preview = %s WHERE id = %s'.format(connection.ops.quote_name(QPattern._meta.db_table))
+    rows = QPattern.objects.order_by('id').values_list('id', 'question')
+    batch = []
+    with connection.cursor() as cursor:
+        for question_id, question in rows.iterator(chunk_size=BATCH_SIZE):
+            batch.append((_preview(question), question_id))
+            if len(batch) == BATCH_SIZE:
+                cursor.executemany(sql, batch)
+                batch = []
+        if batch:
+            cursor.executemany(sql, batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('QPaperGeneration', '0015_generator_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='qpattern',
+            name='preview',
+            field=models.CharField(blank=True, editable=False, max_length=120),
+        ),
+        migrations.RunPython(fill_previews, migrations.RunPython.noop),
+    ]
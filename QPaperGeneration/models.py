@@ -1,6 +1,7 @@
 from django.contrib.auth.models import AbstractUser            
-from django.db import models                 
-import json                                          
+from django.db import models, transaction
+from django.utils.text import Truncator
+import json
                         
 class User(AbstractUser):                         
     ROLE_CHOICES = [                        
@@ -8,7 +9,11 @@ class User(AbstractUser):
         ('staff', 'Staff'),                     
         ('admin', 'Admin'),           
     ]    
-    role = models.CharField(max_length=10, choices=ROLE_CHOICES, default='student')
+    role = models.CharField(max_length=10, choices=ROLE_CHOICES, default='student', db_index=True)
+    
+    def delete(self, *args, **kwargs):
+        from QPaperGeneration.signals import cascade_delete
+        return cascade_delete(self, lambda: super(User, self).delete(*args, **kwargs))
     
     def __str__(self):
         return f"{self.username} ({self.role})"
@@ -16,6 +21,10 @@ class User(AbstractUser):
 class Subject(models.Model):
     name = models.CharField(max_length=32)
     
+    def delete(self, *args, **kwargs):
+        from QPaperGeneration.signals import cascade_delete
+        return cascade_delete(self, lambda: super(Subject, self).delete(*args, **kwargs))
+    
     def __str__(self):
         return f"{self.name}"
     
@@ -23,9 +32,20 @@ class Topic(models.Model):
     name = models.CharField(max_length=32)
     sub = models.ForeignKey(Subject, on_delete=models.CASCADE, related_name='subject')
     
+    def delete(self, *args, **kwargs):
+        from QPaperGeneration.signals import cascade_delete
+        return cascade_delete(self, lambda: super(Topic, self).delete(*args, **kwargs))
+    
     def __str__(self):
         return f"{self.sub} : {self.name}"
     
+PREVIEW_WORDS = 12
+PREVIEW_LENGTH = 120
+
+def make_preview(text):
+    """Short one-line snippet of a question, stored so list views never load the full text"""
+    return Truncator(' '.join(text.split())).words(PREVIEW_WORDS)[:PREVIEW_LENGTH]
+
 class QPattern(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="usr")
     topic = models.ForeignKey(Topic, on_delete=models.CASCADE, related_name='topic')
@@ -36,6 +56,24 @@ class QPattern(models.Model):
     marks = models.IntegerField(default=0)
     difficulty = models.IntegerField(default=1)
     co = models.IntegerField(default=0)
+    # make_preview(question), kept by save() and set by hand on bulk_create
+    preview = models.CharField(max_length=PREVIEW_LENGTH, blank=True, editable=False)
+
+    class Meta:
+        # Matched to the generator's filters; (topic, marks, user) also serves (topic, marks)
+        indexes = [
+            models.Index(fields=['subject', 'marks']),
+            models.Index(fields=['topic', 'marks', 'user']),
+            models.Index(fields=['difficulty']),
+            models.Index(fields=['co']),
+        ]
+
+    def save(self, *args, **kwargs):
+        self.preview = make_preview(self.question)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'question' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'preview'}
+        super().save(*args, **kwargs)
 
     def __str__(self):
         return f"{self.topic} : {self.question}"
@@ -45,33 +83,115 @@ class StudentGeneratedPaper(models.Model):
     title = models.CharField(max_length=255)
     total_marks = models.IntegerField()
     number_of_questions = models.IntegerField()
-    question_ids = models.TextField()  # Store question IDs as JSON
+    questions = models.ManyToManyField(QPattern, through='PaperQuestion', related_name='student_papers')
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)  # Add this field
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['student', 'created_at']),
+        ]
     
     def get_question_ids(self):
-        """Return question IDs as list"""
-        try:
-            return json.loads(self.question_ids)
-        except:
-            return []
+        """Return question IDs as list, in paper order"""
+        return list(self.paper_questions.values_list('question_id', flat=True))
     
     def set_question_ids(self, ids_list):
-        """Set question IDs from list"""
-        self.question_ids = json.dumps(ids_list)
+        """Replace the paper's questions with ids_list, keeping its order"""
+        with transaction.atomic():
+            self.paper_questions.all().delete()
+            PaperQuestion.objects.bulk_create([
+                PaperQuestion(paper=self, question_id=qid, position=position)
+                for position, qid in enumerate(ids_list)
+            ])
+        # bulk_create sends no signals; the detail pages show how often a question is used
+        from QPaperGeneration import caching
+        caching.expire(caching.QUESTION)
     
     def get_questions(self):
-        """Return actual question objects"""
-        from django.core.exceptions import ObjectDoesNotExist
-        question_ids = self.get_question_ids()
-        questions = []
-        for qid in question_ids:
-            try:
-                question = QPattern.objects.get(id=qid)
-                questions.append(question)
-            except ObjectDoesNotExist:
-                continue
-        return questions
+        """Return actual question objects in paper order"""
+        rows = self.paper_questions.select_related('question__subject', 'question__topic')
+        return [row.question for row in rows]
     
     def __str__(self):
         return f"{self.title} - {self.student.username}"
+
+class PaperQuestion(models.Model):
+    paper = models.ForeignKey(StudentGeneratedPaper, on_delete=models.CASCADE, related_name='paper_questions')
+    question = models.ForeignKey(QPattern, on_delete=models.CASCADE, related_name='paper_questions')
+    position = models.PositiveIntegerField()
+
+    class Meta:
+        ordering = ['paper', 'position']
+        constraints = [
+            models.UniqueConstraint(fields=['paper', 'position'], name='unique_paper_position'),
+        ]
+
+    def __str__(self):
+        return f"{self.paper_id} #{self.position}: {self.question_id}"
+
+class PaperJob(models.Model):
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='paper_jobs')
+    kind = models.CharField(max_length=32)
+    title = models.CharField(max_length=255)
+    payload = models.TextField(default='{}')  # Store job arguments as JSON
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    artifact = models.CharField(max_length=255, blank=True)
+    filename = models.CharField(max_length=255, blank=True)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    claimed_by = models.CharField(max_length=100, blank=True)  # Worker running the job
+    heartbeat_at = models.DateTimeField(null=True, blank=True)  # Last sign of life from that worker
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'created_at']),
+            models.Index(fields=['user', 'created_at']),
+        ]
+
+    def get_payload(self):
+        """Return job arguments as dict"""
+        return json.loads(self.payload)
+
+    def set_payload(self, payload):
+        """Set job arguments from dict"""
+        self.payload = json.dumps(payload)
+
+    @property
+    def is_finished(self):
+        return self.status in ('done', 'failed')
+
+    def __str__(self):
+        return f"{self.kind} #{self.id} ({self.status}) - {self.user.username}"
+
+class StatCounter(models.Model):
+    """Running dashboard totals, kept current by the signal handlers in signals.py"""
+    name = models.CharField(max_length=64, unique=True)
+    value = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.name} = {self.value}"
+
+class QuestionSignature(models.Model):
+    """MinHash signature of a question's normalized text (see near_duplicates.py)"""
+    question = models.OneToOneField(QPattern, on_delete=models.CASCADE, primary_key=True, related_name='signature')
+    signature = models.BinaryField()
+
+class SignatureBand(models.Model):
+    """One LSH band hash of a question's signature; questions sharing a row are near-duplicate candidates"""
+    question = models.ForeignKey(QPattern, on_delete=models.CASCADE, related_name='signature_bands')
+    band = models.PositiveSmallIntegerField()
+    key = models.BigIntegerField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['band', 'key']),
+        ]
@@ -0,0 +1,224 @@
+"""Near-duplicate question detection with MinHash signatures and LSH banding.
+
+Each question's normalized text is cut into character shingles, and a
+MinHash signature of NUM_PERM minimums estimates the Jaccard similarity of
+two questions' shingle sets as the fraction of matching positions. The
+signature is split into BANDS bands; two questions that agree on a whole
+band share a SignatureBand (band, key) row, which makes them candidates.
+Only candidates are compared, so finding the near-duplicates of a question
+is an index lookup instead of a scan of the bank.
+
+With 16 bands of 8 rows, pairs above about 0.8 similarity are almost
+always found and pairs below about 0.5 almost never become candidates.
+Signatures are kept current by the signal handlers in signals.py and by
+the bulk importer.
+"""
+import re
+from itertools import groupby
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from django.db import connection, transaction
+from django.db.models import Q
+
+from QPaperGeneration.models import QuestionSignature, SignatureBand
+
+SHINGLE_SIZE = 5  # characters
+NUM_PERM = 128
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+DEFAULT_THRESHOLD = 0.8
+
+# Above this many members an LSH bucket is checked against its first member only
+MAX_BUCKET_PAIRS = 50
+
+# Smallest prime above 2**32, for the (a * x + b) mod p permutations
+_PRIME = np.uint64(4294967311)
+
+# Fixed seed: stored signatures must stay comparable across processes and restarts
+_rng = np.random.default_rng(20240117)
+_A = _rng.integers(1, 1 << 32, NUM_PERM, dtype=np.uint64)
+_B = _rng.integers(0, 1 << 32, NUM_PERM, dtype=np.uint64)
+_BAND_MIX = _rng.integers(1, 1 << 63, ROWS, dtype=np.uint64) | np.uint64(1)
+_SHINGLE_WEIGHTS = np.array([257 ** power for power in range(SHINGLE_SIZE - 1, -1, -1)], dtype=np.uint64)
+_GOLDEN = np.uint64(0x9E3779B97F4A7C15)
+
+_NON_WORD = re.compile(r'[\W_]+', re.UNICODE)
+
+
+def normalize(text):
+    """Lower case words separated by single spaces"""
+    return _NON_WORD.sub(' ', (text or '').lower()).strip()
+
+
+def _shingle_hashes(text):
+    """Distinct 32-bit hashes of the text's character shingles"""
+    data = np.frombuffer(normalize(text).encode('utf-8'), dtype=np.uint8).astype(np.uint64)
+    if len(data) == 0:
+        return data
+    if len(data) < SHINGLE_SIZE:
+        data = np.concatenate([np.zeros(SHINGLE_SIZE - len(data), dtype=np.uint64), data])
+    windows = sliding_window_view(data, SHINGLE_SIZE)
+    # Exact polynomial value of each window, then a multiplicative hash down to 32 bits
+    values = windows @ _SHINGLE_WEIGHTS
+    return np.unique((values * _GOLDEN) >> np.uint64(32))
+
+
+def signature(text):
+    """MinHash signature of text as a uint32 array, or None for text with no words"""
+    shingles = _shingle_hashes(text)
+    if len(shingles) == 0:
+        return None
+    permuted = (np.outer(shingles, _A) + _B) % _PRIME
+    return (permuted.min(axis=0) & np.uint64(0xFFFFFFFF)).astype(np.uint32)
+
+
+def band_keys(sig):
+    """One signed 64-bit key per LSH band of a signature"""
+    bands = sig.reshape(BANDS, ROWS).astype(np.uint64)
+    return (bands * _BAND_MIX).sum(axis=1).view(np.int64)
+
+
+def similarity(sig, others):
+    """Estimated Jaccard similarity of sig to each row of others"""
+    return (others == sig).mean(axis=1)
+
+
+def _decode(data):
+    return np.frombuffer(bytes(data), dtype=np.uint32)
+
+
+def store_signatures(questions, signature_model=QuestionSignature, band_model=SignatureBand):
+    """Replace the stored signature and bands of each saved question"""
+    questions = [q for q in questions if q.pk is not None]
+    if not questions:
+        return
+    signatures = []
+    bands = []
+    for question in questions:
+        sig = signature(question.question)
+        if sig is None:
+            continue
+        signatures.append((question.pk, sig.tobytes()))
+        bands.extend((question.pk, band, int(key)) for band, key in enumerate(band_keys(sig)))
+    # Sixteen band rows per question: plain executemany skips building model instances
+    signature_table = connection.ops.quote_name(signature_model._meta.db_table)
+    band_table = connection.ops.quote_name(band_model._meta.db_table)
+    with transaction.atomic(), connection.cursor() as cursor:
+        ids = [(q.pk,) for q in questions]
+        cursor.executemany(f'DELETE FROM {band_table} WHERE question_id = %s', ids)
+        cursor.executemany(f'DELETE FROM {signature_table} WHERE question_id = %s', ids)
+        cursor.executemany(f'INSERT INTO {signature_table} (question_id, signature) VALUES (%s, %s)', signatures)
+        cursor.executemany(f'INSERT INTO {band_table} (question_id, band, key) VALUES (%s, %s, %s)', bands)
+
+
+def rebuild(apps=None, batch_size=2000):
+    """Recompute every stored signature; returns the number of questions processed"""
+    if apps is None:
+        from django.apps import apps
+    QPattern = apps.get_model('QPaperGeneration', 'QPattern')
+    signature_model = apps.get_model('QPaperGeneration', 'QuestionSignature')
+    band_model = apps.get_model('QPaperGeneration', 'SignatureBand')
+
+    band_model.objects.all().delete()
+    signature_model.objects.all().delete()
+    total = 0
+    batch = []
+    for question in QPattern.objects.only('id', 'question').order_by('id').iterator(chunk_size=batch_size):
+        batch.append(question)
+        if len(batch) >= batch_size:
+            store_signatures(batch, signature_model, band_model)
+            total += len(batch)
+            batch = []
+    store_signatures(batch, signature_model, band_model)
+    return total + len(batch)
+
+
+def similar_questions(text, threshold=DEFAULT_THRESHOLD, exclude_id=None):
+    """(question id, similarity) pairs for stored questions close to text, most similar first"""
+    sig = signature(text)
+    if sig is None:
+        return []
+    condition = Q()
+    for band, key in enumerate(band_keys(sig)):
+        condition |= Q(band=band, key=int(key))
+    candidates = SignatureBand.objects.filter(condition).exclude(question_id=exclude_id)
+    rows = list(QuestionSignature.objects.filter(question_id__in=candidates.values('question_id'))
+                .values_list('question_id', 'signature'))
+    if not rows:
+        return []
+    scores = similarity(sig, np.stack([_decode(data) for _qid, data in rows]))
+    matches = [(qid, float(score)) for (qid, _data), score in zip(rows, scores) if score >= threshold]
+    return sorted(matches, key=lambda match: -match[1])
+
+
+def _candidate_pairs(bands):
+    """Pairs of question ids sharing at least one LSH bucket, from band rows ordered by bucket"""
+    pairs = set()
+    for _bucket, members in groupby(bands, key=lambda row: (row[0], row[1])):
+        ids = sorted({qid for _band, _key, qid in members})
+        if len(ids) > MAX_BUCKET_PAIRS:
+            pairs.update((ids[0], other) for other in ids[1:])
+            continue
+        pairs.update((a, b) for i, a in enumerate(ids) for b in ids[i + 1:])
+    return pairs
+
+
+def near_duplicate_groups(questions=None, threshold=DEFAULT_THRESHOLD):
+    """Groups (sets of ids) of questions whose text is at least threshold similar.
+
+    questions is a QPattern queryset to look within, all questions when None.
+    Groups are the connected components of the similar pairs.
+    """
+    bands = SignatureBand.objects.order_by('band', 'key')
+    if questions is not None:
+        bands = bands.filter(question_id__in=questions.order_by().values('id'))
+    pairs = _candidate_pairs(bands.values_list('band', 'key', 'question_id').iterator(chunk_size=5000))
+    if not pairs:
+        return []
+
+    involved = sorted({qid for pair in pairs for qid in pair})
+    position = {}
+    stored = []
+    for start in range(0, len(involved), 500):
+        chunk = involved[start:start + 500]
+        for qid, data in QuestionSignature.objects.filter(question_id__in=chunk).values_list('question_id', 'signature'):
+            position[qid] = len(stored)
+            stored.append(_decode(data))
+    matrix = np.stack(stored)
+    pairs = [(a, b) for a, b in pairs if a in position and b in position]
+    left = np.array([position[a] for a, _b in pairs])
+    right = np.array([position[b] for _a, b in pairs])
+    scores = (matrix[left] == matrix[right]).mean(axis=1)
+
+    parent = {}
+
+    def find(qid):
+        while parent.get(qid, qid) != qid:
+            parent[qid] = parent.get(parent[qid], parent[qid])
+            qid = parent[qid]
+        return qid
+
+    for (a, b), score in zip(pairs, scores):
+        if score >= threshold:
+            root_a, root_b = find(a), find(b)
+            if root_a != root_b:
+                parent[max(root_a, root_b)] = min(root_a, root_b)
+
+    groups = {}
+    for qid in parent:
+        groups.setdefault(find(qid), set()).add(qid)
+    for root in list(groups):
+        groups[root].add(root)
+    return sorted(groups.values(), key=lambda group: (-len(group), min(group)))
+
+
+def conflict_map(groups):
+    """question id -> its near-duplicate group, as the blueprint solver's conflicts argument"""
+    conflicts = {}
+    for group in groups:
+        group = frozenset(group)
+        for qid in group:
+            conflicts[qid] = group
+    return conflicts
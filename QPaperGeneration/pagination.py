@@ -0,0 +1,173 @@
+"""Keyset (cursor) pagination for long listings.
+
+Django's Paginator runs a COUNT(*) for every page and reaches page n with
+OFFSET, so the database walks every row before it. A keyset page continues
+from the sort key of the row it starts after instead:
+
+    WHERE created_at < %s OR (created_at = %s AND id < %s)
+
+which an index answers directly however deep the page is. The price is
+that pages are reached by Previous/Next cursors rather than by number.
+
+The ordering must end with a unique, non-null field (normally id) so that
+every row has a distinct position. Cursors are signed so they stay opaque
+to users; an edited or stale cursor just shows the first page.
+"""
+from django.core import signing
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from django.utils.functional import cached_property
+
+CURSOR_SALT = 'QPaperGeneration.pagination'
+
+# Estimated counts stop at this many rows and are shown as "10000+"
+ESTIMATE_CAP = 10000
+
+
+def estimate_count(queryset, cap=ESTIMATE_CAP):
+    """(count, capped) where counting stops after cap rows"""
+    count = queryset.order_by()[:cap + 1].count()
+    return min(count, cap), count > cap
+
+
+class KeysetPage:
+    """One page of rows plus the cursors of its neighbours"""
+
+    def __init__(self, object_list, paginator, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.paginator = paginator
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+    def __repr__(self):
+        return f"<KeysetPage of {len(self.object_list)} rows>"
+
+
+class KeysetPaginator:
+    """Pages of queryset in a fixed ordering, addressed by opaque cursors.
+
+    count may be given when the caller already knows it (for example from
+    StatCounter); otherwise it is counted on first use, or with estimate
+    counted only up to ESTIMATE_CAP rows.
+    """
+
+    def __init__(self, queryset, per_page, ordering=('-id',), count=None, estimate=False):
+        self.fields = [(name.lstrip('-'), name.startswith('-')) for name in ordering]
+        self.model = queryset.model
+        self.queryset = queryset.order_by(*ordering)
+        self.per_page = per_page
+        self._count = count
+        self.estimate = estimate
+
+    @cached_property
+    def _counted(self):
+        if self._count is not None:
+            return self._count, False
+        if self.estimate:
+            return estimate_count(self.queryset)
+        return self.queryset.count(), False
+
+    @property
+    def count(self):
+        return self._counted[0]
+
+    @property
+    def count_is_estimate(self):
+        """True when count stopped at ESTIMATE_CAP and there are more rows"""
+        return self._counted[1]
+
+    def _encode(self, direction, row):
+        # Rows are model instances, or dicts from values()
+        values = [row[name] if isinstance(row, dict) else getattr(row, name) for name, _descending in self.fields]
+        values = [value.isoformat() if hasattr(value, 'isoformat') else value for value in values]
+        return signing.dumps([direction, values], salt=CURSOR_SALT, compress=True)
+
+    def _decode(self, cursor):
+        """(direction, ordering values) of a cursor, or None for the first page"""
+        if not cursor:
+            return None
+        try:
+            direction, raw = signing.loads(cursor, salt=CURSOR_SALT)
+            if direction not in ('next', 'previous') or len(raw) != len(self.fields):
+                return None
+            values = [self.model._meta.get_field(name).to_python(value)
+                      for (name, _descending), value in zip(self.fields, raw)]
+        except (signing.BadSignature, ValidationError, ValueError, TypeError):
+            return None
+        return direction, values
+
+    def _beyond(self, values, backwards):
+        """Rows after values in the ordering, or before them when backwards"""
+        condition = Q()
+        for position, (name, descending) in enumerate(self.fields):
+            lookup = 'lt' if descending != backwards else 'gt'
+            step = Q(**{f'{name}__{lookup}': values[position]})
+            for earlier, (earlier_name, _descending) in enumerate(self.fields[:position]):
+                step &= Q(**{earlier_name: values[earlier]})
+            condition |= step
+        return condition
+
+    def get_page(self, cursor=None):
+        """The page a cursor points to; the first page for no or an invalid cursor"""
+        decoded = self._decode(cursor)
+        if decoded is None:
+            rows = list(self.queryset[:self.per_page + 1])
+            more = len(rows) > self.per_page
+            rows = rows[:self.per_page]
+            return KeysetPage(rows, self, next_cursor=self._encode('next', rows[-1]) if more else None)
+
+        direction, values = decoded
+        backwards = direction == 'previous'
+        queryset = self.queryset.filter(self._beyond(values, backwards))
+        if backwards:
+            queryset = queryset.reverse()
+        rows = list(queryset[:self.per_page + 1])
+        more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if not rows:
+            # Everything past the cursor was deleted meanwhile
+            return self.get_page(None)
+
+        if backwards:
+            rows.reverse()
+            return KeysetPage(rows, self, next_cursor=self._encode('next', rows[-1]),
+                              previous_cursor=self._encode('previous', rows[0]) if more else None)
+        return KeysetPage(rows, self, next_cursor=self._encode('next', rows[-1]) if more else None,
+                          previous_cursor=self._encode('previous', rows[0]))
+
+
+class FirstPagePaginator(KeysetPaginator):
+    """Just the first page of a queryset in the ordering it already has.
+
+    For orderings that make no stable cursor, such as search relevance:
+    the scores are not stored, so a page cannot continue from the last row's
+    position. get_page ignores cursors and never offers a next page.
+    """
+
+    def __init__(self, queryset, per_page, count=None, estimate=False):
+        self.model = queryset.model
+        self.queryset = queryset
+        self.per_page = per_page
+        self._count = count
+        self.estimate = estimate
+
+    def get_page(self, cursor=None):
+        return KeysetPage(list(self.queryset[:self.per_page]), self)
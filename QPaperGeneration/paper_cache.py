@@ -0,0 +1,147 @@
+"""Content-addressed on-disk cache of rendered question paper PDFs"""
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+from pathlib import Path
+
+from django.conf import settings
+
+from QPaperGeneration import metrics
+
+# Bump when the PDF layouts change so stale renders are never served
+LAYOUT_VERSION = 1
+
+# Each process keeps a running total of the cache size and only scans the
+# directory when that total passes the limit, or after this many stores to
+# take in what other processes wrote meanwhile
+EVICT_SCAN_WRITES = 100
+
+_lock = threading.Lock()
+_estimated_bytes = None  # None until the first scan
+_writes_since_scan = 0
+
+
+def _cache_dir():
+    return Path(getattr(settings, 'PAPER_CACHE_DIR', Path(settings.BASE_DIR) / 'paper_cache'))
+
+
+def _max_bytes():
+    return getattr(settings, 'PAPER_CACHE_MAX_BYTES', 256 * 1024 * 1024)
+
+
+def question_fingerprint(question):
+    """Hash of every question field that ends up on the rendered page"""
+    content = json.dumps([
+        question.id, question.question, question.marks, question.difficulty,
+        question.subject.name, question.topic.name,
+    ])
+    return hashlib.sha1(content.encode('utf-8')).hexdigest()
+
+
+def paper_cache_key(template, title, questions, *extra):
+    """Key a render by template, title, extra header values and question versions"""
+    content = json.dumps([
+        LAYOUT_VERSION, template, title, [str(value) for value in extra],
+        [question_fingerprint(question) for question in questions],
+    ])
+    return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+
+def _path_for(key):
+    return _cache_dir() / key[:2] / f"{key}.pdf"
+
+
+def _store(path, source):
+    """Copy a rewound file object in atomically so concurrent readers never see a partial PDF.
+
+    Returns the number of bytes stored.
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as handle:
+            shutil.copyfileobj(source, handle)
+            size = handle.tell()
+        os.replace(tmp_path, path)
+        return size
+    except OSError:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+
+def evict(max_bytes=None):
+    """Delete least recently used renders until the cache fits in max_bytes.
+
+    Scans every cached file; returns the size of what is left.
+    """
+    max_bytes = _max_bytes() if max_bytes is None else max_bytes
+    entries = []
+    total = 0
+    for path in _cache_dir().glob('*/*.pdf'):
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, path))
+        total += stat.st_size
+    if total <= max_bytes:
+        return total
+    entries.sort()
+    for _, size, path in entries:
+        try:
+            path.unlink()
+        except FileNotFoundError:
+            pass
+        total -= size
+        if total <= max_bytes:
+            break
+    return total
+
+
+def _stored(size):
+    """Count a newly stored render, evicting when the cache may be over its limit"""
+    global _estimated_bytes, _writes_since_scan
+    max_bytes = _max_bytes()
+    with _lock:
+        _writes_since_scan += 1
+        if _estimated_bytes is not None:
+            _estimated_bytes += size
+            if _estimated_bytes <= max_bytes and _writes_since_scan < EVICT_SCAN_WRITES:
+                return
+        _estimated_bytes = evict(max_bytes)
+        _writes_since_scan = 0
+
+
+def open_cached_paper(key, render):
+    """Return a readable PDF file object for key, rendering it on a miss.
+
+    render is called with no arguments and must return a rewound file
+    object. Hits refresh the file's mtime, which is what LRU eviction orders by.
+    """
+    path = _path_for(key)
+    try:
+        handle = open(path, 'rb')
+    except FileNotFoundError:
+        metrics.cache_lookup('paper_pdf', False)
+    else:
+        metrics.cache_lookup('paper_pdf', True)
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return handle
+
+    rendered = render()
+    try:
+        _stored(_store(path, rendered))
+        handle = open(path, 'rb')
+    except OSError:
+        # A read-only or full disk must never break the download itself
+        rendered.seek(0)
+        return rendered
+    rendered.close()
+    return handle
@@ -0,0 +1,374 @@
+"""Shared PDF rendering for every question paper download path"""
+import io
+import tempfile
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+
+from django.conf import settings
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.utils import simpleSplit
+from reportlab.pdfgen import canvas
+
+from QPaperGeneration import metrics
+
+PAGE_WIDTH, PAGE_HEIGHT = A4
+TEXT_WIDTH = PAGE_WIDTH - 100
+BOTTOM_MARGIN = 100
+
+GENERAL_INSTRUCTIONS = [
+    "1. Answer all questions",
+    "2. Show all working steps",
+    "3. Write neatly and legibly",
+    "4. Calculators are allowed",
+    "5. Time: 3 Hours",
+]
+
+STAFF_GENERAL_INSTRUCTIONS = [
+    "1. Answer all questions",
+    "2. Show all working steps",
+    "3. Write neatly and legibly",
+    "4. Calculators are allowed unless specified",
+    "5. Time: As per examination guidelines",
+]
+
+
+@lru_cache(maxsize=8192)
+def wrap_text(text, font_name, font_size, width):
+    """Wrap text to the given width, memoized per (text, font, size, width)"""
+    return tuple(simpleSplit(text, font_name, font_size, width))
+
+
+class PaperLayout:
+    """Pages of drawing operations, laid out once and replayed onto a canvas"""
+
+    def __init__(self, title=None):
+        self.title = title
+        self.pages = [[]]
+        self.y = PAGE_HEIGHT
+
+    @property
+    def page_count(self):
+        return len(self.pages)
+
+    def set_font(self, name, size):
+        self.pages[-1].append(('font', name, size))
+
+    def new_page(self, font=None):
+        """Start a new page with the cursor at the top margin"""
+        self.pages.append([])
+        self.y = PAGE_HEIGHT - 50
+        if font:
+            self.set_font(*font)
+
+    def ensure_space(self, min_y=BOTTOM_MARGIN, font=None):
+        """Break the page if the cursor has dropped below min_y"""
+        if self.y < min_y:
+            self.new_page(font)
+
+    def draw_string(self, x, y, text):
+        self.pages[-1].append(('string', x, y, text))
+
+    def draw_centred(self, x, y, text):
+        self.pages[-1].append(('centred', x, y, text))
+
+    def draw_line(self, x1, y1, x2, y2):
+        self.pages[-1].append(('line', x1, y1, x2, y2))
+
+    def write(self, x, text, leading):
+        """Draw one line at the cursor and move the cursor down"""
+        self.draw_string(x, self.y, text)
+        self.y -= leading
+
+    def write_wrapped(self, x, text, font, leading):
+        """Draw wrapped text at the cursor, breaking pages as needed"""
+        for line in wrap_text(text, font[0], font[1], TEXT_WIDTH):
+            self.ensure_space(font=font)
+            self.write(x, line, leading)
+
+    def draw(self, c):
+        """Replay the laid out pages onto a ReportLab canvas"""
+        if self.title:
+            c.setTitle(self.title)
+        for page in self.pages:
+            for op in page:
+                kind = op[0]
+                if kind == 'font':
+                    c.setFont(op[1], op[2])
+                elif kind == 'string':
+                    c.drawString(op[1], op[2], op[3])
+                elif kind == 'centred':
+                    c.drawCentredString(op[1], op[2], op[3])
+                elif kind == 'line':
+                    c.line(op[1], op[2], op[3], op[4])
+            c.showPage()
+
+
+def _render(layout, target):
+    """Draw a layout into a writable file object, timing it for /metrics"""
+    started = time.perf_counter()
+    c = canvas.Canvas(target, pagesize=A4)
+    layout.draw(c)
+    c.save()
+    metrics.render_seconds.observe(time.perf_counter() - started)
+    metrics.render_pages.observe(layout.page_count)
+
+
+def render_to_buffer(layout):
+    """Render a layout and return a rewound in-memory PDF buffer"""
+    buffer = io.BytesIO()
+    _render(layout, buffer)
+    buffer.seek(0)
+    return buffer
+
+
+def _spool_max_bytes():
+    return getattr(settings, 'PAPER_SPOOL_MAX_BYTES', 1024 * 1024)
+
+
+def render_to_file(layout):
+    """Render a layout into a rewound spooled temporary file.
+
+    Small papers stay in memory; past PAPER_SPOOL_MAX_BYTES the PDF spills
+    to a temp file on disk. FileResponse then streams it out block by block,
+    so a download being sent to a slow client does not pin the whole
+    document in worker memory.
+    """
+    spool = tempfile.SpooledTemporaryFile(max_size=_spool_max_bytes())
+    _render(layout, spool)
+    spool.seek(0)
+    return spool
+
+
+def render_bytes(layout):
+    """Render a layout to PDF bytes; top level so process pool workers can run it"""
+    return render_to_buffer(layout).getvalue()
+
+
+_render_pool = None
+_render_pool_workers = 0
+
+
+def render_many(layouts, workers=1):
+    """Render several layouts, in a shared process pool when workers > 1.
+
+    Yields PDF bytes in the order of layouts as each one finishes.
+    """
+    global _render_pool, _render_pool_workers
+    if workers <= 1 or len(layouts) <= 1:
+        for layout in layouts:
+            yield render_bytes(layout)
+        return
+    if _render_pool is None or _render_pool_workers != workers:
+        if _render_pool is not None:
+            _render_pool.shutdown(wait=False)
+        _render_pool = ProcessPoolExecutor(max_workers=workers)
+        _render_pool_workers = workers
+    yield from _render_pool.map(render_bytes, layouts)
+
+
+class _ZipChunks:
+    """Write-only sink that lets zipfile stream into a response generator"""
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def stream_zip(entries):
+    """Yield a ZIP archive chunk by chunk from (filename, bytes) pairs"""
+    sink = _ZipChunks()
+    with zipfile.ZipFile(sink, 'w', zipfile.ZIP_DEFLATED) as archive:
+        for filename, data in entries:
+            archive.writestr(filename, data)
+            yield sink.drain()
+    yield sink.drain()
+
+
+def _paper_header(layout, title, subtitle, total_marks):
+    layout.set_font("Times-Bold", 24)
+    layout.draw_centred(PAGE_WIDTH/2, PAGE_HEIGHT-50, title.upper())
+    layout.set_font("Times-Roman", 16)
+    layout.draw_centred(PAGE_WIDTH/2, PAGE_HEIGHT-80, subtitle)
+    layout.draw_centred(PAGE_WIDTH/2, PAGE_HEIGHT-105, f"Total Marks: {total_marks}")
+    layout.draw_line(50, PAGE_HEIGHT-120, PAGE_WIDTH-50, PAGE_HEIGHT-120)
+    layout.y = PAGE_HEIGHT - 140
+
+
+def practice_paper_layout(title, total_marks, questions):
+    """Layout for student practice papers (generate, update and re-download)"""
+    layout = PaperLayout()
+    _paper_header(layout, title, "Practice Question Paper", total_marks)
+
+    layout.set_font("Times-Bold", 14)
+    layout.write(50, "General Instructions:", 25)
+    layout.set_font("Times-Roman", 12)
+    for instruction in GENERAL_INSTRUCTIONS:
+        layout.write(60, instruction, 15)
+    layout.y -= 20
+
+    layout.set_font("Times-Bold", 16)
+    layout.write(50, "QUESTIONS", 30)
+
+    body_font = ("Times-Roman", 12)
+    for number, question in enumerate(questions, start=1):
+        layout.ensure_space(font=body_font)
+        layout.set_font("Times-Bold", 12)
+        layout.write(50, f"Q{number}. [{question.marks} marks]", 15)
+        layout.set_font("Times-Roman", 10)
+        layout.write(50, f"Subject: {question.subject.name} | Topic: {question.topic.name}", 20)
+        layout.set_font(*body_font)
+        layout.write_wrapped(60, question.question, body_font, 15)
+        layout.y -= 10  # Space between questions
+
+    return layout
+
+
+def staff_paper_layout(title, total_marks, questions, instructions, generated_by, generated_at):
+    """Layout for staff papers built from the question library"""
+    questions = list(questions)
+    difficulty_levels = [question.difficulty for question in questions]
+    avg_difficulty = sum(difficulty_levels) / len(difficulty_levels) if difficulty_levels else 0
+
+    layout = PaperLayout()
+    _paper_header(layout, title, "Staff Generated Question Paper", total_marks)
+
+    layout.set_font("Times-Bold", 12)
+    layout.write(50, "Paper Statistics:", 20)
+    layout.set_font("Times-Roman", 10)
+    stats = [
+        f"Total Questions: {len(questions)}",
+        f"Average Difficulty: {avg_difficulty:.1f}/5",
+        f"Generated by: {generated_by}",
+        f"Date: {generated_at.strftime('%Y-%m-%d %H:%M')}"
+    ]
+    for stat in stats:
+        layout.write(60, stat, 15)
+    layout.y -= 10
+
+    small_font = ("Times-Roman", 10)
+    if instructions:
+        layout.set_font("Times-Bold", 12)
+        layout.write(50, "Instructions:", 20)
+        layout.set_font(*small_font)
+        layout.write_wrapped(60, instructions, small_font, 12)
+        layout.y -= 10
+
+    layout.set_font("Times-Bold", 12)
+    layout.write(50, "General Instructions:", 20)
+    layout.set_font(*small_font)
+    for instruction in STAFF_GENERAL_INSTRUCTIONS:
+        layout.ensure_space(font=small_font)
+        layout.write(60, instruction, 12)
+    layout.y -= 20
+
+    layout.set_font("Times-Bold", 16)
+    layout.write(50, "QUESTIONS", 30)
+
+    body_font = ("Times-Roman", 12)
+    for number, question in enumerate(questions, start=1):
+        layout.ensure_space(font=body_font)
+        layout.set_font("Times-Bold", 12)
+        layout.draw_string(50, layout.y, f"Q{number}. [{question.marks} marks]")
+        layout.set_font("Times-Roman", 10)
+        layout.write(PAGE_WIDTH-150, f"Difficulty: {question.difficulty}/5", 15)
+        layout.write(50, f"Subject: {question.subject.name} | Topic: {question.topic.name}", 20)
+        layout.set_font(*body_font)
+        layout.write_wrapped(60, question.question, body_font, 15)
+
+        # Answer space
+        layout.y -= 10
+        layout.ensure_space(min_y=150)
+        layout.draw_line(50, layout.y, PAGE_WIDTH-50, layout.y)
+        layout.y -= 20
+
+    return layout
+
+
+def single_question_layout(question):
+    """Layout for downloading a single question from the bank"""
+    body_font = ("Times-Roman", 12)
+    layout = PaperLayout()
+    layout.set_font("Times-Bold", 20)
+    layout.draw_centred(PAGE_WIDTH/2, PAGE_HEIGHT-50, "QUESTION PAPER")
+    layout.set_font(*body_font)
+    layout.draw_centred(PAGE_WIDTH/2, PAGE_HEIGHT-70, f"Subject: {question.subject.name}")
+    layout.draw_centred(PAGE_WIDTH/2, PAGE_HEIGHT-85, f"Topic: {question.topic.name}")
+    layout.draw_line(50, PAGE_HEIGHT-100, PAGE_WIDTH-50, PAGE_HEIGHT-100)
+
+    layout.y = PAGE_HEIGHT - 120
+    layout.set_font("Times-Bold", 12)
+    layout.write(50, "Question Details:", 20)
+    layout.set_font(*body_font)
+    details = [
+        f"Marks: {question.marks}",
+        f"Difficulty Level: {question.difficulty}/5",
+        f"Created by: {question.user.username}",
+        "",
+        "Question:",
+    ]
+    for detail in details:
+        layout.write(50, detail, 15)
+
+    layout.y -= 10
+    layout.write_wrapped(50, question.question, body_font, 15)
+
+    layout.y -= 20
+    instructions = [
+        "",
+        "Instructions:",
+        "• Answer the question completely",
+        "• Show all working steps",
+        "• Write neatly and legibly",
+        "• Time: 60 minutes",
+    ]
+    for instruction in instructions:
+        layout.ensure_space(font=body_font)
+        layout.write(50, instruction, 15)
+
+    return layout
+
+
+def text_paper_layout(title, subtitle, lines):
+    """Layout for the pattern based papers produced by papergen2"""
+    body_font = ("Times-Roman", 12)
+    layout = PaperLayout(title=title)
+    layout.set_font("Times-Roman", 24)
+    layout.draw_centred(300, 770, title)
+    layout.set_font("Times-Roman", 16)
+    layout.draw_centred(290, 720, subtitle)
+    layout.draw_line(30, 710, 550, 710)
+    layout.set_font(*body_font)
+    layout.y = 680
+    for line in lines:
+        if not line:
+            layout.ensure_space(min_y=40, font=body_font)
+            layout.y -= 14.4
+            continue
+        for part in wrap_text(line, body_font[0], body_font[1], PAGE_WIDTH - 80):
+            layout.ensure_space(min_y=40, font=body_font)
+            layout.write(40, part, 14.4)
+    return layout
+
+
+def error_report_layout(error):
+    """Layout for the fallback PDF returned when generation fails"""
+    layout = PaperLayout()
+    layout.set_font("Times-Roman", 16)
+    layout.draw_centred(300, 400, "Error Generating Question Paper")
+    layout.set_font("Times-Roman", 12)
+    layout.draw_centred(300, 380, f"Error: {error}")
+    layout.draw_centred(300, 360, "Please check if you have enough questions in your database.")
+    return layout
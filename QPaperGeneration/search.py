@@ -0,0 +1,124 @@
+"""Full-text search over question and answer text.
+
+SQLite keeps a copy of both columns in an FTS5 table (SEARCH_TABLE) whose
+rowid is the question id; the signal handlers in signals.py keep it in step
+and index_questions() covers bulk inserts. PostgreSQL needs no copy: a GIN
+index over the question's tsvector is maintained by the database itself.
+
+Every term the user types is matched as a prefix ("alg" finds "algebra"),
+all terms must match, and results can be ordered by relevance. On any other
+backend, or before the migration has run, search falls back to icontains.
+"""
+import re
+
+from django.db import connection
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+from QPaperGeneration.models import QPattern
+
+SEARCH_TABLE = 'QPaperGeneration_qpattern_fts'
+POSTGRES_INDEX = 'QPaperGeneration_qpattern_search_idx'
+POSTGRES_CONFIG = 'english'
+
+_QUESTION_TABLE = QPattern._meta.db_table
+_TSVECTOR = f"to_tsvector('{POSTGRES_CONFIG}', question || ' ' || answer)"
+_QUALIFIED_TSVECTOR = (f"to_tsvector('{POSTGRES_CONFIG}', \"{_QUESTION_TABLE}\".\"question\" || ' ' || "
+                       f"\"{_QUESTION_TABLE}\".\"answer\")")
+
+# Letters and digits only: keeps user input out of the FTS query syntax
+_TERM = re.compile(r'\w+', re.UNICODE)
+
+
+def search_terms(text):
+    return _TERM.findall(text or '')
+
+
+_sqlite_index_seen = False
+
+
+def search_backend():
+    """'sqlite' or 'postgresql' when an index is available, otherwise None"""
+    global _sqlite_index_seen
+    if connection.vendor == 'postgresql':
+        return 'postgresql'
+    if connection.vendor == 'sqlite':
+        # Only a found table is remembered, so a later migrate is picked up
+        if not _sqlite_index_seen:
+            _sqlite_index_seen = SEARCH_TABLE in connection.introspection.table_names()
+        return 'sqlite' if _sqlite_index_seen else None
+    return None
+
+
+def index_questions(questions):
+    """Add or refresh the index rows of saved questions (SQLite only)"""
+    rows = [(q.id, q.question, q.answer) for q in questions if q.id is not None]
+    if not rows or search_backend() != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        cursor.executemany(f'DELETE FROM "{SEARCH_TABLE}" WHERE rowid = %s', [(row[0],) for row in rows])
+        cursor.executemany(f'INSERT INTO "{SEARCH_TABLE}" (rowid, question, answer) VALUES (%s, %s, %s)', rows)
+
+
+def unindex_questions(ids):
+    if ids and search_backend() == 'sqlite':
+        with connection.cursor() as cursor:
+            cursor.executemany(f'DELETE FROM "{SEARCH_TABLE}" WHERE rowid = %s', [(qid,) for qid in ids])
+
+
+def rebuild_index():
+    """Recreate the whole index from the question table"""
+    backend = search_backend()
+    with connection.cursor() as cursor:
+        if backend == 'sqlite':
+            cursor.execute(f'DELETE FROM "{SEARCH_TABLE}"')
+            cursor.execute(
+                f'INSERT INTO "{SEARCH_TABLE}" (rowid, question, answer) '
+                f'SELECT id, question, answer FROM "{_QUESTION_TABLE}"'
+            )
+            cursor.execute(f'INSERT INTO "{SEARCH_TABLE}" ("{SEARCH_TABLE}") VALUES (\'optimize\')')
+        elif backend == 'postgresql':
+            cursor.execute(f'REINDEX INDEX "{POSTGRES_INDEX}"')
+    return backend
+
+
+def search_questions(queryset, text, ranked=True):
+    """Filter queryset to questions matching every term of text as a prefix.
+
+    With ranked, the result is annotated with search_rank and ordered best
+    match first; call order_by() afterwards to override that.
+    """
+    terms = search_terms(text)
+    if not terms:
+        return queryset
+    backend = search_backend()
+
+    if backend == 'sqlite':
+        match = ' '.join(f'"{term}"*' for term in terms)
+        if ranked:
+            # Join the FTS table so bm25 is computed once per match; a
+            # correlated rank subquery would rerun the search for every row.
+            # FTS5 rank is bm25, where lower means a better match.
+            return queryset.extra(
+                tables=[SEARCH_TABLE],
+                where=[f'"{SEARCH_TABLE}".rowid = "{_QUESTION_TABLE}"."id"', f'"{SEARCH_TABLE}" MATCH %s'],
+                params=[match],
+                select={'search_rank': f'"{SEARCH_TABLE}".rank'},
+            ).order_by('search_rank', '-id')
+        return queryset.filter(id__in=RawSQL(
+            f'SELECT rowid FROM "{SEARCH_TABLE}" WHERE "{SEARCH_TABLE}" MATCH %s', [match]))
+
+    if backend == 'postgresql':
+        tsquery = ' & '.join(f'{term}:*' for term in terms)
+        queryset = queryset.filter(id__in=RawSQL(
+            f'SELECT id FROM "{_QUESTION_TABLE}" WHERE {_TSVECTOR} @@ to_tsquery(\'{POSTGRES_CONFIG}\', %s)',
+            [tsquery]))
+        if ranked:
+            queryset = queryset.annotate(search_rank=RawSQL(
+                f'ts_rank({_QUALIFIED_TSVECTOR}, to_tsquery(\'{POSTGRES_CONFIG}\', %s))', [tsquery])).order_by('-search_rank', '-id')
+        return queryset
+
+    condition = Q()
+    for term in terms:
+        condition &= Q(question__icontains=term) | Q(answer__icontains=term)
+    return queryset.filter(condition)
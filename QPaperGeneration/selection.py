@@ -0,0 +1,19 @@
+"""Set-based question selection for pattern generated papers.
+
+Paper generation itself picks from the in-process bank snapshot (bank.py);
+the queryset here serves the lookups that still go to the database, such as
+the near-duplicate conflicts among a paper's candidates.
+"""
+from QPaperGeneration.models import QPattern
+
+CANDIDATE_FIELDS = ('id', 'marks', 'topic_id', 'co', 'difficulty')
+
+
+def candidate_questions(topic_ids, user=None, marks=None):
+    """Queryset of the questions in topic_ids, optionally limited to one author and some marks"""
+    questions = QPattern.objects.filter(topic_id__in=topic_ids)
+    if marks is not None:
+        questions = questions.filter(marks__in=list(marks))
+    if user is not None:
+        questions = questions.filter(user=user)
+    return questions
@@ -0,0 +1,230 @@
+"""Signal handlers keeping StatCounter totals and cached statistics and pages in step with the source tables.
+
+Deleting a user, subject or topic through Model.delete() goes through
+cascade_delete instead: the per-row handlers below stand aside while the
+cascade runs, and the counters, caches and indexes are moved once for
+everything it removed.
+"""
+import contextvars
+from functools import wraps
+
+from django.db import transaction
+from django.db.models import Q
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from QPaperGeneration import caching
+from QPaperGeneration.bank import bump_version
+from QPaperGeneration.counters import (
+    bump, combine, paper_deltas, question_deltas, questions_deltas, user_deltas,
+)
+from QPaperGeneration.near_duplicates import store_signatures
+from QPaperGeneration.search import index_questions, unindex_questions
+from QPaperGeneration.stats import invalidate_subject_breakdown
+from QPaperGeneration.models import PaperQuestion, QPattern, StudentGeneratedPaper, Subject, Topic, User
+
+QUESTION_FIELDS = ('marks', 'difficulty', 'user_id', 'subject_id')
+
+_in_cascade = contextvars.ContextVar('qgen_in_cascade', default=False)
+
+
+def per_row(handler):
+    """Skip handler for rows removed by cascade_delete, which accounts for them in bulk"""
+    @wraps(handler)
+    def wrapper(*args, **kwargs):
+        if not _in_cascade.get():
+            return handler(*args, **kwargs)
+    return wrapper
+
+
+def _cascaded(instance):
+    """(questions, papers, counter deltas of everything but the questions) a delete of instance removes"""
+    if isinstance(instance, User):
+        papers = StudentGeneratedPaper.objects.filter(student=instance)
+        return (QPattern.objects.filter(user=instance), papers,
+                combine(user_deltas(instance.role, sign=-1), paper_deltas(instance.role, sign=-papers.count())))
+    if isinstance(instance, Subject):
+        return (QPattern.objects.filter(Q(subject=instance) | Q(topic__sub=instance)), StudentGeneratedPaper.objects.none(),
+                {'subjects': -1, 'topics': -Topic.objects.filter(sub=instance).count()})
+    return QPattern.objects.filter(topic=instance), StudentGeneratedPaper.objects.none(), {'topics': -1}
+
+
+def cascade_delete(instance, delete):
+    """Run delete() for a user, subject or topic and account for its whole cascade at once.
+
+    The per-row handlers cost several queries for every question and paper
+    a cascade removes; here the counters move by a few grouped queries and
+    the search index, bank snapshot and caches are updated once.
+    """
+    questions, papers, deltas = _cascaded(instance)
+    with transaction.atomic():
+        question_ids = list(questions.values_list('id', flat=True))
+        deltas = combine(deltas, questions_deltas(questions, sign=-1))
+        token = _in_cascade.set(True)
+        try:
+            result = delete()
+        finally:
+            _in_cascade.reset(token)
+        bump(deltas)
+        unindex_questions(question_ids)
+        bump_version()
+    invalidate_subject_breakdown()
+    caching.expire(caching.CATALOG, caching.DASHBOARD, caching.QUESTION)
+    return result
+
+
+@receiver(pre_save, sender=QPattern)
+def remember_question(sender, instance, raw=False, **kwargs):
+    """Keep the stored values of an edited question so post_save can move its counts"""
+    instance._counted = None
+    if instance.pk and not raw:
+        instance._counted = QPattern.objects.filter(pk=instance.pk).values_list(*QUESTION_FIELDS).first()
+
+
+@receiver(post_save, sender=QPattern)
+def count_question(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    new = question_deltas(*(getattr(instance, field) for field in QUESTION_FIELDS))
+    old = getattr(instance, '_counted', None)
+    bump(combine(new, question_deltas(*old, sign=-1)) if old and not created else new)
+
+
+@receiver(post_delete, sender=QPattern)
+@per_row
+def uncount_question(sender, instance, **kwargs):
+    bump(question_deltas(*(getattr(instance, field) for field in QUESTION_FIELDS), sign=-1))
+
+
+@receiver(pre_save, sender=User)
+def remember_role(sender, instance, raw=False, **kwargs):
+    instance._counted_role = None
+    if instance.pk and not raw:
+        instance._counted_role = User.objects.filter(pk=instance.pk).values_list('role', flat=True).first()
+
+
+@receiver(post_save, sender=User)
+def count_user(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    old_role = getattr(instance, '_counted_role', None)
+    if created or old_role is None:
+        bump(user_deltas(instance.role))
+    elif old_role != instance.role:
+        # Papers are counted under their author's current role, so they move too
+        papers = instance.generated_papers.count()
+        bump(combine(
+            user_deltas(old_role, sign=-1), user_deltas(instance.role),
+            {f'papers:role:{old_role}': -papers, f'papers:role:{instance.role}': papers},
+        ))
+
+
+@receiver(post_delete, sender=User)
+@per_row
+def uncount_user(sender, instance, **kwargs):
+    bump(user_deltas(instance.role, sign=-1))
+
+
+@receiver(post_save, sender=StudentGeneratedPaper)
+def count_paper(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        bump(paper_deltas(instance.student.role))
+
+
+@receiver(post_delete, sender=StudentGeneratedPaper)
+@per_row
+def uncount_paper(sender, instance, **kwargs):
+    role = User.objects.filter(pk=instance.student_id).values_list('role', flat=True).first()
+    bump(paper_deltas(role, sign=-1))
+
+
+@receiver(post_save, sender=Subject)
+@receiver(post_save, sender=Topic)
+def count_subject_or_topic(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        bump({'subjects' if sender is Subject else 'topics': 1})
+
+
+@receiver(post_delete, sender=Subject)
+@receiver(post_delete, sender=Topic)
+@per_row
+def uncount_subject_or_topic(sender, instance, **kwargs):
+    bump({'subjects' if sender is Subject else 'topics': -1})
+
+
+@receiver(post_save, sender=QPattern)
+@receiver(post_delete, sender=QPattern)
+@receiver(post_save, sender=Subject)
+@receiver(post_delete, sender=Subject)
+@receiver(post_save, sender=Topic)
+@receiver(post_delete, sender=Topic)
+@per_row
+def expire_subject_breakdown(sender, **kwargs):
+    invalidate_subject_breakdown()
+
+
+@receiver(post_save, sender=QPattern)
+def index_question(sender, instance, raw=False, **kwargs):
+    if not raw:
+        index_questions([instance])
+
+
+@receiver(post_delete, sender=QPattern)
+@per_row
+def unindex_question(sender, instance, **kwargs):
+    unindex_questions([instance.id])
+
+
+@receiver(post_save, sender=QPattern)
+def sign_question(sender, instance, raw=False, **kwargs):
+    if not raw:
+        store_signatures([instance])
+
+
+@receiver(post_save, sender=QPattern)
+@receiver(post_delete, sender=QPattern)
+@per_row
+def expire_bank_snapshots(sender, raw=False, **kwargs):
+    if not raw:
+        bump_version()
+
+
+@receiver(post_save, sender=QPattern)
+@receiver(post_delete, sender=QPattern)
+@per_row
+def expire_question_pages(sender, instance, raw=False, **kwargs):
+    if not raw:
+        caching.expire(caching.DASHBOARD, caching.QUESTION)
+
+
+@receiver(post_save, sender=Subject)
+@receiver(post_delete, sender=Subject)
+@receiver(post_save, sender=Topic)
+@receiver(post_delete, sender=Topic)
+@per_row
+def expire_catalog_pages(sender, raw=False, **kwargs):
+    if not raw:
+        caching.expire(caching.CATALOG, caching.DASHBOARD, caching.QUESTION)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+@per_row
+def expire_author_pages(sender, raw=False, update_fields=None, **kwargs):
+    # Logging in only stamps last_login, which no cached page shows
+    if not raw and set(update_fields or ()) != {'last_login'}:
+        caching.expire(caching.DASHBOARD, caching.QUESTION)
+
+
+@receiver(post_save, sender=StudentGeneratedPaper)
+@receiver(post_delete, sender=StudentGeneratedPaper)
+@per_row
+def expire_paper_list(sender, instance, raw=False, **kwargs):
+    if not raw:
+        caching.expire(caching.DASHBOARD)
+
+
+@receiver(post_delete, sender=PaperQuestion)
+@per_row
+def expire_question_usage(sender, instance, **kwargs):
+    caching.expire(caching.QUESTION)
@@ -0,0 +1,148 @@
+"""Dashboard statistics, each block computed with one conditional aggregate or GROUP BY query"""
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db.models import Avg, Count, Q
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from QPaperGeneration import caching
+from QPaperGeneration.models import User, QPattern, StudentGeneratedPaper, Subject, Topic
+
+MARKS_BUCKETS = (2, 5, 10)
+DIFFICULTY_LEVELS = range(1, 6)
+
+# Context key -> User.role value
+ROLES = {
+    'students': 'student',
+    'staff': 'staff',
+    'admins': 'admin',
+}
+
+
+def _windows(now):
+    """Today's date and the start of the 7 and 30 day windows ending at now"""
+    return timezone.localdate(now), now - timedelta(days=7), now - timedelta(days=30)
+
+
+def user_stats(users=None, now=None):
+    """Totals, sign-up windows, logins today and role counts for users"""
+    users = User.objects.all() if users is None else users
+    today, week, month = _windows(now or timezone.now())
+    return users.aggregate(
+        total=Count('id'),
+        today=Count('id', filter=Q(date_joined__date=today)),
+        this_week=Count('id', filter=Q(date_joined__gte=week)),
+        this_month=Count('id', filter=Q(date_joined__gte=month)),
+        active_today=Count('id', filter=Q(last_login__date=today)),
+        **{key: Count('id', filter=Q(role=role)) for key, role in ROLES.items()},
+    )
+
+
+def question_stats(questions=None):
+    """Total plus marks and difficulty distributions for questions"""
+    questions = QPattern.objects.all() if questions is None else questions
+    counts = questions.aggregate(
+        total=Count('id'),
+        **{f'marks_{marks}': Count('id', filter=Q(marks=marks)) for marks in MARKS_BUCKETS},
+        **{f'level_{level}': Count('id', filter=Q(difficulty=level)) for level in DIFFICULTY_LEVELS},
+    )
+    return {
+        'total': counts['total'],
+        'marks_distribution': {f'{marks}_marks': counts[f'marks_{marks}'] for marks in MARKS_BUCKETS},
+        'difficulty_distribution': {f'level_{level}': counts[f'level_{level}'] for level in DIFFICULTY_LEVELS},
+    }
+
+
+def paper_stats(now=None):
+    """Generated paper totals, time windows and counts per author role"""
+    today, week, month = _windows(now or timezone.now())
+    return StudentGeneratedPaper.objects.aggregate(
+        total=Count('id'),
+        today=Count('id', filter=Q(created_at__date=today)),
+        this_week=Count('id', filter=Q(created_at__gte=week)),
+        this_month=Count('id', filter=Q(created_at__gte=month)),
+        **{key: Count('id', filter=Q(student__role=role)) for key, role in ROLES.items()},
+    )
+
+
+def _per_day(queryset, field, start):
+    rows = (queryset.filter(**{f'{field}__date__gte': start})
+            .annotate(day=TruncDate(field)).order_by()
+            .values('day').annotate(count=Count('id')).values_list('day', 'count'))
+    return dict(rows)
+
+
+def daily_activity(days=7, now=None):
+    """Sign-ups and generated papers per day for the last days, oldest first"""
+    today = timezone.localdate(now or timezone.now())
+    start = today - timedelta(days=days - 1)
+    users = _per_day(User.objects.all(), 'date_joined', start)
+    papers = _per_day(StudentGeneratedPaper.objects.all(), 'created_at', start)
+    activity = []
+    for offset in range(days):
+        date = start + timedelta(days=offset)
+        activity.append({
+            'date': date.strftime('%Y-%m-%d'),
+            'display_date': date.strftime('%b %d'),
+            'users': users.get(date, 0),
+            'questions': papers.get(date, 0),  # Papers generated, used as the activity indicator
+        })
+    return activity
+
+
+def marks_counts(questions):
+    """Number of questions per marks value, from one GROUP BY over the queryset"""
+    return dict(questions.order_by().values_list('marks').annotate(count=Count('id')))
+
+
+def subject_statistics():
+    """Subjects with their question count, average difficulty and average marks"""
+    return list(Subject.objects.annotate(
+        question_count=Count('sub'),  # 'sub' is the related_name from QPattern
+        avg_difficulty=Avg('sub__difficulty'),
+        avg_marks=Avg('sub__marks')
+    ).order_by('-question_count'))
+
+
+def top_contributors(limit=10):
+    """Users with the most questions"""
+    return list(User.objects.annotate(
+        question_count=Count('usr')  # 'usr' is the related_name from QPattern
+    ).filter(question_count__gt=0).order_by('-question_count')[:limit])
+
+
+def _subject_breakdown(subjects):
+    marks_counts = defaultdict(dict)
+    rows = QPattern.objects.filter(marks__in=MARKS_BUCKETS).order_by().values_list('subject_id', 'marks').annotate(count=Count('id'))
+    for subject_id, marks, count in rows:
+        marks_counts[subject_id][marks] = count
+
+    topics = defaultdict(list)
+    rows = Topic.objects.annotate(question_count=Count('topic')).order_by('id').values_list('sub_id', 'id', 'name', 'question_count')
+    for subject_id, topic_id, name, count in rows:
+        topics[subject_id].append({'id': topic_id, 'name': name, 'question_count': count})
+
+    breakdown = []
+    for subject in subjects:
+        counts = marks_counts[subject.id]
+        total = sum(counts.values())
+        entry = {'id': subject.id, 'name': subject.name, 'question_count': total, 'topics': topics[subject.id]}
+        for marks in MARKS_BUCKETS:
+            entry[f'marks_{marks}_count'] = counts.get(marks, 0)
+            entry[f'marks_{marks}_percent'] = (counts.get(marks, 0) / total * 100) if total > 0 else 0
+        breakdown.append(entry)
+    return breakdown
+
+
+def subject_breakdown():
+    """Per subject marks split and per topic question counts, from two grouped queries.
+
+    Cached until a question, subject or topic changes (see signals.py).
+    """
+    return caching.get_or_set(caching.BREAKDOWN, ('subjects',),
+                              lambda: _subject_breakdown(Subject.objects.order_by('name')))
+
+
+def invalidate_subject_breakdown():
+    caching.expire(caching.BREAKDOWN)
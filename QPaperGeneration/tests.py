@@ -1,3 +1,871 @@
-from django.test import TestCase
+import io
+import json
+import os
+import random
+import tempfile
+from datetime import timedelta
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from QPaperGeneration import bank, caching, counters, instrumentation, jobs, metrics, paper_cache
+from QPaperGeneration.blueprints import (
+    BLUEPRINTS, DIFFICULTY_MIXES, CandidateIndex, blueprint_lines, blueprint_requirements, solve_blueprint,
+    solve_sets,
+)
+from QPaperGeneration.importer import (
+    ImportFormatError, ImportInterrupted, _integer, import_questions, read_rows,
+)
+from QPaperGeneration.models import PaperJob, QPattern, StatCounter, StudentGeneratedPaper, Subject, Topic, User
+from QPaperGeneration.near_duplicates import (
+    band_keys, conflict_map, near_duplicate_groups, signature, similar_questions, similarity,
+)
+from QPaperGeneration.pagination import FirstPagePaginator, KeysetPaginator
+from QPaperGeneration.search import search_backend, search_questions
+from QPaperGeneration.stats import subject_breakdown
+from QPaperGeneration.views import paper_candidate_index, paper_conflicts
+
+
+def make_candidates(counts, co=1, difficulty=3, start=1):
+    """(id, marks, topic, co, difficulty) tuples: counts maps marks to how many"""
+    candidates = []
+    qid = start
+    for marks, count in counts.items():
+        for _ in range(count):
+            candidates.append((qid, marks, 1, co, difficulty))
+            qid += 1
+    return candidates
+
+
+class BlueprintSolverTests(SimpleTestCase):
+    blueprint = BLUEPRINTS['1']  # 6 two-mark and 4 five-mark questions
+
+    def solve(self, candidates, **kwargs):
+        return solve_blueprint(self.blueprint, CandidateIndex(candidates), rng=random.Random(7), **kwargs)
+
+    def test_feasible_solution_fills_every_section(self):
+        solution = self.solve(make_candidates({2: 10, 5: 10}))
+        self.assertTrue(solution.feasible)
+        self.assertEqual([len(ids) for ids in solution.sections],
+                         [section['count'] for section in self.blueprint['sections']])
+        self.assertEqual(len(set(solution.question_ids)), len(solution.question_ids))
+
+    def test_sections_get_questions_of_their_marks(self):
+        candidates = make_candidates({2: 10, 5: 10})
+        marks = {qid: value for qid, value, _topic, _co, _difficulty in candidates}
+        solution = self.solve(candidates)
+        for section, ids in zip(self.blueprint['sections'], solution.sections):
+            self.assertTrue(all(marks[qid] == section['marks'] for qid in ids))
+
+    def test_shortfall_is_reported_per_marks(self):
+        solution = self.solve(make_candidates({2: 3, 5: 10}))
+        self.assertFalse(solution.feasible)
+        self.assertEqual(solution.problems, ["Need 6 2-mark questions but only 3 are available."])
+
+    def test_excluded_questions_count_as_unavailable(self):
+        candidates = make_candidates({2: 6, 5: 4})
+        solution = self.solve(candidates, exclude={1})
+        self.assertFalse(solution.feasible)
+        self.assertIn("only 5 are available", solution.problems[0])
+
+    def test_every_requested_co_is_covered(self):
+        candidates = make_candidates({2: 10, 5: 10}) + make_candidates({5: 1}, co=4, start=100)
+        solution = self.solve(candidates, cos=[1, 4])
+        self.assertTrue(solution.feasible)
+        self.assertIn(100, solution.question_ids)
+
+    def test_co_without_candidates_is_a_note_not_a_failure(self):
+        solution = self.solve(make_candidates({2: 10, 5: 10}), cos=[1, 3])
+        self.assertTrue(solution.feasible)
+        self.assertEqual(solution.notes, ["No questions are mapped to CO3 in the selected topics."])
+
+    def test_impossible_difficulty_mix_is_reported_before_searching(self):
+        # Every question is hard, but the easy mix needs 60% easy ones
+        solution = self.solve(make_candidates({2: 10, 5: 10}, difficulty=5), mix=DIFFICULTY_MIXES['easy'])
+        self.assertFalse(solution.feasible)
+        self.assertIn("Difficulty mix needs at least 6 easy questions but at most 0 can be placed.",
+                      solution.problems)
+
+    def test_search_failure_names_the_blocking_constraint(self):
+        # CO4 and CO5 only exist as hard questions, and the easy mix allows one hard question
+        candidates = (make_candidates({2: 10, 5: 10}, difficulty=1)
+                      + make_candidates({2: 1}, co=4, difficulty=5, start=100)
+                      + make_candidates({2: 1}, co=5, difficulty=5, start=200))
+        solution = self.solve(candidates, cos=[4, 5], mix=DIFFICULTY_MIXES['easy'], attempts=20)
+        self.assertFalse(solution.feasible)
+        self.assertRegex(solution.problems[0], r"^CO[45] could not be covered")
+        self.assertIn("after 20 attempts", solution.problems[1])
+
+    def test_difficulty_mix_limits_are_respected(self):
+        candidates = (make_candidates({2: 10, 5: 10}, difficulty=1)
+                      + make_candidates({2: 10, 5: 10}, difficulty=5, start=100))
+        solution = self.solve(candidates, mix=DIFFICULTY_MIXES['challenging'])
+        self.assertTrue(solution.feasible)
+        hard = sum(1 for qid in solution.question_ids if qid >= 100)
+        self.assertGreaterEqual(hard, 4)
+        self.assertLessEqual(len(solution.question_ids) - hard, 2)
+
+    def test_conflicting_near_duplicates_are_not_chosen_together(self):
+        candidates = make_candidates({2: 7, 5: 4})
+        conflicts = {1: {2}, 2: {1}}
+        solution = self.solve(candidates, conflicts=conflicts)
+        # Seven two-mark questions for six places: only one of the pair fits
+        self.assertTrue(solution.feasible)
+        self.assertFalse({1, 2} <= set(solution.question_ids))
+
+    def test_requirements_and_lines(self):
+        self.assertEqual(blueprint_requirements(self.blueprint), {2: 6, 5: 4})
+        solution = self.solve(make_candidates({2: 6, 5: 4}))
+        lines = blueprint_lines(solution, {qid: f"text {qid}" for qid in solution.question_ids})
+        self.assertEqual(lines[:len(self.blueprint['header'])], self.blueprint['header'])
+        self.assertEqual(sum(1 for line in lines if line.startswith("Q.")), 10)
+
+
+class SolveSetsTests(SimpleTestCase):
+    blueprint = BLUEPRINTS['1']
+
+    def solve(self, candidates, sets):
+        return solve_sets(self.blueprint, CandidateIndex(candidates), sets, rng=random.Random(7))
+
+    def test_sets_are_disjoint_when_the_pool_allows(self):
+        solutions = self.solve(make_candidates({2: 18, 5: 12}), 3)
+        self.assertTrue(all(solution.feasible for solution in solutions))
+        used = [qid for solution in solutions for qid in solution.question_ids]
+        self.assertEqual(len(used), len(set(used)))
+
+    def test_small_pool_falls_back_to_least_used_questions(self):
+        # Room for one fresh set plus two spare two-mark questions
+        solutions = self.solve(make_candidates({2: 8, 5: 4}), 2)
+        self.assertTrue(all(solution.feasible for solution in solutions))
+        first, second = (set(solution.question_ids) for solution in solutions)
+        spare = set(range(1, 9)) - first
+        self.assertLessEqual(spare, second)
+
+    def test_stops_at_the_first_infeasible_set(self):
+        solutions = self.solve(make_candidates({2: 3, 5: 4}), 4)
+        self.assertEqual(len(solutions), 1)
+        self.assertFalse(solutions[0].feasible)
+
+
+class PaperBatchViewTests(TestCase):
+    def setUp(self):
+        self.staff = User.objects.create_user('batchstaff', password='x', role='staff')
+        self.client.force_login(self.staff)
+
+    def post(self, **data):
+        fields = {'heading': 'Unit test', 'ptype': '1', 'topics': ['1']}
+        fields.update(data)
+        return self.client.post(reverse('papergen_batch'), {k: v for k, v in fields.items() if v is not None})
+
+    def test_missing_field_is_a_bad_request(self):
+        response = self.post(heading=None)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn(b"heading", response.content)
+
+    def test_non_numeric_fields_are_bad_requests(self):
+        self.assertEqual(self.post(topics=['x']).status_code, 400)
+        self.assertEqual(self.post(sets='many').status_code, 400)
+
+    def test_unknown_paper_type_is_a_bad_request(self):
+        self.assertEqual(self.post(ptype='internal').status_code, 400)
+
+    def test_seed_must_be_alphanumeric(self):
+        response = self.post(seed='a"; filename=evil.exe')
+        self.assertEqual(response.status_code, 400)
+
+    def test_students_are_redirected(self):
+        self.client.force_login(User.objects.create_user('batchstudent', password='x'))
+        self.assertEqual(self.post().status_code, 302)
+
+
+class KeysetPaginatorTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        # Three rows share each name, so a name-only ordering would be ambiguous
+        Subject.objects.bulk_create(Subject(name=f"subject {n // 3:02d}") for n in range(25))
+
+    def walk(self, paginator):
+        """Every page reached by following next cursors from the first"""
+        pages = [paginator.get_page()]
+        while pages[-1].has_next():
+            pages.append(paginator.get_page(pages[-1].next_cursor))
+        return pages
+
+    def test_next_cursors_visit_every_row_once_in_order(self):
+        paginator = KeysetPaginator(Subject.objects.all(), 10)
+        pages = self.walk(paginator)
+        self.assertEqual([len(page) for page in pages], [10, 10, 5])
+        ids = [subject.id for page in pages for subject in page]
+        self.assertEqual(ids, list(Subject.objects.order_by('-id').values_list('id', flat=True)))
+        self.assertFalse(pages[0].has_previous())
+        self.assertTrue(pages[-1].has_previous())
+
+    def test_previous_cursor_returns_the_page_before(self):
+        paginator = KeysetPaginator(Subject.objects.all(), 10)
+        first, second, third = self.walk(paginator)
+        self.assertEqual(list(paginator.get_page(third.previous_cursor)), list(second))
+        back = paginator.get_page(second.previous_cursor)
+        self.assertEqual(list(back), list(first))
+        self.assertFalse(back.has_previous())
+
+    def test_multi_field_ordering_breaks_ties_on_id(self):
+        ordering = ('name', '-id')
+        paginator = KeysetPaginator(Subject.objects.all(), 4, ordering=ordering)
+        rows = [subject.id for page in self.walk(paginator) for subject in page]
+        self.assertEqual(rows, list(Subject.objects.order_by(*ordering).values_list('id', flat=True)))
+
+    def test_values_rows_make_cursors_too(self):
+        paginator = KeysetPaginator(Subject.objects.values('id', 'name'), 10)
+        second = paginator.get_page(paginator.get_page().next_cursor)
+        self.assertEqual(len(second), 10)
+        self.assertIsInstance(second[0], dict)
+
+    def test_invalid_cursors_show_the_first_page(self):
+        paginator = KeysetPaginator(Subject.objects.all(), 10)
+        first = list(paginator.get_page())
+        tampered = paginator.get_page().next_cursor[:-2] + 'xx'
+        for cursor in ('garbage', tampered):
+            self.assertEqual(list(paginator.get_page(cursor)), first)
+        # A cursor made for another ordering does not fit this one
+        other = KeysetPaginator(Subject.objects.all(), 10, ordering=('name', 'id'))
+        self.assertEqual(list(paginator.get_page(other.get_page().next_cursor)), first)
+
+    def test_counts(self):
+        self.assertEqual(KeysetPaginator(Subject.objects.all(), 10).count, 25)
+        self.assertEqual(KeysetPaginator(Subject.objects.all(), 10, count=99).count, 99)
+        estimated = KeysetPaginator(Subject.objects.all(), 10, estimate=True)
+        self.assertEqual((estimated.count, estimated.count_is_estimate), (25, False))
+
+    def test_first_page_paginator_never_offers_cursors(self):
+        queryset = Subject.objects.order_by('name')
+        paginator = FirstPagePaginator(queryset, 10)
+        cursor = KeysetPaginator(Subject.objects.all(), 10).get_page().next_cursor
+        page = paginator.get_page(cursor)
+        self.assertEqual(list(page), list(queryset[:10]))
+        self.assertFalse(page.has_other_pages())
+
+
+class ImporterTests(TestCase):
+    header = "Question,Subject,Topic,Marks,Difficulty\n"
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user('importstaff', password='x', role='staff')
+
+    def rows(self, text, format_type='csv'):
+        return list(read_rows(io.BytesIO(text.encode()), format_type))
+
+    def test_integer_accepts_whole_floats_only(self):
+        self.assertEqual(_integer({'marks': '5'}, 'marks'), 5)
+        self.assertEqual(_integer({'marks': 5.0}, 'marks'), 5)
+        self.assertEqual(_integer({'marks': '2.00'}, 'marks'), 2)
+        self.assertEqual(_integer({'marks': ''}, 'marks', default=3), 3)
+        for value in (2.5, '2.5', 'five', 'nan', 'inf'):
+            with self.assertRaisesRegex(ValueError, "whole number"):
+                _integer({'marks': value}, 'marks')
+        with self.assertRaisesRegex(ValueError, "missing marks"):
+            _integer({}, 'marks')
+        with self.assertRaisesRegex(ValueError, "between 1 and 5"):
+            _integer({'difficulty': 6}, 'difficulty', low=1, high=5)
+
+    def test_csv_headers_are_matched_case_insensitively(self):
+        rows = self.rows("question,SUBJECT,Topic,Marks,Image URL\nWhat is x?,Maths,Algebra,2,http://x\n")
+        self.assertEqual(rows, [(2, {'question': 'What is x?', 'subject': 'Maths', 'topic': 'Algebra',
+                                     'marks': '2', 'imgurl': 'http://x'})])
+
+    def test_ndjson_reports_bad_lines_and_skips_blank_ones(self):
+        rows = self.rows('{"Question": "a"}\n\nnot json\n[1]\n', 'ndjson')
+        self.assertEqual([number for number, _row in rows], [1, 3, 4])
+        self.assertEqual(rows[0][1], {'question': 'a'})
+        self.assertIsInstance(rows[1][1], ValueError)
+        self.assertIsInstance(rows[2][1], ValueError)
+
+    def test_json_must_be_an_array(self):
+        with self.assertRaises(ImportFormatError):
+            self.rows('{"Question": "a"}', 'json')
+        with self.assertRaises(ImportFormatError):
+            self.rows('[{"Question": "a"', 'json')
+        with self.assertRaises(ImportFormatError):
+            self.rows('', 'xml')
+
+    def test_valid_rows_are_created_and_invalid_ones_reported(self):
+        text = self.header + "\n".join([
+            "What is 2+2?,Maths,Arithmetic,2,1",
+            ",Maths,Arithmetic,2,1",
+            "Define a set.,Maths,Sets,two,1",
+            "Prove it.,Maths,Sets,5,9",
+            f"Long one.,{'S' * 33},Sets,5,3",
+            "Define a ring.,Maths,Rings,5.0,",
+        ]) + "\n"
+        result = import_questions(self.rows(text), self.staff)
+        self.assertEqual((result.created, result.failed), (2, 4))
+        self.assertEqual([number for number, _message in result.errors], [3, 4, 5, 6])
+        self.assertIn("missing question", result.errors[0][1])
+        self.assertIn("longer than 32", result.errors[3][1])
+        ring = QPattern.objects.get(question="Define a ring.")
+        self.assertEqual((ring.marks, ring.difficulty, ring.user), (5, 3, self.staff))
+        # Subjects and topics are created once and then reused
+        self.assertEqual(Subject.objects.filter(name='Maths').count(), 1)
+        self.assertEqual(Topic.objects.filter(sub__name='Maths').count(), 2)
+
+    def test_rows_before_an_unreadable_line_are_saved(self):
+        good = "".join(f"Question {n}?,Maths,Algebra,2,1\n" for n in range(5))
+        data = (self.header + good).encode() + b"Broken \xff row,Maths,Algebra,2,1\n"
+        with self.assertRaises(ImportInterrupted) as caught:
+            import_questions(read_rows(io.BytesIO(data), 'csv'), self.staff, batch_size=2)
+        self.assertEqual(caught.exception.result.created, 5)
+        self.assertEqual(caught.exception.last_row, 6)
+        self.assertIsInstance(caught.exception.error, UnicodeDecodeError)
+        self.assertEqual(QPattern.objects.filter(question__startswith="Question ").count(), 5)
+
+    def test_unreadable_first_row_is_a_plain_error(self):
+        data = self.header.encode() + b"\xff,Maths,Algebra,2,1\n"
+        with self.assertRaises(UnicodeDecodeError):
+            import_questions(read_rows(io.BytesIO(data), 'csv'), self.staff)
+
+    def test_json_rows_import(self):
+        records = [{'question': 'What is a graph?', 'subject': 'Maths', 'topic': 'Graphs', 'marks': 2, 'co': 3}]
+        result = import_questions(self.rows(json.dumps(records), 'json'), self.staff)
+        self.assertEqual(result.created, 1)
+        self.assertEqual(QPattern.objects.get(question='What is a graph?').co, 3)
+
+
+class CounterTests(TestCase):
+    def setUp(self):
+        self.staff = User.objects.create_user('counterstaff', password='x', role='staff')
+        self.student = User.objects.create_user('counterstudent', password='x')
+        self.maths = Subject.objects.create(name='Maths')
+        self.algebra = Topic.objects.create(name='Algebra', sub=self.maths)
+        self.sets = Topic.objects.create(name='Sets', sub=self.maths)
+        self.questions = [
+            QPattern.objects.create(user=self.staff, subject=self.maths, topic=topic, question=f"Q{n}",
+                                    marks=marks, difficulty=difficulty)
+            for n, (topic, marks, difficulty) in enumerate([
+                (self.algebra, 2, 1), (self.algebra, 5, 3), (self.sets, 2, 5), (self.sets, 10, 3),
+            ])
+        ]
+        StudentGeneratedPaper.objects.create(student=self.student, title="Mine", total_marks=7,
+                                             number_of_questions=2)
+
+    def assertCountersMatch(self):
+        """Stored counters equal a fresh recount; counters at zero count as absent"""
+        def nonzero(values):
+            return {name: value for name, value in values.items() if value}
+        self.assertEqual(nonzero(counters.read_all()), nonzero(counters.compute()))
+
+    def test_signals_keep_counters_in_step(self):
+        self.assertCountersMatch()
+        self.assertEqual(counters.read('questions', 'questions:marks:2', 'papers:role:student'),
+                         {'questions': 4, 'questions:marks:2': 2, 'papers:role:student': 1})
+        question = self.questions[0]
+        question.marks = 10
+        question.difficulty = 4
+        question.save()
+        self.assertCountersMatch()
+        self.questions[1].delete()
+        self.assertCountersMatch()
+        self.student.role = 'staff'
+        self.student.save()
+        self.assertCountersMatch()
+
+    def test_cascade_deletes_update_counters(self):
+        self.sets.delete()
+        self.assertCountersMatch()
+        self.assertEqual(counters.read('questions', 'topics')['questions'], 2)
+        self.student.delete()
+        self.assertCountersMatch()
+        self.staff.delete()
+        self.assertCountersMatch()
+        self.maths.delete()
+        self.assertCountersMatch()
+        self.assertEqual(counters.read('subjects', 'topics', 'questions'),
+                         {'subjects': 0, 'topics': 0, 'questions': 0})
+
+    def test_rebuild_replaces_drifted_counters(self):
+        StatCounter.objects.filter(name='questions').update(value=99)
+        StatCounter.objects.create(name='questions:marks:7', value=3)
+        version = StatCounter.objects.create(name=f'{counters.VERSION_PREFIX}test', value=5)
+        counters.rebuild()
+        self.assertEqual(counters.read_all(), counters.compute())
+        version.refresh_from_db()
+        self.assertEqual(version.value, 5)
+
+    def test_rebuild_stats_check_reports_drift_without_fixing_it(self):
+        StatCounter.objects.filter(name='questions').update(value=99)
+        StatCounter.objects.create(name='questions:marks:7', value=3)
+        out = io.StringIO()
+        call_command('rebuild_stats', '--check', stdout=out)
+        report = out.getvalue()
+        self.assertIn("questions: stored 99, actual 4", report)
+        # A stored counter with no source rows is stale too
+        self.assertIn("questions:marks:7: stored 3, actual 0", report)
+        self.assertIn("2 of ", report)
+        self.assertEqual(counters.read('questions')['questions'], 99)
+
+        call_command('rebuild_stats', stdout=io.StringIO())
+        out = io.StringIO()
+        call_command('rebuild_stats', '--check', stdout=out)
+        self.assertIn("0 of ", out.getvalue())
+
+
+class CachingTests(TestCase):
+    def setUp(self):
+        # Generations roll back with each test but the local memory cache does not
+        cache.clear()
+
+    def test_generations_live_in_the_database(self):
+        before = caching.generation(caching.CATALOG)
+        caching.expire(caching.CATALOG)
+        name = counters.VERSION_PREFIX + caching.CATALOG
+        self.assertEqual(StatCounter.objects.get(name=name).value, before + 1)
+        self.assertEqual(caching.generation(caching.CATALOG), before + 1)
+
+    def test_writes_expire_cached_values(self):
+        def subjects():
+            return caching.get_or_set(caching.CATALOG, ('subjects',), lambda: list(Subject.objects.all()))
+
+        self.assertEqual(subjects(), [])
+        maths = Subject.objects.create(name='Maths')
+        self.assertEqual(subjects(), [maths])
+        staff = User.objects.create_user('cachestaff', password='x', role='staff')
+        topic = Topic.objects.create(name='Algebra', sub=maths)
+        question = QPattern.objects.create(user=staff, subject=maths, topic=topic, question="Q", marks=2)
+        html = caching.get_or_set(caching.QUESTION, (question.id,), lambda: question.question)
+        question.question = "Edited"
+        question.save()
+        self.assertEqual(caching.get_or_set(caching.QUESTION, (question.id,), lambda: question.question), "Edited")
+        self.assertEqual(html, "Q")
+
+    def test_subject_breakdown_follows_question_writes(self):
+        staff = User.objects.create_user('breakdownstaff', password='x', role='staff')
+        maths = Subject.objects.create(name='Maths')
+        topic = Topic.objects.create(name='Algebra', sub=maths)
+        self.assertEqual(subject_breakdown()[0]['question_count'], 0)
+        QPattern.objects.create(user=staff, subject=maths, topic=topic, question="Q", marks=5)
+        entry = subject_breakdown()[0]
+        self.assertEqual((entry['question_count'], entry['marks_5_count']), (1, 1))
+        self.assertEqual(entry['topics'][0]['question_count'], 1)
+
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user('searchstaff', password='x', role='staff')
+        cls.maths = Subject.objects.create(name='Maths')
+        cls.topic = Topic.objects.create(name='Algebra', sub=cls.maths)
+
+    def create(self, question, answer=''):
+        return QPattern.objects.create(user=self.staff, subject=self.maths, topic=self.topic,
+                                       question=question, answer=answer, marks=2)
+
+    def found(self, text, ranked=False):
+        return list(search_questions(QPattern.objects.all(), text, ranked=ranked).values_list('id', flat=True))
+
+    def test_migrated_database_uses_the_index(self):
+        self.assertEqual(search_backend(), 'sqlite')
+
+    def test_saved_and_edited_questions_are_searchable(self):
+        question = self.create("Define a group homomorphism.")
+        self.assertEqual(self.found("homomorph"), [question.id])
+        self.assertEqual(self.found("group homo"), [question.id])
+        self.assertEqual(self.found("group ring"), [])
+
+        question.question = "Define a ring isomorphism."
+        question.save()
+        self.assertEqual(self.found("homomorph"), [])
+        self.assertEqual(self.found("isomorph"), [question.id])
+
+        question.delete()
+        self.assertEqual(self.found("isomorph"), [])
+
+    def test_answers_are_searched_too(self):
+        question = self.create("State the theorem.", answer="Lagrange's theorem on subgroups")
+        self.assertEqual(self.found("lagrange"), [question.id])
+
+    def test_ranked_search_puts_the_best_match_first(self):
+        weak = self.create("Explain the matrix method, with an example from geometry, physics and economics.")
+        strong = self.create("Matrix matrix matrix.")
+        self.assertEqual(self.found("matrix", ranked=True), [strong.id, weak.id])
+
+    def test_explore_data_search_filter(self):
+        question = self.create("Define a group homomorphism.")
+        self.create("Define a vector space.")
+        self.client.force_login(User.objects.create_user('searchadmin', password='x', role='admin'))
+        for sort in ('', 'newest'):
+            response = self.client.get(reverse('explore_data'), {'search': 'homomorph', 'sort': sort})
+            self.assertEqual([q.id for q in response.context['questions']], [question.id])
+
+
+class NearDuplicateTests(TestCase):
+    original = "Explain the working of a two pass assembler with a neat diagram and an example."
+    twin = "Explain the working of a two-pass assembler with a neat diagram and examples."
+    others = [
+        "State and prove the pigeonhole principle.",
+        "What is a binary search tree? Give its insertion algorithm.",
+        "Differentiate between a process and a thread.",
+        "Define normalization and list the normal forms.",
+        "Write short notes on virtual memory paging.",
+        "Describe the OSI reference model layers.",
+    ]
+    long_ones = [
+        "Derive the time complexity of merge sort using the recurrence relation.",
+        "Explain deadlock prevention and avoidance with the banker's algorithm.",
+        "Discuss the architecture of a compiler front end in detail.",
+        "Compare TCP and UDP congestion behaviour with suitable graphs.",
+    ]
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user('duplicatestaff', password='x', role='staff')
+        maths = Subject.objects.create(name='Computing')
+        cls.topic = Topic.objects.create(name='Systems', sub=maths)
+
+        def create(text, marks):
+            return QPattern.objects.create(user=cls.staff, subject=maths, topic=cls.topic, question=text, marks=marks)
+
+        cls.first = create(cls.original, 2)
+        cls.second = create(cls.twin, 2)
+        for text in cls.others:
+            create(text, 2)
+        for text in cls.long_ones:
+            create(text, 5)
+
+    def setUp(self):
+        # Versions roll back between tests, so a snapshot from another test could look current
+        bank._current = None
+
+    def test_near_identical_texts_share_an_lsh_bucket(self):
+        original, twin = signature(self.original), signature(self.twin)
+        self.assertGreaterEqual(similarity(original, twin[None, :])[0], 0.8)
+        self.assertLess(similarity(original, signature(self.others[0])[None, :])[0], 0.5)
+        self.assertTrue((band_keys(original) == band_keys(twin)).any())
+        self.assertIsNone(signature(" ?! "))
+
+    def test_saved_questions_are_found_as_near_duplicates(self):
+        matches = similar_questions(self.original, exclude_id=self.first.id)
+        self.assertEqual([qid for qid, _score in matches], [self.second.id])
+        self.assertEqual(near_duplicate_groups(), [{self.first.id, self.second.id}])
+        conflicts = conflict_map(near_duplicate_groups())
+        self.assertEqual(conflicts[self.first.id], {self.first.id, self.second.id})
+
+    def test_edits_move_the_signature(self):
+        self.second.question = "List the phases of the software development life cycle."
+        self.second.save()
+        self.assertEqual(near_duplicate_groups(), [])
+
+    def test_near_duplicates_never_share_a_solved_paper(self):
+        blueprint = BLUEPRINTS['1']
+        request = RequestFactory().post('/papergen2', {'exclude_near_duplicates': 'on'})
+        request.user = self.staff
+        index = paper_candidate_index(self.staff, blueprint, [self.topic.id], [])
+        conflicts = paper_conflicts(request, blueprint, [self.topic.id])
+        pair = {self.first.id, self.second.id}
+        for seed in range(20):
+            solution = solve_blueprint(blueprint, index, rng=random.Random(seed), conflicts=conflicts)
+            # Eight two-mark questions for six places: the pair can only ever contribute one
+            self.assertTrue(solution.feasible)
+            self.assertFalse(pair <= set(solution.question_ids))
+
+
+class PaperJobTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user('jobstaff', password='x', role='staff')
+        maths = Subject.objects.create(name='Maths')
+        topic = Topic.objects.create(name='Algebra', sub=maths)
+        cls.question_ids = [
+            QPattern.objects.create(user=cls.staff, subject=maths, topic=topic, question=f"Question {n}?", marks=2).id
+            for n in range(3)
+        ]
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.job_dir = Path(directory.name)
+
+    def enqueue(self):
+        return jobs.enqueue(self.staff, 'staff_paper', "Unit test", {
+            'question_ids': self.question_ids,
+            'title': "Unit test",
+            'instructions': "Answer all questions.",
+            'generated_by': self.staff.username,
+            'generated_at': timezone.now().isoformat(),
+        })
+
+    def test_a_job_is_claimed_exactly_once(self):
+        job = self.enqueue()
+        first = jobs.claim_jobs(5, 'worker-a')
+        self.assertEqual([claimed.id for claimed in first], [job.id])
+        self.assertEqual(jobs.claim_jobs(5, 'worker-b'), [])
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.claimed_by), ('running', 'worker-a'))
+        self.assertIsNotNone(job.heartbeat_at)
+
+    def test_heartbeats_only_touch_the_workers_own_jobs(self):
+        mine, theirs = self.enqueue(), self.enqueue()
+        jobs.claim_jobs(1, 'worker-a')
+        jobs.claim_jobs(1, 'worker-b')
+        long_ago = timezone.now() - timedelta(hours=1)
+        PaperJob.objects.update(heartbeat_at=long_ago)
+        self.assertEqual(jobs.heartbeat('worker-a'), 1)
+        self.assertGreater(PaperJob.objects.get(id=mine.id).heartbeat_at, long_ago)
+        self.assertEqual(PaperJob.objects.get(id=theirs.id).heartbeat_at, long_ago)
+
+    def test_only_jobs_with_quiet_heartbeats_are_requeued(self):
+        live, stopped, legacy = self.enqueue(), self.enqueue(), self.enqueue()
+        jobs.claim_jobs(3, 'worker-a')
+        now = timezone.now()
+        # A slow render whose worker still beats keeps its claim
+        PaperJob.objects.filter(id=live.id).update(started_at=now - timedelta(hours=1), heartbeat_at=now)
+        PaperJob.objects.filter(id=stopped.id).update(heartbeat_at=now - timedelta(minutes=5))
+        PaperJob.objects.filter(id=legacy.id).update(heartbeat_at=None, started_at=now - timedelta(minutes=5))
+
+        self.assertEqual(jobs.requeue_stale(timedelta(minutes=2)), 2)
+        statuses = dict(PaperJob.objects.values_list('id', 'status'))
+        self.assertEqual(statuses, {live.id: 'running', stopped.id: 'pending', legacy.id: 'pending'})
+        self.assertEqual(PaperJob.objects.get(id=stopped.id).claimed_by, '')
+        self.assertEqual([job.id for job in jobs.claim_jobs(5, 'worker-b')], [stopped.id, legacy.id])
+
+    def test_worker_renders_a_job_to_a_pdf_artifact(self):
+        job = self.enqueue()
+        out = io.StringIO()
+        with override_settings(PAPER_JOB_DIR=self.job_dir):
+            call_command('run_paper_worker', '--once', '--workers', '1', stdout=out)
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'done', job.error)
+        self.assertIn(f"Job {job.id} done", out.getvalue())
+        artifact = Path(job.artifact)
+        self.assertEqual(artifact.parent, self.job_dir)
+        self.assertTrue(artifact.read_bytes().startswith(b'%PDF'))
+        self.assertTrue(job.filename.endswith('.pdf'))
+
+    def test_broken_payload_fails_the_job(self):
+        job = jobs.enqueue(self.staff, 'staff_paper', "Broken", {'question_ids': self.question_ids})
+        with override_settings(PAPER_JOB_DIR=self.job_dir):
+            call_command('run_paper_worker', '--once', '--workers', '1', stdout=io.StringIO())
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'failed')
+        self.assertEqual(job.error, "'generated_at'")
+
+    def test_purge_deletes_expired_jobs_and_their_files(self):
+        old, recent = self.enqueue(), self.enqueue()
+        jobs.claim_jobs(2, 'worker-a')
+        for job in (old, recent):
+            with override_settings(PAPER_JOB_DIR=self.job_dir):
+                jobs.complete(job, b'%PDF-1.4')
+        PaperJob.objects.filter(id=old.id).update(finished_at=timezone.now() - timedelta(days=8))
+
+        self.assertEqual(jobs.purge_finished(timedelta(days=7)), 1)
+        self.assertEqual(list(PaperJob.objects.values_list('id', flat=True)), [recent.id])
+        self.assertEqual(sorted(path.name for path in self.job_dir.iterdir()), [f"job_{recent.id}.pdf"])
+
+
+class BankSnapshotTests(SimpleTestCase):
+    # id, subject, topic, marks, difficulty, co, user, question
+    rows = [
+        (3, 1, 10, 2, 1, 1, 5, "First?"),
+        (7, 1, 11, 5, 3, 2, 5, "Zweite Frage über Größen?"),
+        (10, 2, 12, 2, 5, 0, 6, ""),
+        (15, 2, 12, 10, 2, 3, 5, "Last?"),
+    ]
+
+    def test_texts_skips_missing_ids(self):
+        snapshot = bank.BankSnapshot(1, self.rows)
+        texts = snapshot.texts({1, 3, 7, 8, 10, 15, 99})
+        self.assertEqual(texts, {3: "First?", 7: "Zweite Frage über Größen?", 10: "", 15: "Last?"})
+        self.assertEqual(snapshot.texts(set()), {})
+        self.assertEqual(bank.BankSnapshot(1, []).texts({3}), {})
+
+    def test_candidates_filter_on_topic_marks_and_author(self):
+        snapshot = bank.BankSnapshot(1, self.rows)
+        self.assertEqual(snapshot.candidates([10, 12]), [(3, 2, 10, 1, 1), (10, 2, 12, 0, 5), (15, 10, 12, 3, 2)])
+        self.assertEqual(snapshot.candidates([10, 11, 12], marks={2}), [(3, 2, 10, 1, 1), (10, 2, 12, 0, 5)])
+        self.assertEqual(snapshot.candidates([10, 11, 12], user=5, marks={2, 5}), [(3, 2, 10, 1, 1), (7, 5, 11, 2, 3)])
+        self.assertEqual(snapshot.candidates([99]), [])
+
+
+class BankVersionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user('bankstaff', password='x', role='staff')
+        cls.maths = Subject.objects.create(name='Maths')
+        cls.topic = Topic.objects.create(name='Algebra', sub=cls.maths)
+
+    def setUp(self):
+        # Versions roll back between tests, so a snapshot from another test could look current
+        bank._current = None
+
+    def create(self, text):
+        return QPattern.objects.create(user=self.staff, subject=self.maths, topic=self.topic, question=text, marks=2)
+
+    def test_unchanged_bank_reuses_the_snapshot(self):
+        self.create("Q1")
+        first = bank.snapshot()
+        with self.assertNumQueries(1):
+            self.assertIs(bank.snapshot(), first)
+
+    def test_writes_bump_the_version_and_force_a_reload(self):
+        question = self.create("Before")
+        first = bank.snapshot()
+        self.assertEqual(first.texts({question.id}), {question.id: "Before"})
+
+        question.question = "After"
+        question.save()
+        self.assertGreater(bank.bank_version(), first.version)
+        second = bank.snapshot()
+        self.assertIsNot(second, first)
+        self.assertEqual(second.texts({question.id}), {question.id: "After"})
+
+        added = self.create("Added")
+        self.assertEqual(len(bank.snapshot()), 2)
+        deleted_id = question.id
+        question.delete()
+        self.assertEqual(bank.snapshot().texts({deleted_id, added.id}), {added.id: "Added"})
+
+    def test_bulk_import_bumps_the_version(self):
+        version = bank.bank_version()
+        rows = [(2, {'question': 'Imported?', 'subject': 'Maths', 'topic': 'Algebra', 'marks': '2'})]
+        import_questions(rows, self.staff)
+        self.assertGreater(bank.bank_version(), version)
+        self.assertEqual(list(bank.snapshot().texts(QPattern.objects.values_list('id', flat=True)).values()),
+                         ['Imported?'])
+
+
+class PaperCacheTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.cache_dir = Path(directory.name)
+        paper_cache._estimated_bytes = None
+        paper_cache._writes_since_scan = 0
+
+    def fetch(self, key, size=100):
+        handle = paper_cache.open_cached_paper(key, lambda: io.BytesIO(b'%' * size))
+        with handle:
+            return handle.read()
+
+    def cached(self):
+        return sorted(path.stem for path in self.cache_dir.glob('*/*.pdf'))
+
+    def test_hits_serve_the_stored_render(self):
+        with override_settings(PAPER_CACHE_DIR=self.cache_dir):
+            self.assertEqual(self.fetch('aa01', 10), b'%' * 10)
+            self.assertEqual(paper_cache.open_cached_paper('aa01', lambda: self.fail("rendered twice")).read(),
+                             b'%' * 10)
+
+    def test_misses_under_the_limit_scan_only_once(self):
+        with override_settings(PAPER_CACHE_DIR=self.cache_dir, PAPER_CACHE_MAX_BYTES=10_000), \
+                mock.patch.object(paper_cache, 'evict', wraps=paper_cache.evict) as evict:
+            for n in range(20):
+                self.fetch(f'aa{n:02d}')
+        self.assertEqual(evict.call_count, 1)
+        self.assertEqual(paper_cache._estimated_bytes, 2000)
+
+    def test_a_scan_runs_every_evict_scan_writes_stores(self):
+        with override_settings(PAPER_CACHE_DIR=self.cache_dir, PAPER_CACHE_MAX_BYTES=10 ** 9), \
+                mock.patch.object(paper_cache, 'EVICT_SCAN_WRITES', 5), \
+                mock.patch.object(paper_cache, 'evict', wraps=paper_cache.evict) as evict:
+            for n in range(11):
+                self.fetch(f'aa{n:02d}')
+        # The first store, then the 6th and 11th
+        self.assertEqual(evict.call_count, 3)
+
+    def test_least_recently_used_renders_are_evicted_past_the_limit(self):
+        with override_settings(PAPER_CACHE_DIR=self.cache_dir, PAPER_CACHE_MAX_BYTES=350):
+            for n in range(3):
+                self.fetch(f'aa{n:02d}')
+                path = self.cache_dir / 'aa' / f'aa{n:02d}.pdf'
+                os.utime(path, (n, n))
+            self.fetch('aa00')  # A hit makes it the most recently used
+            self.fetch('aa03')
+        self.assertEqual(self.cached(), ['aa00', 'aa02', 'aa03'])
+        self.assertEqual(paper_cache._estimated_bytes, 300)
+
+
+class PaperQuestionMigrationTests(TransactionTestCase):
+    app = 'QPaperGeneration'
+    before = [(app, '0008_paperquestion')]
+    after = [(app, '0009_copy_question_ids_to_paperquestion')]
+
+    def migrate(self, targets):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(targets)
+        return executor.loader.project_state(targets).apps
+
+    def setUp(self):
+        self.latest = MigrationExecutor(connection).loader.graph.leaf_nodes(self.app)
+        apps = self.migrate(self.before)
+        User = apps.get_model(self.app, 'User')
+        Subject = apps.get_model(self.app, 'Subject')
+        Topic = apps.get_model(self.app, 'Topic')
+        QPattern = apps.get_model(self.app, 'QPattern')
+        Paper = apps.get_model(self.app, 'StudentGeneratedPaper')
+
+        student = User.objects.create(username='migrationstudent', role='student')
+        subject = Subject.objects.create(name='Maths')
+        topic = Topic.objects.create(name='Algebra', sub=subject)
+        self.q1, self.q2, self.q3 = (QPattern.objects.create(user=student, subject=subject, topic=topic,
+                                                             question=f"Q{n}", marks=2).id for n in range(3))
+        deleted = self.q3 + 100
+        # Legacy views stored the POSTed ids as strings; some papers mix both
+        self.mixed = Paper.objects.create(student=student, title="Mixed", total_marks=6, number_of_questions=4,
+                                          question_ids=json.dumps([self.q3, str(self.q1), deleted, f" {self.q2} "]))
+        self.odd = Paper.objects.create(student=student, title="Odd", total_marks=4, number_of_questions=3,
+                                        question_ids=json.dumps([float(self.q2), "abc", 1.5, True]))
+        self.broken = Paper.objects.create(student=student, title="Broken", total_marks=0, number_of_questions=0,
+                                           question_ids="not json")
+        self.deleted = deleted
+
+    def tearDown(self):
+        self.migrate(self.latest)
+
+    def test_question_ids_become_ordered_rows(self):
+        with self.assertLogs('QPaperGeneration.migrations', 'WARNING') as logs:
+            apps = self.migrate(self.after)
+        out = '\n'.join(logs.output)
+        PaperQuestion = apps.get_model(self.app, 'PaperQuestion')
+
+        def rows(paper):
+            return list(PaperQuestion.objects.filter(paper_id=paper.id).order_by('position')
+                        .values_list('position', 'question_id'))
+
+        self.assertEqual(rows(self.mixed), [(0, self.q3), (1, self.q1), (2, self.q2)])
+        self.assertEqual(rows(self.odd), [(0, self.q2)])
+        self.assertEqual(rows(self.broken), [])
+
+        self.assertIn("Skipped 5 stored question id(s)", out)
+        self.assertIn(f"paper {self.mixed.id}: {self.deleted!r} (question deleted)", out)
+        self.assertIn(f"paper {self.odd.id}: 'abc' (not a question id)", out)
+        self.assertIn(f"paper {self.odd.id}: 1.5 (not a question id)", out)
+        self.assertIn(f"paper {self.odd.id}: True (not a question id)", out)
+        self.assertIn(f"paper {self.broken.id}: None (unreadable question_ids)", out)
+
+    def test_reverse_restores_integer_ids(self):
+        with self.assertLogs('QPaperGeneration.migrations', 'WARNING'):
+            self.migrate(self.after)
+        apps = self.migrate(self.before)
+        Paper = apps.get_model(self.app, 'StudentGeneratedPaper')
+        self.assertEqual(json.loads(Paper.objects.get(id=self.mixed.id).question_ids), [self.q3, self.q1, self.q2])
+        self.assertFalse(apps.get_model(self.app, 'PaperQuestion').objects.exists())
+        # The copy runs again cleanly after a rollback, which kept only the ids it could copy
+        apps = self.migrate(self.after)
+        self.assertEqual(apps.get_model(self.app, 'PaperQuestion').objects.filter(paper_id=self.mixed.id).count(), 3)
+
+
+class InstrumentationTests(TestCase):
+    def test_unresolved_paths_share_one_metric_label(self):
+        for path in ('/wp-login.php', '/.env', '/no/such/page'):
+            self.assertEqual(self.client.get(path).status_code, 404)
+        labels = set(metrics.view_seconds._values)
+        self.assertIn((instrumentation.UNRESOLVED_VIEW,), labels)
+        self.assertNotIn(('/.env',), labels)
+        # The request log still shows which path it was
+        self.assertIn('/.env', [entry['view'] for entry in instrumentation.recent_requests()])
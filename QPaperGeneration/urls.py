@@ -1,4 +1,4 @@
- from django.urls import path 
+from django.urls import path 
 from . import views 
   
 urlpatterns = [           
@@ -24,9 +24,12 @@ urlpatterns = [
     
     # Question management
     path("myquestions", views.myquestions, name="myquestions"),
+    path("myquestions/import", views.myquestions_import, name="myquestions_import"),
+    path("questions/picker", views.question_picker, name="question_picker"),
     path("papergenerator", views.papergenerator, name="papergenerator"),
     path("papergen1", views.papergen1, name="papergen1"),
     path("papergen2", views.papergen2, name="papergen2"),
+    path("papergen-batch", views.papergen_batch, name="papergen_batch"),
     path("view-papers", views.view_papers, name="view_papers"),
     
     # Student paper management
@@ -35,6 +38,9 @@ urlpatterns = [
     path('student-generate-paper/', views.student_generate_custom_paper, name='student_generate_custom_paper'),
     path('student-generated-papers/', views.student_generated_papers, name='student_generated_papers'),
     path('staff-generate-paper/', views.staff_generate_paper, name='staff_generate_paper'),
+    path('paper-jobs/', views.paper_jobs, name='paper_jobs'),
+    path('paper-jobs/<int:job_id>/status/', views.paper_job_status, name='paper_job_status'),
+    path('paper-jobs/<int:job_id>/download/', views.paper_job_download, name='paper_job_download'),
     path('student-download-generated-paper/<int:generated_paper_id>/', views.student_download_generated_paper, name='student_download_generated_paper'),
     path('student-update-generated-paper/<int:generated_paper_id>/', views.student_update_generated_paper, name='student_update_generated_paper'),
     path('student-delete-generated-paper/<int:generated_paper_id>/', views.student_delete_generated_paper, name='student_delete_generated_paper'),
@@ -56,5 +62,6 @@ urlpatterns = [
     path('system-settings/', views.system_settings, name='system_settings'),
     path('explore-data/', views.explore_data, name='explore_data'),
     path('question/<int:question_id>/detail/', views.question_detail_ajax, name='question_detail_ajax'),
+    path('metrics', views.metrics_view, name='metrics'),
     
 ]
@@ -1,26 +1,58 @@
-import random        
-import io          
+import csv
+import hmac
 import json                                             
+import random
+import re
 from django.http import JsonResponse                 
 from django.views.decorators.csrf import csrf_protect          
 from django.db import IntegrityError                 
-from django.http import HttpResponseRedirect, FileResponse, HttpResponseForbidden  
+from django.http import HttpResponse, HttpResponseRedirect, FileResponse, HttpResponseBadRequest, HttpResponseForbidden, StreamingHttpResponse
+from django.conf import settings
 from django.shortcuts import render, get_object_or_404   
 from django.contrib.auth import authenticate, login, logout   
 from django.urls import reverse      
-from django.core.paginator import Paginator     
 from django.contrib.auth.decorators import login_required      
 from django.contrib import messages        
-from reportlab.lib.pagesizes import A4  
-from reportlab.pdfgen import canvas   
-from reportlab.lib.utils import simpleSplit    
 from django.utils import timezone  
-from django.db.models import Avg, Count, Sum   
+from django.utils.http import content_disposition_header
+from django.db.models import Sum, Q
+from django.db.models.functions import Substr
+from django.utils.text import Truncator
   
-from QPaperGeneration.models import User, QPattern, Subject, Topic, StudentGeneratedPaper
+from QPaperGeneration.models import User, QPattern, Subject, Topic, StudentGeneratedPaper, PaperJob
+from QPaperGeneration import bank, caching, counters, instrumentation, jobs, metrics
+from QPaperGeneration.pdf import (
+    render_to_file, render_many, stream_zip, practice_paper_layout, staff_paper_layout,
+    single_question_layout, text_paper_layout, error_report_layout,
+)
+from QPaperGeneration.stats import (
+    ROLES, MARKS_BUCKETS, DIFFICULTY_LEVELS, user_stats, question_stats, paper_stats, daily_activity,
+    subject_breakdown, subject_statistics, top_contributors, marks_counts,
+)
+from QPaperGeneration.exports import export_response
+from QPaperGeneration.importer import (
+    IMPORT_FORMATS, ImportFormatError, ImportInterrupted, guess_format, import_questions, read_rows,
+)
+from QPaperGeneration.pagination import FirstPagePaginator, KeysetPaginator
+from QPaperGeneration.paper_cache import paper_cache_key, open_cached_paper
+from QPaperGeneration.near_duplicates import conflict_map, near_duplicate_groups, similar_questions
+from QPaperGeneration.search import search_questions
+from QPaperGeneration.selection import candidate_questions
+from QPaperGeneration.blueprints import (
+    BLUEPRINTS, DIFFICULTY_MIXES, CandidateIndex, blueprint_requirements, blueprint_lines,
+    solve_blueprint, solve_sets,
+)
 
 # Create your views here.
 
+def subject_list():
+    """All subjects, cached until a subject or topic changes"""
+    return caching.get_or_set(caching.CATALOG, ('subjects',), lambda: list(Subject.objects.all()))
+
+def topic_list(subject_id):
+    """Topics of one subject, cached until a subject or topic changes"""
+    return caching.get_or_set(caching.CATALOG, ('topics', subject_id), lambda: list(Topic.objects.filter(sub_id=subject_id)))
+
 @login_required(login_url='student_login')
 def dashboard(request):
     """Main dashboard with role-based access cards"""
@@ -28,11 +60,12 @@ def dashboard(request):
     
     # Add stats for admin
     if request.user.role == 'admin':
+        counts = counters.read('users', 'questions', f'questions:user:{request.user.id}', 'subjects')
         context.update({
-            'total_users': User.objects.count(),
-            'total_questions': QPattern.objects.count(),
-            'total_papers': QPattern.objects.filter(user=request.user).count(),
-            'total_subjects': Subject.objects.count(),
+            'total_users': counts['users'],
+            'total_questions': counts['questions'],
+            'total_papers': counts[f'questions:user:{request.user.id}'],
+            'total_subjects': counts['subjects'],
         })
     
     return render(request, "dashboard.html", context)
@@ -50,11 +83,12 @@ def admin_dashboard(request):
         return HttpResponseRedirect(reverse("dashboard"))
     
     # Admin statistics
-    total_users = User.objects.count()
-    total_staff = User.objects.filter(role='staff').count()
-    total_students = User.objects.filter(role='student').count()
-    total_questions = QPattern.objects.count()
-    total_subjects = Subject.objects.count()
+    counts = counters.read('users', 'users:role:staff', 'users:role:student', 'questions', 'subjects')
+    total_users = counts['users']
+    total_staff = counts['users:role:staff']
+    total_students = counts['users:role:student']
+    total_questions = counts['questions']
+    total_subjects = counts['subjects']
     
     # Recent activities
     recent_questions = QPattern.objects.all().order_by('-id')[:5]
@@ -95,19 +129,17 @@ def user_management(request):
             Q(email__icontains=search_query)
         )
     
-    # Calculate user statistics
-    total_users = users.count()
-    staff_count = users.filter(role='staff').count()
-    student_count = users.filter(role='student').count()
-    admin_count = users.filter(role='admin').count()
+    # Calculate user statistics, including recent activity (last login)
+    counts = user_stats(users)
+    total_users = counts['total']
+    staff_count = counts['staff']
+    student_count = counts['students']
+    admin_count = counts['admins']
+    active_today = counts['active_today']
     
-    # Get recent activity (last login)
-    active_today = users.filter(last_login__date=timezone.now().date()).count()
-    
-    # Pagination
-    paginator = Paginator(users, 15)  # 15 users per page
-    page_number = request.GET.get('page')
-    users_page = paginator.get_page(page_number)
+    # Keyset pagination, reusing the filtered total from the statistics
+    paginator = KeysetPaginator(users, 15, ordering=('-date_joined', '-id'), count=total_users)  # 15 users per page
+    users_page = paginator.get_page(request.GET.get('cursor'))
     
     context = {
         'users': users_page,
@@ -269,12 +301,15 @@ def staff_dashboard(request):
         return HttpResponseRedirect(reverse("dashboard"))
     
     # Staff statistics
-    my_questions = QPattern.objects.filter(user=request.user).count()
-    total_questions = QPattern.objects.count()
-    my_subjects = Subject.objects.all()
+    counts = counters.read(f'questions:user:{request.user.id}', 'questions')
+    my_questions = counts[f'questions:user:{request.user.id}']
+    total_questions = counts['questions']
+    my_subjects = subject_list()
     
     # Recent questions by this staff
-    recent_my_questions = QPattern.objects.filter(user=request.user).order_by('-id')[:5]
+    recent_my_questions = caching.get_or_set(caching.DASHBOARD, ('staff', 'recent', request.user.id), lambda: list(
+        QPattern.objects.filter(user=request.user).select_related('subject', 'topic', 'user').order_by('-id')[:5]
+    ))
     
     context = {
         'my_questions': my_questions,
@@ -289,11 +324,15 @@ def staff_dashboard(request):
 def student_dashboard(request):
     """Student-specific dashboard"""
     # Students can view all available question papers
-    available_papers = QPattern.objects.all().order_by('-id')[:10]
-    subjects = Subject.objects.all()
+    available_papers = caching.get_or_set(caching.DASHBOARD, ('student', 'latest'), lambda: list(
+        QPattern.objects.select_related('subject', 'topic', 'user').order_by('-id')[:10]
+    ))
+    subjects = subject_list()
     
     # Get student's generated papers
-    student_generated_papers = StudentGeneratedPaper.objects.filter(student=request.user).order_by('-created_at')[:5]
+    student_generated_papers = caching.get_or_set(caching.DASHBOARD, ('student', 'papers', request.user.id), lambda: list(
+        StudentGeneratedPaper.objects.filter(student=request.user).order_by('-created_at')[:5]
+    ))
     
     context = {
         'available_papers': available_papers,
@@ -314,80 +353,18 @@ def student_generated_papers(request):
     
     return render(request, "student_generated_papers.html", context)
 
+def single_question_pdf(paper):
+    """Single question PDF from the render cache, re-rendered only when the question changed"""
+    key = paper_cache_key('single_question', '', [paper], paper.user.username)
+    return open_cached_paper(key, lambda: render_to_file(single_question_layout(paper)))
+
 @login_required(login_url='student_login')
 def student_download_paper(request, paper_id):
     """Download a single question paper as PDF for students"""
     try:
         # Get the specific question paper
-        paper = get_object_or_404(QPattern, id=paper_id)
-        
-        # Generate PDF
-        buffer = io.BytesIO()
-        p = canvas.Canvas(buffer, pagesize=A4)
-        width, height = A4
-        
-        # Set up the PDF content
-        p.setFont("Times-Bold", 20)
-        p.drawCentredString(width/2, height-50, "QUESTION PAPER")
-        p.setFont("Times-Roman", 12)
-        p.drawCentredString(width/2, height-70, f"Subject: {paper.subject.name}")
-        p.drawCentredString(width/2, height-85, f"Topic: {paper.topic.name}")
-        
-        # Draw line
-        p.line(50, height-100, width-50, height-100)
-        
-        # Question details
-        y_position = height - 120
-        p.setFont("Times-Bold", 12)
-        p.drawString(50, y_position, "Question Details:")
-        y_position -= 20
-        
-        p.setFont("Times-Roman", 12)
-        details = [
-            f"Marks: {paper.marks}",
-            f"Difficulty Level: {paper.difficulty}/5",
-            f"Created by: {paper.user.username}",
-            "",
-            "Question:",
-        ]
-        
-        for detail in details:
-            p.drawString(50, y_position, detail)
-            y_position -= 15
-        
-        # Add the question text with proper formatting
-        y_position -= 10
-        question_lines = simpleSplit(paper.question, "Times-Roman", 12, width-100)
-        for line in question_lines:
-            if y_position < 100:  # Check if we need a new page
-                p.showPage()
-                y_position = height - 50
-                p.setFont("Times-Roman", 12)
-            p.drawString(50, y_position, line)
-            y_position -= 15
-        
-        # Add instructions
-        y_position -= 20
-        instructions = [
-            "",
-            "Instructions:",
-            "• Answer the question completely",
-            "• Show all working steps",
-            "• Write neatly and legibly",
-            "• Time: 60 minutes",
-        ]
-        
-        for instruction in instructions:
-            if y_position < 100:
-                p.showPage()
-                y_position = height - 50
-                p.setFont("Times-Roman", 12)
-            p.drawString(50, y_position, instruction)
-            y_position -= 15
-        
-        p.showPage()
-        p.save()
-        buffer.seek(0)
+        paper = get_object_or_404(QPattern.objects.select_related('subject', 'topic', 'user'), id=paper_id)
+        buffer = single_question_pdf(paper)
         
         filename = f"Question_{paper.subject.name}_{paper.id}.pdf"
         messages.success(request, "📄 Question paper downloaded successfully!")
@@ -396,7 +373,59 @@ def student_download_paper(request, paper_id):
     except Exception as e:
         messages.error(request, f"❌ Error generating PDF: {str(e)}")
         return HttpResponseRedirect(reverse("student_dashboard"))
+
+def analytics_context(users, questions, papers, subjects, contributors, activity):
+    """Analytics dashboard context from the stats.py aggregates"""
+    total_users = users['total']
+    role_distribution = {key: users[key] for key in ROLES}
+    
+    # Since QPattern doesn't have created_at, we'll use total counts
+    total_questions = questions['total']
     
+    # Calculate percentages
+    student_percentage = (role_distribution['students'] / total_users * 100) if total_users > 0 else 0
+    staff_percentage = (role_distribution['staff'] / total_users * 100) if total_users > 0 else 0
+    admin_percentage = (role_distribution['admins'] / total_users * 100) if total_users > 0 else 0
+    
+    return {
+        # User Stats
+        'total_users': total_users,
+        'users_today': users['today'],
+        'users_this_week': users['this_week'],
+        'users_this_month': users['this_month'],
+        'role_distribution': role_distribution,
+        'active_users_today': users['active_today'],
+        
+        # Question Stats
+        'total_questions': total_questions,
+        'questions_today': total_questions,  # Placeholder
+        'questions_this_week': total_questions,  # Placeholder
+        'questions_this_month': total_questions,  # Placeholder
+        'marks_distribution': questions['marks_distribution'],
+        'difficulty_distribution': questions['difficulty_distribution'],
+        
+        # Subject Stats
+        'subjects': subjects,
+        'top_contributors': contributors,
+        
+        # Activity Stats (last 7 days)
+        'recent_activity': activity,
+        'total_papers_generated': papers['total'],
+        'papers_today': papers['today'],
+        'papers_this_week': papers['this_week'],
+        'papers_this_month': papers['this_month'],
+        
+        # Paper Generation by Role
+        'student_papers': papers['students'],
+        'staff_papers': papers['staff'],
+        'admin_papers': papers['admins'],
+        
+        # Calculations for percentages
+        'student_percentage': student_percentage,
+        'staff_percentage': staff_percentage,
+        'admin_percentage': admin_percentage,
+    }
+
 @login_required(login_url='student_login')
 def analytics_dashboard(request):
     """Admin analytics dashboard with detailed statistics"""
@@ -405,128 +434,32 @@ def analytics_dashboard(request):
         return HttpResponseRedirect(reverse("dashboard"))
     
     try:
-        # User Statistics
-        total_users = User.objects.count()
-        users_today = User.objects.filter(date_joined__date=timezone.now().date()).count()
-        users_this_week = User.objects.filter(date_joined__gte=timezone.now() - timezone.timedelta(days=7)).count()
-        users_this_month = User.objects.filter(date_joined__gte=timezone.now() - timezone.timedelta(days=30)).count()
-        
-        # Role Distribution
-        role_distribution = {
-            'students': User.objects.filter(role='student').count(),
-            'staff': User.objects.filter(role='staff').count(),
-            'admins': User.objects.filter(role='admin').count(),
-        }
-        
-        # Question Statistics
-        total_questions = QPattern.objects.count()
-        
-        # Since QPattern doesn't have created_at, we'll use total counts
-        questions_today = total_questions  # Placeholder
-        questions_this_week = total_questions  # Placeholder
-        questions_this_month = total_questions  # Placeholder
-        
-        # Marks Distribution
-        marks_distribution = {
-            '2_marks': QPattern.objects.filter(marks=2).count(),
-            '5_marks': QPattern.objects.filter(marks=5).count(),
-            '10_marks': QPattern.objects.filter(marks=10).count(),
-        }
-        
-        # Difficulty Distribution
-        difficulty_distribution = {}
-        for i in range(1, 6):
-            difficulty_distribution[f'level_{i}'] = QPattern.objects.filter(difficulty=i).count()
-        
-        # CORRECTED: Subject Statistics - Use the correct related_name 'sub'
-        subjects = Subject.objects.annotate(
-            question_count=Count('sub'),  # Use 'sub' which is the related_name from QPattern
-            avg_difficulty=Avg('sub__difficulty'),
-            avg_marks=Avg('sub__marks')
-        ).order_by('-question_count')
-        
-        # Top Contributors (Users with most questions)
-        top_contributors = User.objects.annotate(
-            question_count=Count('usr')  # Use 'usr' which is the related_name from QPattern
-        ).filter(question_count__gt=0).order_by('-question_count')[:10]
-        
-        # Recent Activity Timeline (last 7 days) - Using StudentGeneratedPaper created_at
-        recent_activity = []
-        for i in range(6, -1, -1):
-            date = timezone.now().date() - timezone.timedelta(days=i)
-            users_count = User.objects.filter(date_joined__date=date).count()
-            papers_count = StudentGeneratedPaper.objects.filter(created_at__date=date).count()
-            recent_activity.append({
-                'date': date.strftime('%Y-%m-%d'),
-                'display_date': date.strftime('%b %d'),
-                'users': users_count,
-                'questions': papers_count,  # Using papers as activity indicator
-            })
-        
-        # System Performance Metrics
-        active_users_today = User.objects.filter(last_login__date=timezone.now().date()).count()
-        
-        # Paper Generation Statistics
-        total_papers_generated = StudentGeneratedPaper.objects.count()
-        papers_today = StudentGeneratedPaper.objects.filter(created_at__date=timezone.now().date()).count()
-        papers_this_week = StudentGeneratedPaper.objects.filter(created_at__gte=timezone.now() - timezone.timedelta(days=7)).count()
-        papers_this_month = StudentGeneratedPaper.objects.filter(created_at__gte=timezone.now() - timezone.timedelta(days=30)).count()
-        
-        # Paper Generation by Role
-        student_papers = StudentGeneratedPaper.objects.filter(student__role='student').count()
-        staff_papers = StudentGeneratedPaper.objects.filter(student__role='staff').count()
-        admin_papers = StudentGeneratedPaper.objects.filter(student__role='admin').count()
-        
-        # Calculate percentages
-        student_percentage = (role_distribution['students'] / total_users * 100) if total_users > 0 else 0
-        staff_percentage = (role_distribution['staff'] / total_users * 100) if total_users > 0 else 0
-        admin_percentage = (role_distribution['admins'] / total_users * 100) if total_users > 0 else 0
-        
-        context = {
-            # User Stats
-            'total_users': total_users,
-            'users_today': users_today,
-            'users_this_week': users_this_week,
-            'users_this_month': users_this_month,
-            'role_distribution': role_distribution,
-            'active_users_today': active_users_today,
-            
-            # Question Stats
-            'total_questions': total_questions,
-            'questions_today': questions_today,
-            'questions_this_week': questions_this_week,
-            'questions_this_month': questions_this_month,
-            'marks_distribution': marks_distribution,
-            'difficulty_distribution': difficulty_distribution,
-            
-            # Subject Stats
-            'subjects': subjects,
-            'top_contributors': top_contributors,
-            
-            # Activity Stats
-            'recent_activity': recent_activity,
-            'total_papers_generated': total_papers_generated,
-            'papers_today': papers_today,
-            'papers_this_week': papers_this_week,
-            'papers_this_month': papers_this_month,
-            
-            # Paper Generation by Role
-            'student_papers': student_papers,
-            'staff_papers': staff_papers,
-            'admin_papers': admin_papers,
-            
-            # Calculations for percentages
-            'student_percentage': student_percentage,
-            'staff_percentage': staff_percentage,
-            'admin_percentage': admin_percentage,
-        }
-        
+        now = timezone.now()
+        context = analytics_context(
+            user_stats(now=now), question_stats(), paper_stats(now=now),
+            subject_statistics(), top_contributors(), daily_activity(7, now=now),
+        )
         return render(request, "analytics_dashboard.html", context)
         
     except Exception as e:
         messages.error(request, f"Error loading analytics: {str(e)}")
         return HttpResponseRedirect(reverse("admin_dashboard"))
-    
+
+def metrics_scrape_allowed(request):
+    """Staff, admin, the configured bearer token, or an allowed scraper address"""
+    if request.user.is_authenticated and request.user.role in ['staff', 'admin']:
+        return True
+    token = getattr(settings, 'METRICS_TOKEN', '')
+    if token and hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        return True
+    return request.META.get('REMOTE_ADDR') in getattr(settings, 'METRICS_ALLOWED_IPS', [])
+
+def metrics_view(request):
+    """Prometheus scrape endpoint"""
+    if not metrics_scrape_allowed(request):
+        return HttpResponseForbidden("Access denied.")
+    return HttpResponse(metrics.exposition(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
 @login_required(login_url='student_login')
 def system_settings(request):
     """System settings page for admin"""
@@ -535,10 +468,11 @@ def system_settings(request):
         return HttpResponseRedirect(reverse("dashboard"))
     
     # System information
-    total_users = User.objects.count()
-    total_questions = QPattern.objects.count()
-    total_subjects = Subject.objects.count()
-    total_papers = StudentGeneratedPaper.objects.count()
+    counts = counters.read('users', 'questions', 'subjects', 'papers')
+    total_users = counts['users']
+    total_questions = counts['questions']
+    total_subjects = counts['subjects']
+    total_papers = counts['papers']
     
     # Database information
     from django.db import connection
@@ -554,6 +488,11 @@ def system_settings(request):
         'total_subjects': total_subjects,
         'total_papers': total_papers,
         'db_info': db_info,
+        # Request performance recorded by instrumentation.query_timing_middleware
+        'slowest_endpoints': instrumentation.slowest_endpoints(),
+        'most_queries': instrumentation.most_queries(),
+        'slow_queries': instrumentation.slow_queries()[:20],
+        'slow_query_ms': instrumentation.slow_query_ms(),
     }
     
     return render(request, "system_settings.html", context)
@@ -579,9 +518,13 @@ def explore_data(request):
         selected_marks = request.GET.get('marks', '')
         selected_difficulty = request.GET.get('difficulty', '')
         selected_user = request.GET.get('user', '')
+        export_format = request.GET.get('export')
         
+        # Matches are shown best first; relevance is no keyset sort key, so that view
+        # is a single page and sort=newest pages through every match instead
+        ranked = bool(search_query) and not export_format and request.GET.get('sort') != 'newest'
         if search_query:
-            questions = questions.filter(question__icontains=search_query)
+            questions = search_questions(questions, search_query, ranked=ranked)
         
         if selected_subject:
             questions = questions.filter(subject_id=selected_subject)
@@ -595,94 +538,54 @@ def explore_data(request):
         if selected_user:
             questions = questions.filter(user_id=selected_user)
         
+        # Handle exports before any of the page statistics are computed
+        if export_format:
+            return export_questions_data(questions, export_format)
+        
         # Statistics
-        total_questions = QPattern.objects.count()
-        total_subjects = Subject.objects.count()
-        total_topics = Topic.objects.count()
-        total_users = User.objects.count()
-        total_generated_papers = StudentGeneratedPaper.objects.count()
+        counts = counters.read(
+            'questions', 'subjects', 'topics', 'users', 'papers', 'questions:marks_total',
+            *(f'questions:marks:{marks}' for marks in MARKS_BUCKETS),
+            *(f'questions:difficulty:{level}' for level in DIFFICULTY_LEVELS),
+        )
+        total_questions = counts['questions']
+        total_subjects = counts['subjects']
+        total_topics = counts['topics']
+        total_users = counts['users']
+        total_generated_papers = counts['papers']
         
         # Marks distribution
-        marks_distribution = {
-            'marks_2': QPattern.objects.filter(marks=2).count(),
-            'marks_5': QPattern.objects.filter(marks=5).count(),
-            'marks_10': QPattern.objects.filter(marks=10).count(),
-            'total': QPattern.objects.aggregate(Sum('marks'))['marks__sum'] or 0
-        }
+        marks_distribution = {f'marks_{marks}': counts[f'questions:marks:{marks}'] for marks in MARKS_BUCKETS}
+        marks_distribution['total'] = counts['questions:marks_total']
         
         # Difficulty distribution
-        difficulty_distribution = {}
-        for i in range(1, 6):
-            difficulty_distribution[f'level_{i}'] = QPattern.objects.filter(difficulty=i).count()
+        difficulty_distribution = {f'level_{level}': counts[f'questions:difficulty:{level}'] for level in DIFFICULTY_LEVELS}
         
-        # Get subjects with statistics using aggregation
-        subjects_with_stats = []
-        for subject in subjects:
-            # Get question counts by marks for this subject
-            marks_counts = QPattern.objects.filter(subject=subject).values('marks').annotate(count=Count('id'))
-            
-            marks_2_count = 0
-            marks_5_count = 0
-            marks_10_count = 0
-            
-            for item in marks_counts:
-                if item['marks'] == 2:
-                    marks_2_count = item['count']
-                elif item['marks'] == 5:
-                    marks_5_count = item['count']
-                elif item['marks'] == 10:
-                    marks_10_count = item['count']
-            
-            total_count = marks_2_count + marks_5_count + marks_10_count
-            
-            # Get topics for this subject
-            subject_topics = []
-            topics_for_subject = Topic.objects.filter(sub=subject)
-            for topic in topics_for_subject:
-                topic_count = QPattern.objects.filter(topic=topic).count()
-                subject_topics.append({
-                    'id': topic.id,
-                    'name': topic.name,
-                    'question_count': topic_count
-                })
-            
-            # Calculate percentages safely
-            marks_2_percent = (marks_2_count / total_count * 100) if total_count > 0 else 0
-            marks_5_percent = (marks_5_count / total_count * 100) if total_count > 0 else 0
-            marks_10_percent = (marks_10_count / total_count * 100) if total_count > 0 else 0
-            
-            subjects_with_stats.append({
-                'id': subject.id,
-                'name': subject.name,
-                'question_count': total_count,
-                'marks_2_count': marks_2_count,
-                'marks_5_count': marks_5_count,
-                'marks_10_count': marks_10_count,
-                'marks_2_percent': marks_2_percent,
-                'marks_5_percent': marks_5_percent,
-                'marks_10_percent': marks_10_percent,
-                'topics': subject_topics
-            })
+        # Per subject marks split and topic counts, from grouped queries (cached)
+        subjects_with_stats = subject_breakdown()
         
-        # Pagination
+        # Keyset pagination; filtered question totals are estimated rather than fully counted
         questions_per_page = 15
         papers_per_page = 10
         
-        questions_paginator = Paginator(questions, questions_per_page)
-        papers_paginator = Paginator(generated_papers, papers_per_page)
-        
-        page_questions = request.GET.get('page')
-        page_papers = request.GET.get('page_papers')
+        filtered = any([search_query, selected_subject, selected_marks, selected_difficulty, selected_user])
+        if ranked:
+            questions_paginator = FirstPagePaginator(questions, questions_per_page, estimate=True)
+        else:
+            questions_paginator = KeysetPaginator(questions, questions_per_page,
+                                                  count=None if filtered else total_questions, estimate=True)
+        papers_paginator = KeysetPaginator(generated_papers, papers_per_page, ordering=('-created_at', '-id'),
+                                           count=total_generated_papers)
         
-        questions_page = questions_paginator.get_page(page_questions)
-        papers_page = papers_paginator.get_page(page_papers)
+        questions_page = questions_paginator.get_page(request.GET.get('cursor'))
+        papers_page = papers_paginator.get_page(request.GET.get('cursor_papers'))
         
         # Build query string for pagination
         query_params = request.GET.copy()
-        if 'page' in query_params:
-            del query_params['page']
-        if 'page_papers' in query_params:
-            del query_params['page_papers']
+        if 'cursor' in query_params:
+            del query_params['cursor']
+        if 'cursor_papers' in query_params:
+            del query_params['cursor_papers']
         query_string = query_params.urlencode()
         
         context = {
@@ -699,6 +602,7 @@ def explore_data(request):
             'selected_marks': selected_marks,
             'selected_difficulty': selected_difficulty,
             'selected_user': selected_user,
+            'ranked': ranked,
             'query_string': query_string,
             
             # Statistics
@@ -711,11 +615,6 @@ def explore_data(request):
             'difficulty_distribution': difficulty_distribution,
         }
         
-        # Handle exports
-        export_format = request.GET.get('export')
-        if export_format:
-            return export_questions_data(questions, export_format)
-        
         return render(request, "explore_data.html", context)
         
     except Exception as e:
@@ -723,99 +622,72 @@ def explore_data(request):
         return HttpResponseRedirect(reverse("admin_dashboard"))
 
 def export_questions_data(queryset, format_type):
-    """Export questions data in various formats"""
+    """Export questions data in various formats, streamed in chunks"""
     try:
-        if format_type == 'csv':
-            import csv
-            from django.http import HttpResponse
-            
-            response = HttpResponse(content_type='text/csv')
-            response['Content-Disposition'] = 'attachment; filename="questions_export.csv"'
-            
-            writer = csv.writer(response)
-            writer.writerow(['ID', 'Question', 'Subject', 'Topic', 'Marks', 'Difficulty', 'Created By', 'User Role'])
-            
-            for question in queryset:
-                writer.writerow([
-                    question.id,
-                    question.question,
-                    question.subject.name,
-                    question.topic.name,
-                    question.marks,
-                    question.difficulty,
-                    question.user.username,
-                    question.user.role
-                ])
-            
-            return response
-            
-        elif format_type == 'json':
-            from django.http import JsonResponse
-            
-            data = []
-            for question in queryset:
-                data.append({
-                    'id': question.id,
-                    'question': question.question,
-                    'subject': question.subject.name,
-                    'topic': question.topic.name,
-                    'marks': question.marks,
-                    'difficulty': question.difficulty,
-                    'created_by': question.user.username,
-                    'user_role': question.user.role
-                })
-            
-            return JsonResponse(data, safe=False)
-            
-    except Exception as e:
-        return JsonResponse({'error': str(e)}, status=500)
+        return export_response(queryset, format_type)
+    except KeyError:
+        return JsonResponse({'error': f"Unsupported export format '{format_type}'."}, status=400)
 
 @login_required(login_url='student_login')
 def question_detail_ajax(request, question_id):
-    """AJAX view for question details"""
+    """AJAX view for question details, the HTML cached per question"""
     try:
-        question = get_object_or_404(QPattern, id=question_id)
-        
-        # Build the HTML content properly without Django template syntax
-        html = f"""
-        <div class="row">
-            <div class="col-md-8">
-                <h6>Question Text:</h6>
-                <div class="border p-3 bg-light rounded mb-3">
-                    {question.question}
-                </div>
-        """
-        
-        # Add answer section only if answer exists
-        if question.answer:
-            html += f"""
-                <h6>Answer:</h6>
-                <div class="border p-3 bg-light rounded">
-                    {question.answer}
-                </div>
-            """
+        html = caching.get_or_set(caching.QUESTION, (question_id,), lambda: question_detail_html(question_id))
+        return JsonResponse({'success': True, 'html': html})
         
-        # Continue with the rest of the HTML
-        html += f"""
+    except Exception as e:
+        return JsonResponse({'success': False, 'error': str(e)})
+
+def question_detail_html(question_id):
+    """Detail card HTML for one question"""
+    question = get_object_or_404(QPattern.objects.select_related('subject', 'topic', 'user'), id=question_id)
+    
+    # Build the HTML content properly without Django template syntax
+    html = f"""
+    <div class="row">
+        <div class="col-md-8">
+            <h6>Question Text:</h6>
+            <div class="border p-3 bg-light rounded mb-3">
+                {question.question}
             </div>
-            <div class="col-md-4">
-                <h6>Details:</h6>
-                <table class="table table-sm">
-                    <tr><td><strong>Subject:</strong></td><td>{question.subject.name}</td></tr>
-                    <tr><td><strong>Topic:</strong></td><td>{question.topic.name}</td></tr>
-                    <tr><td><strong>Marks:</strong></td><td>{question.marks}</td></tr>
-                    <tr><td><strong>Difficulty:</strong></td><td>{question.difficulty}/5</td></tr>
-                    <tr><td><strong>Created By:</strong></td><td>{question.user.username} ({question.user.role})</td></tr>
-                    <tr><td><strong>Created:</strong></td><td>{question.user.date_joined.strftime('%Y-%m-%d')}</td></tr>
-                </table>
+    """
+    
+    # Add answer section only if answer exists
+    if question.answer:
+        html += f"""
+            <h6>Answer:</h6>
+            <div class="border p-3 bg-light rounded">
+                {question.answer}
             </div>
-        </div>
         """
-        
-        return JsonResponse({'success': True, 'html': html})
-        
-    except Exception as e:
-        return JsonResponse({'success': False, 'error': str(e)})@login_required(login_url='student_login')
+    
+    # Continue with the rest of the HTML
+    html += f"""
+        </div>
+        <div class="col-md-4">
+            <h6>Details:</h6>
+            <table class="table table-sm">
+                <tr><td><strong>Subject:</strong></td><td>{question.subject.name}</td></tr>
+                <tr><td><strong>Topic:</strong></td><td>{question.topic.name}</td></tr>
+                <tr><td><strong>Marks:</strong></td><td>{question.marks}</td></tr>
+                <tr><td><strong>Difficulty:</strong></td><td>{question.difficulty}/5</td></tr>
+                <tr><td><strong>Created By:</strong></td><td>{question.user.username} ({question.user.role})</td></tr>
+                <tr><td><strong>Created:</strong></td><td>{question.user.date_joined.strftime('%Y-%m-%d')}</td></tr>
+                <tr><td><strong>Used In:</strong></td><td>{question.paper_questions.count()} generated papers</td></tr>
+            </table>
+        </div>
+    </div>
+    """
+    return html
+
+def practice_paper_pdf(title, total_marks, questions):
+    """Practice paper PDF from the render cache, keyed so generate and re-download share it"""
+    questions = list(questions)
+    key = paper_cache_key('practice', title, questions, total_marks)
+    return open_cached_paper(key, lambda: render_to_file(
+        practice_paper_layout(title, total_marks, questions)))
+
+@login_required(login_url='student_login')
 def student_generate_custom_paper(request):
     """Generate a custom question paper for students from selected questions"""
     if request.method == "POST":
@@ -828,86 +700,14 @@ def student_generate_custom_paper(request):
                 return HttpResponseRedirect(reverse("student_generate_custom_paper"))
             
             # Get the selected questions
-            questions = QPattern.objects.filter(id__in=selected_questions)
+            questions = QPattern.objects.filter(id__in=selected_questions).select_related('subject', 'topic')
             
             # Calculate total marks
             total_marks = sum(question.marks for question in questions)
             
             # Generate PDF
-            buffer = io.BytesIO()
-            p = canvas.Canvas(buffer, pagesize=A4)
-            width, height = A4
-            
-            # PDF header
-            p.setFont("Times-Bold", 24)
-            p.drawCentredString(width/2, height-50, paper_title.upper())
-            p.setFont("Times-Roman", 16)
-            p.drawCentredString(width/2, height-80, "Practice Question Paper")
-            p.drawCentredString(width/2, height-105, f"Total Marks: {total_marks}")
-            
-            # Draw line
-            p.line(50, height-120, width-50, height-120)
-            
-            # Instructions section
-            y_position = height - 140
-            p.setFont("Times-Bold", 14)
-            p.drawString(50, y_position, "General Instructions:")
-            y_position -= 25
-            
-            p.setFont("Times-Roman", 12)
-            instructions = [
-                "1. Answer all questions",
-                "2. Show all working steps", 
-                "3. Write neatly and legibly",
-                "4. Calculators are allowed",
-                "5. Time: 3 Hours",
-            ]
-            
-            for instruction in instructions:
-                p.drawString(60, y_position, instruction)
-                y_position -= 15
-            
-            y_position -= 20
-            
-            # Questions section
-            p.setFont("Times-Bold", 16)
-            p.drawString(50, y_position, "QUESTIONS")
-            y_position -= 30
-            
-            # Add questions to PDF
-            question_number = 1
-            for question in questions:
-                if y_position < 100:  # New page if needed
-                    p.showPage()
-                    y_position = height - 50
-                    p.setFont("Times-Roman", 12)
-                
-                # Question header
-                p.setFont("Times-Bold", 12)
-                p.drawString(50, y_position, f"Q{question_number}. [{question.marks} marks]")
-                y_position -= 15
-                
-                p.setFont("Times-Roman", 10)
-                p.drawString(50, y_position, f"Subject: {question.subject.name} | Topic: {question.topic.name}")
-                y_position -= 20
-                
-                # Question text
-                p.setFont("Times-Roman", 12)
-                question_lines = simpleSplit(question.question, "Times-Roman", 12, width-100)
-                for line in question_lines:
-                    if y_position < 100:
-                        p.showPage()
-                        y_position = height - 50
-                        p.setFont("Times-Roman", 12)
-                    p.drawString(60, y_position, line)
-                    y_position -= 15
-                
-                y_position -= 10  # Space between questions
-                question_number += 1
-            
-            p.showPage()
-            p.save()
-            buffer.seek(0)
+            buffer = practice_paper_pdf(paper_title, total_marks, questions)
+            metrics.papers_generated.inc(source='student', type='custom')
             
             # Save to student's generated papers history
             student_paper = StudentGeneratedPaper.objects.create(
@@ -917,7 +717,7 @@ def student_generate_custom_paper(request):
                 number_of_questions=len(questions),
             )
             
-            # Store the question IDs as JSON for reference
+            # Store the question IDs in paper order for reference
             question_ids = [q.id for q in questions]
             student_paper.set_question_ids(question_ids)
             student_paper.save()
@@ -930,13 +730,12 @@ def student_generate_custom_paper(request):
             messages.error(request, f"❌ Error generating custom paper: {str(e)}")
             return HttpResponseRedirect(reverse("student_dashboard"))
     else:
-        # GET request - show available questions for selection
-        available_questions = QPattern.objects.all().order_by('subject__name', 'marks')
-        subjects = Subject.objects.all()
+        # GET request - questions are loaded page by page from question_picker
+        subjects = subject_list()
         
         context = {
-            'available_questions': available_questions,
             'subjects': subjects,
+            'selected_questions': [],
         }
         return render(request, "student_generate_paper.html", context)
 
@@ -955,7 +754,7 @@ def student_update_generated_paper(request, generated_paper_id):
                 return HttpResponseRedirect(reverse("student_update_generated_paper", args=[generated_paper_id]))
             
             # Get the selected questions
-            questions = QPattern.objects.filter(id__in=selected_questions)
+            questions = QPattern.objects.filter(id__in=selected_questions).select_related('subject', 'topic')
             
             # Calculate total marks
             total_marks = sum(question.marks for question in questions)
@@ -968,94 +767,23 @@ def student_update_generated_paper(request, generated_paper_id):
             generated_paper.save()
             
             # Generate updated PDF
-            buffer = io.BytesIO()
-            p = canvas.Canvas(buffer, pagesize=A4)
-            width, height = A4
-            
-            # PDF header
-            p.setFont("Times-Bold", 24)
-            p.drawCentredString(width/2, height-50, paper_title.upper())
-            p.setFont("Times-Roman", 16)
-            p.drawCentredString(width/2, height-80, "Practice Question Paper")
-            p.drawCentredString(width/2, height-105, f"Total Marks: {total_marks}")
-            
-            # Draw line
-            p.line(50, height-120, width-50, height-120)
-            
-            # Instructions section
-            y_position = height - 140
-            p.setFont("Times-Bold", 14)
-            p.drawString(50, y_position, "General Instructions:")
-            y_position -= 25
-            
-            p.setFont("Times-Roman", 12)
-            instructions = [
-                "1. Answer all questions",
-                "2. Show all working steps", 
-                "3. Write neatly and legibly",
-                "4. Calculators are allowed",
-                "5. Time: 3 Hours",
-            ]
-            
-            for instruction in instructions:
-                p.drawString(60, y_position, instruction)
-                y_position -= 15
-            
-            y_position -= 20
-            
-            # Questions section
-            p.setFont("Times-Bold", 16)
-            p.drawString(50, y_position, "QUESTIONS")
-            y_position -= 30
-            
-            # Add questions to PDF
-            question_number = 1
-            for question in questions:
-                if y_position < 100:  # New page if needed
-                    p.showPage()
-                    y_position = height - 50
-                    p.setFont("Times-Roman", 12)
-                
-                # Question header
-                p.setFont("Times-Bold", 12)
-                p.drawString(50, y_position, f"Q{question_number}. [{question.marks} marks]")
-                y_position -= 15
-                
-                p.setFont("Times-Roman", 10)
-                p.drawString(50, y_position, f"Subject: {question.subject.name} | Topic: {question.topic.name}")
-                y_position -= 20
-                
-                # Question text
-                p.setFont("Times-Roman", 12)
-                question_lines = simpleSplit(question.question, "Times-Roman", 12, width-100)
-                for line in question_lines:
-                    if y_position < 100:
-                        p.showPage()
-                        y_position = height - 50
-                        p.setFont("Times-Roman", 12)
-                    p.drawString(60, y_position, line)
-                    y_position -= 15
-                
-                y_position -= 10  # Space between questions
-                question_number += 1
-            
-            p.showPage()
-            p.save()
-            buffer.seek(0)
+            buffer = practice_paper_pdf(paper_title, total_marks, questions)
+            metrics.papers_generated.inc(source='student_update', type='custom')
             
             filename = f"Updated_Paper_{generated_paper.id}.pdf"
             messages.success(request, "🔄 Question paper updated successfully!")
             return FileResponse(buffer, as_attachment=True, filename=filename)
             
         else:
-            # GET request - show form with current selection
-            available_questions = QPattern.objects.all().order_by('subject__name', 'marks')
-            current_question_ids = generated_paper.get_question_ids()
-            subjects = Subject.objects.all()
+            # GET request - show form with current selection; the picker loads the rest
+            selected_questions = [
+                {'id': qid, 'marks': marks}
+                for qid, marks in generated_paper.paper_questions.values_list('question_id', 'question__marks')
+            ]
+            subjects = subject_list()
             
             context = {
-                'available_questions': available_questions,
-                'current_question_ids': current_question_ids,
+                'selected_questions': selected_questions,
                 'generated_paper': generated_paper,
                 'subjects': subjects,
             }
@@ -1091,81 +819,8 @@ def student_download_generated_paper(request, generated_paper_id):
         # Get the questions from stored IDs
         questions = generated_paper.get_questions()
         
-        # Regenerate PDF
-        buffer = io.BytesIO()
-        p = canvas.Canvas(buffer, pagesize=A4)
-        width, height = A4
-        
-        # PDF header
-        p.setFont("Times-Bold", 24)
-        p.drawCentredString(width/2, height-50, generated_paper.title.upper())
-        p.setFont("Times-Roman", 16)
-        p.drawCentredString(width/2, height-80, "Practice Question Paper")
-        p.drawCentredString(width/2, height-105, f"Total Marks: {generated_paper.total_marks}")
-        
-        # Draw line
-        p.line(50, height-120, width-50, height-120)
-        
-        # Instructions section
-        y_position = height - 140
-        p.setFont("Times-Bold", 14)
-        p.drawString(50, y_position, "General Instructions:")
-        y_position -= 25
-        
-        p.setFont("Times-Roman", 12)
-        instructions = [
-            "1. Answer all questions",
-            "2. Show all working steps", 
-            "3. Write neatly and legibly",
-            "4. Calculators are allowed",
-            "5. Time: 3 Hours",
-        ]
-        
-        for instruction in instructions:
-            p.drawString(60, y_position, instruction)
-            y_position -= 15
-        
-        y_position -= 20
-        
-        # Questions section
-        p.setFont("Times-Bold", 16)
-        p.drawString(50, y_position, "QUESTIONS")
-        y_position -= 30
-        
-        # Add questions to PDF
-        question_number = 1
-        for question in questions:
-            if y_position < 100:  # New page if needed
-                p.showPage()
-                y_position = height - 50
-                p.setFont("Times-Roman", 12)
-            
-            # Question header
-            p.setFont("Times-Bold", 12)
-            p.drawString(50, y_position, f"Q{question_number}. [{question.marks} marks]")
-            y_position -= 15
-            
-            p.setFont("Times-Roman", 10)
-            p.drawString(50, y_position, f"Subject: {question.subject.name} | Topic: {question.topic.name}")
-            y_position -= 20
-            
-            # Question text
-            p.setFont("Times-Roman", 12)
-            question_lines = simpleSplit(question.question, "Times-Roman", 12, width-100)
-            for line in question_lines:
-                if y_position < 100:
-                    p.showPage()
-                    y_position = height - 50
-                    p.setFont("Times-Roman", 12)
-                p.drawString(60, y_position, line)
-                y_position -= 15
-            
-            y_position -= 10  # Space between questions
-            question_number += 1
-        
-        p.showPage()
-        p.save()
-        buffer.seek(0)
+        # Serve the cached render; it is only regenerated when the paper changed
+        buffer = practice_paper_pdf(generated_paper.title, generated_paper.total_marks, questions)
         
         filename = f"Generated_Paper_{generated_paper.id}.pdf"
         return FileResponse(buffer, as_attachment=True, filename=filename)
@@ -1177,6 +832,58 @@ def student_download_generated_paper(request, generated_paper_id):
         messages.error(request, f"❌ Error downloading generated paper: {str(e)}")
         return HttpResponseRedirect(reverse("student_generated_papers"))
 
+# Rows per picker request, and the characters of question text sent for each
+QUESTION_PICKER_PAGE = 50
+QUESTION_PICKER_MAX_PAGE = 200
+QUESTION_PICKER_TEXT_LENGTH = 200
+
+@login_required(login_url='student_login')
+def question_picker(request):
+    """JSON pages of trimmed question rows for the paper builders' question pickers"""
+    questions = QPattern.objects.all()
+    if request.GET.get('mine') and request.user.role != 'admin':
+        # The staff builder only offers the staff member's own questions
+        questions = questions.filter(user=request.user)
+
+    try:
+        for field in ('subject', 'topic', 'marks', 'difficulty'):
+            value = request.GET.get(field)
+            if value:
+                questions = questions.filter(**{f'{field}_id' if field in ('subject', 'topic') else field: int(value)})
+    except ValueError:
+        return JsonResponse({'error': 'Filters must be whole numbers.'}, status=400)
+    # Searches return the best matches as one page unless sort=subject asks for every match
+    search_query = request.GET.get('search', '')
+    ranked = bool(search_query) and request.GET.get('sort') != 'subject'
+    if search_query:
+        questions = search_questions(questions, search_query, ranked=ranked)
+
+    # Only the columns the picker shows; question text is cut short in the database
+    questions = questions.annotate(text=Substr('question', 1, QUESTION_PICKER_TEXT_LENGTH)).values(
+        'id', 'text', 'subject_id', 'marks', 'difficulty', 'subject__name', 'topic__name')
+    limit = request.GET.get('limit', '')
+    limit = min(int(limit), QUESTION_PICKER_MAX_PAGE) if limit.isdigit() and int(limit) > 0 else QUESTION_PICKER_PAGE
+    if ranked:
+        paginator = FirstPagePaginator(questions, limit, estimate=True)
+    else:
+        paginator = KeysetPaginator(questions, limit, ordering=('subject_id', 'marks', 'id'), estimate=True)
+    page = paginator.get_page(request.GET.get('cursor'))
+
+    return JsonResponse({
+        'results': [{
+            'id': row['id'],
+            'question': Truncator(row['text']).words(10),
+            'subject': row['subject__name'],
+            'topic': row['topic__name'],
+            'marks': row['marks'],
+            'difficulty': row['difficulty'],
+        } for row in page],
+        'next_cursor': page.next_cursor,
+        'count': paginator.count if not page.has_previous() else None,
+        'count_is_estimate': paginator.count_is_estimate if not page.has_previous() else None,
+        'ranked': ranked,
+    })
+
 @login_required(login_url='student_login')
 def staff_generate_paper(request):
     """Staff-specific paper generation from question library"""
@@ -1193,140 +900,31 @@ def staff_generate_paper(request):
             if not selected_questions:
                 messages.warning(request, "⚠️ Please select at least one question.")
                 return HttpResponseRedirect(reverse("staff_generate_paper"))
-            
+
+            if request.POST.get('background'):
+                # Large papers are rendered by `manage.py run_paper_worker`
+                jobs.enqueue(request.user, 'staff_paper', paper_title, {
+                    'question_ids': [int(qid) for qid in selected_questions],
+                    'title': paper_title,
+                    'instructions': instructions,
+                    'generated_by': request.user.username,
+                    'generated_at': timezone.now().isoformat(),
+                })
+                metrics.papers_enqueued.inc(source='staff_background', type='custom')
+                messages.success(request, "⏳ Paper queued. It will be ready to download here shortly.")
+                return HttpResponseRedirect(reverse("paper_jobs"))
+
             # Get the selected questions
-            questions = QPattern.objects.filter(id__in=selected_questions)
+            questions = QPattern.objects.filter(id__in=selected_questions).select_related('subject', 'topic')
             
-            # Calculate total marks and statistics
+            # Calculate total marks
             total_marks = sum(question.marks for question in questions)
-            difficulty_levels = [question.difficulty for question in questions]
-            avg_difficulty = sum(difficulty_levels) / len(difficulty_levels) if difficulty_levels else 0
             
             # Generate PDF
-            buffer = io.BytesIO()
-            p = canvas.Canvas(buffer, pagesize=A4)
-            width, height = A4
-            
-            # PDF header
-            p.setFont("Times-Bold", 24)
-            p.drawCentredString(width/2, height-50, paper_title.upper())
-            p.setFont("Times-Roman", 16)
-            p.drawCentredString(width/2, height-80, "Staff Generated Question Paper")
-            p.drawCentredString(width/2, height-105, f"Total Marks: {total_marks}")
-            
-            # Draw line
-            p.line(50, height-120, width-50, height-120)
-            
-            # Paper statistics
-            y_position = height - 140
-            p.setFont("Times-Bold", 12)
-            p.drawString(50, y_position, "Paper Statistics:")
-            y_position -= 20
-            
-            p.setFont("Times-Roman", 10)
-            stats = [
-                f"Total Questions: {len(questions)}",
-                f"Average Difficulty: {avg_difficulty:.1f}/5",
-                f"Generated by: {request.user.username}",
-                f"Date: {timezone.now().strftime('%Y-%m-%d %H:%M')}"
-            ]
-            
-            for stat in stats:
-                p.drawString(60, y_position, stat)
-                y_position -= 15
-            
-            y_position -= 10
-            
-            # Instructions section
-            if instructions:
-                p.setFont("Times-Bold", 12)
-                p.drawString(50, y_position, "Instructions:")
-                y_position -= 20
-                
-                p.setFont("Times-Roman", 10)
-                instruction_lines = simpleSplit(instructions, "Times-Roman", 10, width-100)
-                for line in instruction_lines:
-                    if y_position < 100:
-                        p.showPage()
-                        y_position = height - 50
-                        p.setFont("Times-Roman", 10)
-                    p.drawString(60, y_position, line)
-                    y_position -= 12
-                
-                y_position -= 10
-            
-            # General instructions
-            p.setFont("Times-Bold", 12)
-            p.drawString(50, y_position, "General Instructions:")
-            y_position -= 20
-            
-            p.setFont("Times-Roman", 10)
-            general_instructions = [
-                "1. Answer all questions",
-                "2. Show all working steps", 
-                "3. Write neatly and legibly",
-                "4. Calculators are allowed unless specified",
-                "5. Time: As per examination guidelines",
-            ]
-            
-            for instruction in general_instructions:
-                if y_position < 100:
-                    p.showPage()
-                    y_position = height - 50
-                    p.setFont("Times-Roman", 10)
-                p.drawString(60, y_position, instruction)
-                y_position -= 12
-            
-            y_position -= 20
-            
-            # Questions section
-            p.setFont("Times-Bold", 16)
-            p.drawString(50, y_position, "QUESTIONS")
-            y_position -= 30
-            
-            # Add questions to PDF
-            question_number = 1
-            for question in questions:
-                if y_position < 100:  # New page if needed
-                    p.showPage()
-                    y_position = height - 50
-                    p.setFont("Times-Roman", 12)
-                
-                # Question header with marks and difficulty
-                p.setFont("Times-Bold", 12)
-                p.drawString(50, y_position, f"Q{question_number}. [{question.marks} marks]")
-                p.setFont("Times-Roman", 10)
-                p.drawString(width-150, y_position, f"Difficulty: {question.difficulty}/5")
-                y_position -= 15
-                
-                # Subject and topic
-                p.drawString(50, y_position, f"Subject: {question.subject.name} | Topic: {question.topic.name}")
-                y_position -= 20
-                
-                # Question text
-                p.setFont("Times-Roman", 12)
-                question_lines = simpleSplit(question.question, "Times-Roman", 12, width-100)
-                for line in question_lines:
-                    if y_position < 100:
-                        p.showPage()
-                        y_position = height - 50
-                        p.setFont("Times-Roman", 12)
-                    p.drawString(60, y_position, line)
-                    y_position -= 15
-                
-                # Answer space
-                y_position -= 10
-                if y_position < 150:
-                    p.showPage()
-                    y_position = height - 50
-                p.line(50, y_position, width-50, y_position)
-                y_position -= 20
-                
-                question_number += 1
-            
-            p.showPage()
-            p.save()
-            buffer.seek(0)
+            layout = staff_paper_layout(paper_title, total_marks, questions, instructions,
+                                        request.user.username, timezone.now())
+            buffer = render_to_file(layout)
+            metrics.papers_generated.inc(source='staff', type='custom')
             
             filename = f"Staff_Generated_Paper_{timezone.now().strftime('%Y%m%d_%H%M')}.pdf"
             messages.success(request, "📄 Question paper generated successfully!")
@@ -1336,20 +934,62 @@ def staff_generate_paper(request):
             messages.error(request, f"❌ Error generating paper: {str(e)}")
             return HttpResponseRedirect(reverse("staff_generate_paper"))
     else:
-        # GET request - show available questions for selection
-        if request.user.role == 'admin':
-            available_questions = QPattern.objects.all().order_by('subject__name', 'marks')
-        else:
-            available_questions = QPattern.objects.filter(user=request.user).order_by('subject__name', 'marks')
-        
-        subjects = Subject.objects.all()
+        # GET request - admin picks from all questions, staff from their own
+        subjects = subject_list()
         
         context = {
-            'available_questions': available_questions,
             'subjects': subjects,
+            'selected_questions': [],
+            'picker_mine': request.user.role != 'admin',
         }
         return render(request, "staff_generate_paper.html", context)
 
+def user_paper_jobs(user):
+    """Jobs the user may see: all of them for admin, their own otherwise"""
+    if user.role == 'admin':
+        return PaperJob.objects.select_related('user')
+    return PaperJob.objects.filter(user=user).select_related('user')
+
+def paper_job_json(job):
+    return {
+        'id': job.id,
+        'title': job.title,
+        'status': job.status,
+        'error': job.error,
+        'created_at': job.created_at.strftime('%Y-%m-%d %H:%M'),
+        'finished_at': job.finished_at.strftime('%Y-%m-%d %H:%M') if job.finished_at else None,
+        'download_url': reverse('paper_job_download', args=[job.id]) if job.status == 'done' else None,
+    }
+
+@login_required(login_url='student_login')
+def paper_jobs(request):
+    """Background generation jobs with their status"""
+    if request.user.role not in ['staff', 'admin']:
+        messages.error(request, "Access denied. Staff privileges required.")
+        return HttpResponseRedirect(reverse("dashboard"))
+
+    job_list = user_paper_jobs(request.user).order_by('-created_at')[:50]
+    return render(request, "paper_jobs.html", {'jobs': job_list})
+
+@login_required(login_url='student_login')
+def paper_job_status(request, job_id):
+    """JSON status of one job, polled by the jobs page"""
+    job = get_object_or_404(user_paper_jobs(request.user), id=job_id)
+    return JsonResponse(paper_job_json(job))
+
+@login_required(login_url='student_login')
+def paper_job_download(request, job_id):
+    """Download the PDF produced by a finished job"""
+    job = get_object_or_404(user_paper_jobs(request.user), id=job_id)
+    if job.status != 'done':
+        messages.warning(request, "⚠️ This paper is not ready yet.")
+        return HttpResponseRedirect(reverse("paper_jobs"))
+    try:
+        return FileResponse(open(job.artifact, 'rb'), as_attachment=True, filename=job.filename)
+    except FileNotFoundError:
+        messages.error(request, "❌ The generated file is no longer available.")
+        return HttpResponseRedirect(reverse("paper_jobs"))
+
 def student_login(request):
     """Login page specifically for students"""
     if request.method == "POST":
@@ -1496,6 +1136,8 @@ def logout_view(request):
     # Redirect to dashboard which shows all role options
     return HttpResponseRedirect(reverse("dashboard"))
 
+MYQUESTIONS_PAGE = 50
+
 @login_required(login_url='student_login')
 def myquestions(request):
     """Question management - only for staff and admin"""
@@ -1534,6 +1176,10 @@ def myquestions(request):
             )
             
             messages.success(request, "✅ Question added successfully!")
+            similar = similar_questions(question_text, exclude_id=qamodel.id)
+            if similar:
+                ids = ", ".join(f"#{qid}" for qid, _score in similar[:5])
+                messages.warning(request, f"⚠️ This question is very similar to {len(similar)} existing question(s): {ids}")
             return HttpResponseRedirect(reverse("myquestions"))
             
         except Exception as e:
@@ -1543,17 +1189,65 @@ def myquestions(request):
     elif request.method == "GET":
         if request.user.role == 'admin':
             # Admin can see all questions
-            questions = QPattern.objects.all().order_by('-id')
+            questions = QPattern.objects.all()
         else:
             # Staff can only see their own questions
-            questions = QPattern.objects.filter(user=request.user).order_by('-id')
-            
+            questions = QPattern.objects.filter(user=request.user)
+        
+        # Totals per marks from one grouped query over the (user) index
+        counts = marks_counts(questions)
+        total = sum(counts.values())
+        
+        # Keyset pages of the stored preview; question and answer text are never loaded
+        questions = questions.select_related('subject', 'topic', 'user').only(
+            'id', 'preview', 'marks', 'difficulty', 'subject__name', 'topic__name', 'user__username',
+        )
+        paginator = KeysetPaginator(questions, MYQUESTIONS_PAGE, count=total)
+        
         return render(request, "myquestions.html", {
-            "questions": questions,
+            "questions": paginator.get_page(request.GET.get('cursor')),
+            "total_questions": total,
+            "marks_counts": {f'marks_{marks}': counts.get(marks, 0) for marks in MARKS_BUCKETS},
         })
     else:
         return HttpResponseForbidden("Method not allowed")
 
+@login_required(login_url='student_login')
+def myquestions_import(request):
+    """Bulk import questions from an uploaded CSV, JSON or NDJSON file"""
+    if request.user.role not in ['staff', 'admin']:
+        messages.error(request, "Access denied. Staff privileges required to manage questions.")
+        return HttpResponseRedirect(reverse("dashboard"))
+    if request.method != "POST":
+        return HttpResponseRedirect(reverse("myquestions"))
+    
+    upload = request.FILES.get('import_file')
+    if not upload:
+        messages.warning(request, "⚠️ Please choose a file to import.")
+        return HttpResponseRedirect(reverse("myquestions"))
+    
+    format_type = request.POST.get('import_format') or guess_format(upload.name)
+    if format_type not in IMPORT_FORMATS:
+        messages.error(request, "❌ Unsupported file type. Upload a .csv, .json or .ndjson file.")
+        return HttpResponseRedirect(reverse("myquestions"))
+    
+    try:
+        result = import_questions(read_rows(upload, format_type), request.user)
+    except ImportInterrupted as e:
+        result = e.result
+        messages.error(request, f"❌ Could not read {upload.name} past row {e.last_row}: {str(e.error)}. "
+                                f"The {result.created} question(s) before it were imported.")
+    except (ImportFormatError, UnicodeDecodeError, csv.Error) as e:
+        messages.error(request, f"❌ Could not read {upload.name}: {str(e)}")
+        return HttpResponseRedirect(reverse("myquestions"))
+    else:
+        messages.success(request, f"✅ Imported {result.created} question(s) from {upload.name}.")
+    if result.failed:
+        shown = "; ".join(f"row {number}: {message}" for number, message in result.errors[:10])
+        more = f" (and {result.failed - 10} more)" if result.failed > 10 else ""
+        messages.warning(request, f"⚠️ Skipped {result.failed} invalid row(s) - {shown}{more}")
+    return HttpResponseRedirect(reverse("myquestions"))
+
 @login_required(login_url='student_login')
 def papergenerator(request):
     """Paper generation - only for staff and admin"""
@@ -1562,7 +1256,7 @@ def papergenerator(request):
         return HttpResponseRedirect(reverse("dashboard"))
     
     return render(request, "index.html",{
-        "subjects": Subject.objects.all()
+        "subjects": subject_list()
     })
 
 @login_required(login_url='student_login')
@@ -1583,27 +1277,27 @@ def papergen1(request):
         
         # Get the subject object
         subject = get_object_or_404(Subject, pk=subsel)
-        topics = Topic.objects.filter(sub=subject)
-        
-        # Count available questions
-        if request.user.role == 'admin':
-            # Admin can use all questions
-            total_questions = QPattern.objects.filter(subject_id=subsel).count()
-            two_mark_questions = QPattern.objects.filter(subject_id=subsel, marks=2).count()
-            five_mark_questions = QPattern.objects.filter(subject_id=subsel, marks=5).count()
-            ten_mark_questions = QPattern.objects.filter(subject_id=subsel, marks=10).count()
-        else:
-            # Staff can only use their own questions
-            total_questions = QPattern.objects.filter(subject_id=subsel, user=request.user).count()
-            two_mark_questions = QPattern.objects.filter(subject_id=subsel, marks=2, user=request.user).count()
-            five_mark_questions = QPattern.objects.filter(subject_id=subsel, marks=5, user=request.user).count()
-            ten_mark_questions = QPattern.objects.filter(subject_id=subsel, marks=10, user=request.user).count()
-        
-        # Validation messages
-        if ptype == '1' and (two_mark_questions < 6 or five_mark_questions < 4):
-            messages.warning(request, f"⚠️ Insufficient questions for IA Paper. Required: 6+ 2-mark questions (have {two_mark_questions}), 4+ 5-mark questions (have {five_mark_questions})")
-        elif ptype == '2' and (five_mark_questions < 4 or ten_mark_questions < 10):
-            messages.warning(request, f"⚠️ Insufficient questions for Semester Paper. Required: 4+ 5-mark questions (have {five_mark_questions}), 10+ 10-mark questions (have {ten_mark_questions})")
+        topics = topic_list(subject.id)
+        
+        # Count available questions per marks in one grouped query;
+        # admin can use all questions, staff only their own
+        available_questions = QPattern.objects.filter(subject=subject)
+        if request.user.role != 'admin':
+            available_questions = available_questions.filter(user=request.user)
+        available = marks_counts(available_questions)
+        two_mark_questions = available.get(2, 0)
+        five_mark_questions = available.get(5, 0)
+        ten_mark_questions = available.get(10, 0)
+        
+        # Validation messages, checked against the paper type's blueprint
+        blueprint = BLUEPRINTS.get(ptype)
+        shortfalls = [
+            f"{count}+ {marks}-mark questions (have {available.get(marks, 0)})"
+            for marks, count in sorted(blueprint_requirements(blueprint).items())
+            if available.get(marks, 0) < count
+        ] if blueprint else []
+        if shortfalls:
+            messages.warning(request, f"⚠️ Insufficient questions for {blueprint['name']}. Required: " + ", ".join(shortfalls))
         else:
             messages.info(request, f"📊 Available: {two_mark_questions} 2-mark, {five_mark_questions} 5-mark, {ten_mark_questions} 10-mark questions")
         
@@ -1619,6 +1313,26 @@ def papergen1(request):
     else:
         return HttpResponseForbidden("Method not allowed")
 
+def paper_candidate_index(user, blueprint, topics, cos):
+    """Candidate index for a blueprint over the selected topics, taken from the bank snapshot.
+
+    Admin can use all questions, staff only their own; questions not mapped to
+    any CO stay eligible whatever COs were ticked.
+    """
+    author = None if user.role == 'admin' else user.id
+    candidates = bank.snapshot().candidates(topics, user=author, marks=blueprint_requirements(blueprint))
+    if cos:
+        candidates = [c for c in candidates if c[3] in cos or c[3] == 0]
+    return CandidateIndex(candidates)
+
+def paper_conflicts(request, blueprint, topics):
+    """Near-duplicate groups among the candidates, when the form asks to keep them out of one paper"""
+    if not request.POST.get("exclude_near_duplicates"):
+        return None
+    author = None if request.user.role == 'admin' else request.user
+    questions = candidate_questions(topics, user=author, marks=blueprint_requirements(blueprint))
+    return conflict_map(near_duplicate_groups(questions))
+
 @login_required(login_url='student_login')
 def papergen2(request):
     """Paper generation step 2 - only for staff and admin"""
@@ -1630,157 +1344,34 @@ def papergen2(request):
         title = request.POST["heading"]
         subTitle = request.POST.get("extradetails", "")
         marksboxcheck = request.POST["marksboxcheck"]
-        topics = request.POST.getlist('topics')
-        topics = [eval(i) for i in topics]
-        cos = request.POST.getlist('cos')
-        cos = [eval(i) for i in cos]
-
-        twomqs = []
-        sevmqs = []
-        tens = []
-        
-        # Collect questions for selected topics based on user role
-        for topic in topics:
-            topic_obj = Topic.objects.filter(id=topic).first()
-            if topic_obj:
-                if request.user.role == 'admin':
-                    # Admin can use all questions
-                    twomqs.extend(list(QPattern.objects.filter(marks=2, topic=topic_obj)))
-                    sevmqs.extend(list(QPattern.objects.filter(marks=5, topic=topic_obj)))
-                    tens.extend(list(QPattern.objects.filter(marks=10, topic=topic_obj)))
-                else:
-                    # Staff can only use their own questions
-                    twomqs.extend(list(QPattern.objects.filter(marks=2, topic=topic_obj, user=request.user)))
-                    sevmqs.extend(list(QPattern.objects.filter(marks=5, topic=topic_obj, user=request.user)))
-                    tens.extend(list(QPattern.objects.filter(marks=10, topic=topic_obj, user=request.user)))
-
-        # Prepare the questions based on the new format
-        qLines = []
-        i = 1
-        
-        print("number of 2 marks questions: ", len(twomqs))
-        print("number of 5 marks questions: ", len(sevmqs))
-        print("number of 10 marks questions: ", len(tens))
+        topics = [int(i) for i in request.POST.getlist('topics')]
+        cos = [int(i) for i in request.POST.getlist('cos')]
 
         ptype = request.POST["ptype"]
-        
-        if ptype == '1':  # IA Paper
-            qLines.append("Time : 1 Hour")
-            qLines.append("Max Marks : 20")
-            qLines.append("")
-            qLines.append("1. Attempt the following questions:")
-            qLines.append("2. Avoid using any unfair means during the paper.")
-            qLines.append("")
-
-            # Q1: Any five questions from 6 (2 marks each)
-            if len(twomqs) >= 6:
-                qLines.append("Question 1 : Any five questions - 2 marks each")
-                qLines.append(f"(Choose 5 from the following 6 questions)")
-                twolist = random.sample(twomqs, 6)
-                for tq in twolist:
-                    qLines.append(f"Q.{i} " + tq.question)
-                    i += 1
-            else:
-                qLines.append("Question 1 : Insufficient 2-mark questions available")
-                qLines.append(f"(Available: {len(twomqs)}, Required: 6)")
-
-            qLines.append("")  # Add spacing
-
-            # Q2: Any one question from 2 (5 marks)
-            if len(sevmqs) >= 2:
-                qLines.append("Question 2 : Any one question - 5 marks")
-                qLines.append(f"(Choose 1 from the following 2 questions)")
-                sevlist = random.sample(sevmqs, 2)
-                qLines.append(f"Q.{i} " + sevlist[0].question)
-                qLines.append(f"Q.{i+1} " + sevlist[1].question)
-                i += 2
-            else:
-                qLines.append("Question 2 : Insufficient 5-mark questions available")
-                qLines.append(f"(Available: {len(sevmqs)}, Required: 2)")
-
-            qLines.append("")  # Add spacing
-
-            # Q3: Any one question from 2 (5 marks)
-            if len(sevmqs) >= 4:
-                qLines.append("Question 3 : Any one question - 5 marks")
-                qLines.append(f"(Choose 1 from the following 2 questions)")
-                # Use different questions than Q2
-                remaining_sevmqs = [q for q in sevmqs if q not in sevlist]
-                if len(remaining_sevmqs) >= 2:
-                    new_sevlist = random.sample(remaining_sevmqs, 2)
-                    qLines.append(f"Q.{i} " + new_sevlist[0].question)
-                    qLines.append(f"Q.{i+1} " + new_sevlist[1].question)
-                    i += 2
-                else:
-                    qLines.append("Question 3 : Not enough unique 5-mark questions available")
-            else:
-                qLines.append("Question 3 : Insufficient 5-mark questions available")
-                qLines.append(f"(Available: {len(sevmqs)}, Required: 4 for all sections)")
-        
-        elif ptype == '2':  # Semester papers
-            qLines.append("Time : 3 Hours")
-            qLines.append("Max Marks : 100")
-            qLines.append("")
-            qLines.append("1. Answer all questions.")
-            qLines.append("2. All questions carry equal marks.")
-            qLines.append("3. Attempt any 3 questions from Q2 to Q6.")
-            qLines.append("4. Avoid using any unfair means during the paper.")
-            qLines.append("")
-
-            # Q1: Compulsory question (5 marks each)
-            if len(sevmqs) >= 4:
-                qLines.append("Question 1 : Compulsory questions - 5 marks each")
-                comp_qs = random.sample(sevmqs, 4)
-                for tq in comp_qs:
-                    qLines.append(f"Q.{i} " + tq.question)
-                    i += 1
-            else:
-                qLines.append("Question 1 : Insufficient 5-mark questions available")
-                qLines.append(f"(Available: {len(sevmqs)}, Required: 4)")
-
-            qLines.append("")  # Add spacing
-
-            # Q2-Q6: Each worth 20 marks (2 sub-questions for 10 marks each)
-            if len(tens) >= 10:
-                main_qs = random.sample(tens, 10)
-                questions_data = [
-                    ("Question 2", main_qs[0:2]),
-                    ("Question 3", main_qs[2:4]),
-                    ("Question 4", main_qs[4:6]),
-                    ("Question 5", main_qs[6:8]),
-                    ("Question 6", main_qs[8:10])
-                ]
-                
-                for q_title, q_pair in questions_data:
-                    qLines.append(f"{q_title} : Answer both sub-questions (10 marks each) - Total 20 marks")
-                    qLines.append(f"Q.{i} " + q_pair[0].question)
-                    qLines.append(f"Q.{i+1} " + q_pair[1].question)
-                    i += 2
-                    qLines.append("")
-            else:
-                qLines.append("Insufficient 10-mark questions for semester paper")
-                qLines.append(f"(Available: {len(tens)}, Required: 10)")
-        
-        else:
-            qLines.append("Invalid paper type selected")
+        blueprint = BLUEPRINTS.get(ptype)
+        if blueprint is None:
+            buffer = render_to_file(text_paper_layout(title, subTitle, ["Invalid paper type selected"]))
+            return FileResponse(buffer, as_attachment=True, filename='QuestionPaper.pdf')
+        mix = DIFFICULTY_MIXES.get(request.POST.get("difficulty_mix", "any"), {})
+
+        index = paper_candidate_index(request.user, blueprint, topics, cos)
+        solution = solve_blueprint(blueprint, index, cos=cos, mix=mix,
+                                   conflicts=paper_conflicts(request, blueprint, topics))
+        for note in solution.notes:
+            messages.warning(request, f"⚠️ {note}")
+
+        if not solution.feasible:
+            messages.error(request, "❌ The selected topics cannot satisfy this paper blueprint.")
+            lines = [f"{blueprint['name']} for '{title}' cannot be generated:", ""] + solution.problems
+            buffer = render_to_file(text_paper_layout("Paper Could Not Be Generated", subTitle, lines))
+            return FileResponse(buffer, as_attachment=True, filename='Infeasible_Paper_Report.pdf')
+
+        # Fetch the text of just the chosen questions
+        qLines = blueprint_lines(solution, bank.snapshot().texts(solution.question_ids))
 
         # Generate PDF
-        buffer = io.BytesIO()
-        p = canvas.Canvas(buffer, pagesize=A4)
-        p.setFont("Times-Roman", 24)
-        p.setTitle(title)
-        p.drawCentredString(300, 770, title)
-        p.setFont("Times-Roman", 16)
-        p.drawCentredString(290, 720, subTitle)
-        p.line(30, 710, 550, 710)
-        p.setFont("Times-Roman", 12)
-        text = p.beginText(40, 680)
-        for line in qLines:
-            text.textLine(line)
-        p.drawText(text)
-        p.showPage()
-        p.save()
-        buffer.seek(0)
+        buffer = render_to_file(text_paper_layout(title, subTitle, qLines))
+        metrics.papers_generated.inc(source='papergen2', type=ptype)
         
         messages.success(request, "📄 Question paper generated successfully!")
         return FileResponse(buffer, as_attachment=True, filename='QuestionPaper.pdf')
@@ -1790,18 +1381,68 @@ def papergen2(request):
         messages.error(request, f"❌ Error generating question paper: {str(e)}")
         
         # Return a user-friendly error response
-        buffer = io.BytesIO()
-        p = canvas.Canvas(buffer, pagesize=A4)
-        p.setFont("Times-Roman", 16)
-        p.drawCentredString(300, 400, "Error Generating Question Paper")
-        p.setFont("Times-Roman", 12)
-        p.drawCentredString(300, 380, f"Error: {str(e)}")
-        p.drawCentredString(300, 360, "Please check if you have enough questions in your database.")
-        p.showPage()
-        p.save()
-        buffer.seek(0)
+        buffer = render_to_file(error_report_layout(str(e)))
         return FileResponse(buffer, as_attachment=True, filename='Error_Report.pdf')
 
+BATCH_SEED_PATTERN = re.compile(r'[A-Za-z0-9]{1,32}')
+
+@login_required(login_url='student_login')
+def papergen_batch(request):
+    """Generate several low-overlap sets (A, B, C...) of one paper as a ZIP - staff and admin only"""
+    if request.user.role not in ['staff', 'admin']:
+        messages.error(request, "Access denied. Staff privileges required.")
+        return HttpResponseRedirect(reverse("dashboard"))
+    if request.method != "POST":
+        return HttpResponseForbidden("Method not allowed")
+
+    try:
+        title = request.POST["heading"]
+        ptype = request.POST["ptype"]
+        topics = [int(i) for i in request.POST.getlist('topics')]
+        cos = [int(i) for i in request.POST.getlist('cos')]
+        sets = max(1, min(int(request.POST.get("sets") or 4), 26))
+    except KeyError as e:
+        return HttpResponseBadRequest(f"Missing field {e}")
+    except ValueError:
+        return HttpResponseBadRequest("Topics, COs and the number of sets must be whole numbers")
+    subTitle = request.POST.get("extradetails", "")
+
+    # The seed names the ZIP, so it is kept to a short alphanumeric value
+    seed = request.POST.get("seed") or str(random.randrange(10**6))
+    if not BATCH_SEED_PATTERN.fullmatch(seed):
+        return HttpResponseBadRequest("The seed must be 1-32 letters or digits")
+
+    blueprint = BLUEPRINTS.get(ptype)
+    if blueprint is None:
+        return HttpResponseBadRequest("Invalid paper type selected")
+    mix = DIFFICULTY_MIXES.get(request.POST.get("difficulty_mix", "any"), {})
+
+    # One candidate query and one index serve every set
+    index = paper_candidate_index(request.user, blueprint, topics, cos)
+    solutions = solve_sets(blueprint, index, sets, cos=cos, mix=mix, rng=random.Random(seed),
+                           conflicts=paper_conflicts(request, blueprint, topics))
+    texts = bank.snapshot().texts({qid for solution in solutions for qid in solution.question_ids})
+
+    layouts = []
+    names = []
+    for number, solution in enumerate(solutions):
+        letter = chr(ord('A') + number)
+        if solution.feasible:
+            layouts.append(text_paper_layout(f"{title} - Set {letter}", subTitle, blueprint_lines(solution, texts)))
+            names.append(f"QuestionPaper_Set_{letter}.pdf")
+        else:
+            lines = [f"Set {letter} of {blueprint['name']} for '{title}' cannot be generated:", ""] + solution.problems
+            layouts.append(text_paper_layout("Paper Could Not Be Generated", subTitle, lines))
+            names.append(f"Set_{letter}_Infeasible_Report.pdf")
+
+    metrics.papers_generated.inc(sum(solution.feasible for solution in solutions),
+                                 source='papergen_batch', type=ptype)
+    workers = getattr(settings, 'PAPER_RENDER_WORKERS', 1)
+    rendered = zip(names, render_many(layouts, workers=workers))
+    response = StreamingHttpResponse(stream_zip(rendered), content_type='application/zip')
+    response['Content-Disposition'] = content_disposition_header(True, f"QuestionPaper_Sets_{seed}.zip")
+    return response
+
 @login_required(login_url='student_login')
 def view_papers(request):
     """View available papers - accessible to all roles"""
@@ -1814,24 +1455,20 @@ def view_papers(request):
         papers = papers.filter(subject__name__icontains=subject_filter)
     
     # Calculate statistics for the view
-    total_papers = papers.count()
-    total_questions = QPattern.objects.count()
-    average_marks = QPattern.objects.aggregate(Avg('marks'))['marks__avg'] or 0
+    counts = counters.read('questions', 'questions:marks_total', *(f'questions:marks:{marks}' for marks in MARKS_BUCKETS))
+    total_questions = counts['questions']
+    total_papers = papers.count() if subject_filter else total_questions
+    average_marks = counts['questions:marks_total'] / total_questions if total_questions else 0
     
     # Since there's no created_at field, use total count for recent papers
     recent_papers = total_papers
     
     # Get marks distribution
-    marks_distribution = {
-        '2_marks': QPattern.objects.filter(marks=2).count(),
-        '5_marks': QPattern.objects.filter(marks=5).count(),
-        '10_marks': QPattern.objects.filter(marks=10).count(),
-    }
+    marks_distribution = {f'{marks}_marks': counts[f'questions:marks:{marks}'] for marks in MARKS_BUCKETS}
     
-    # Pagination
-    paginator = Paginator(papers, 10)  # Show 10 papers per page
-    page_number = request.GET.get('page')
-    papers_page = paginator.get_page(page_number)
+    # Keyset pagination; the total is already known from above
+    paginator = KeysetPaginator(papers, 10, count=total_papers)  # Show 10 papers per page
+    papers_page = paginator.get_page(request.GET.get('cursor'))
     
     context = {
         'papers': papers_page,